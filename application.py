@@ -0,0 +1,93 @@
+import asyncio
+import contextlib
+
+from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse, PlainTextResponse
+
+from settings import Settings
+
+
+def create_app(settings: Settings | None = None) -> FastAPI:
+    settings = settings or Settings.from_env()
+
+    # Imported here rather than at module level: they pull in every service and model, and
+    # `import application` should stay cheap for tools and tests that only need the factory
+    import metrics
+    from controllers.auth_controller import auth_router
+    from controllers.todo_controller import todo_router
+    from controllers.user_todo_controller import user_todo_router
+    from auth.password import password_hasher
+    from change_feed import change_feed
+    from database import dispose_engines, pool_status
+    from idempotency import IdempotencyMiddleware
+    from instrumentation import InstrumentationMiddleware
+    from rate_limit import RateLimitMiddleware
+    from replicas import ReadYourWritesMiddleware
+    from server_config import per_process_backends, worker_count
+    from warmup import prewarm_until_ready
+
+    # e.g. a per-process idempotency store lets a retry that reaches another worker run again
+    if worker_count() > 1 and per_process_backends():
+        raise RuntimeError(f"{', '.join(per_process_backends())} keeps state per process, "
+                           f"use postgres, redis or none with {worker_count()} workers")
+
+    app = FastAPI(default_response_class=ORJSONResponse)
+    app.state.settings = settings
+    app.state.ready = asyncio.Event()
+    app.add_middleware(ReadYourWritesMiddleware, window=settings.read_your_writes_window)
+    # Inside the rate limiter, so replays count against the client's budget too
+    app.add_middleware(IdempotencyMiddleware)
+    app.add_middleware(RateLimitMiddleware)
+    # Added last so it wraps everything else
+    app.add_middleware(InstrumentationMiddleware)
+
+    @app.on_event("startup")
+    async def on_startup():
+        if settings.prewarm:
+            # In the background, so the server accepts connections right away and /ready
+            # tells the load balancer when to send it traffic
+            app.state.prewarm_task = asyncio.create_task(prewarm_until_ready(app.state.ready))
+        else:
+            app.state.ready.set()
+
+        if settings.jobs_in_process:
+            import jobs.tasks  # noqa: F401 registers the jobs
+            from database import async_session
+            from jobs.worker import Worker
+
+            app.state.job_worker = Worker(async_session)
+            app.state.job_worker_task = asyncio.create_task(app.state.job_worker.run())
+
+    @app.on_event("shutdown")
+    async def on_shutdown():
+        if settings.prewarm:
+            app.state.prewarm_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await app.state.prewarm_task
+        if settings.jobs_in_process:
+            app.state.job_worker.stop()
+            await app.state.job_worker_task
+        password_hasher.shutdown()
+        await change_feed.close()
+        await dispose_engines()
+
+    @app.get("/")
+    def index():
+        return "App is running"
+
+    @app.get("/ready", include_in_schema=False)
+    def ready():
+        ready = app.state.ready.is_set()
+        return ORJSONResponse(
+            {"status": "ready" if ready else "warming", "pool": pool_status()},
+            status_code=200 if ready else 503,
+        )
+
+    @app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+    def get_metrics():
+        return metrics.render()
+
+    app.include_router(auth_router, prefix="/api/v1")
+    app.include_router(todo_router, prefix="/api/v1")
+    app.include_router(user_todo_router, prefix="/api/v1")
+    return app
@@ -1,12 +1,23 @@
+import time
+
 from decouple import config
 from pydantic import BaseModel
 from jose import jwt
 from datetime import datetime, timedelta, timezone
 
-SECRET_KEY = config("SECRET_KEY")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+_secret_key: str | None = None
+
+
+def secret_key() -> str:
+    # Read on first use, so the auth modules can be imported without SECRET_KEY set
+    global _secret_key
+    if _secret_key is None:
+        _secret_key = config("SECRET_KEY")
+    return _secret_key
+
 
 class Token(BaseModel):
     access_token: str
@@ -20,7 +31,8 @@ class TokenData(BaseModel):
 def create_access_token(data: dict):
     try:
         expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-        data.update({"exp": expire})
-        return jwt.encode(data, SECRET_KEY, algorithm=ALGORITHM)
+        # iat keeps sub-second precision so tokens issued right after a password change stay valid
+        data.update({"exp": expire, "iat": time.time()})
+        return jwt.encode(data, secret_key(), algorithm=ALGORITHM)
     except Exception as e:
         print(e)
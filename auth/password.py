@@ -1,4 +1,18 @@
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
 import bcrypt
+from decouple import config
+
+import instrumentation
+from custom_exceptions import PasswordHasherBusyException
+
+BCRYPT_ROUNDS = config("BCRYPT_ROUNDS", default=12, cast=int)
+PASSWORD_HASH_EXECUTOR = config("PASSWORD_HASH_EXECUTOR", default="thread")  # "thread" or "process"
+PASSWORD_HASH_WORKERS = config("PASSWORD_HASH_WORKERS", default=2, cast=int)
+PASSWORD_HASH_MAX_PENDING = config("PASSWORD_HASH_MAX_PENDING", default=32, cast=int)
+PASSWORD_HASH_RETRY_AFTER = config("PASSWORD_HASH_RETRY_AFTER", default=1, cast=int)
+PASSWORD_REHASH_ON_LOGIN = config("PASSWORD_REHASH_ON_LOGIN", default=True, cast=bool)
 
 
 def verify_password(plain_password: str, hashed_password: bytes) -> bool:
@@ -6,7 +20,68 @@ def verify_password(plain_password: str, hashed_password: bytes) -> bool:
     return bcrypt.checkpw(password=password_byte_enc, hashed_password=hashed_password)
 
 
-def hash_password(password: str) -> bytes:
+def hash_password(password: str, rounds: int = BCRYPT_ROUNDS) -> bytes:
     pwd_bytes = password.encode("utf-8")
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(rounds=rounds)
     return bcrypt.hashpw(password=pwd_bytes, salt=salt)
+
+
+def needs_rehash(hashed_password: bytes, rounds: int = BCRYPT_ROUNDS) -> bool:
+    # bcrypt hashes look like b"$2b$12$<salt+hash>", the second field is the cost factor
+    try:
+        return int(hashed_password.split(b"$")[2]) != rounds
+    except (IndexError, ValueError):
+        return True
+
+
+class PasswordHasher:
+    # bcrypt releases the GIL, so a thread pool is enough to keep the event loop free.
+    # The pending counter is the admission control: once it is full we fail fast with
+    # a 503 instead of letting logins queue up behind each other.
+    def __init__(self, executor: str, workers: int, max_pending: int, retry_after: int):
+        self.executor_kind = executor
+        self.workers = workers
+        self.max_pending = max_pending
+        self.retry_after = retry_after
+        self.pending = 0
+        self._executor: Executor | None = None
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            if self.executor_kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    async def _run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            raise PasswordHasherBusyException("Too many password operations in flight", self.retry_after)
+
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            with instrumentation.timed("bcrypt"):
+                return await loop.run_in_executor(self.executor, fn, *args)
+        finally:
+            self.pending -= 1
+
+    async def hash(self, password: str) -> bytes:
+        return await self._run(hash_password, password)
+
+    async def verify(self, plain_password: str, hashed_password: bytes) -> bool:
+        return await self._run(verify_password, plain_password, hashed_password)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(
+    executor=PASSWORD_HASH_EXECUTOR,
+    workers=PASSWORD_HASH_WORKERS,
+    max_pending=PASSWORD_HASH_MAX_PENDING,
+    retry_after=PASSWORD_HASH_RETRY_AFTER,
+)
@@ -0,0 +1,62 @@
+import time
+
+from decouple import config
+
+from .cache import TTLCache
+from .jwt_token import ACCESS_TOKEN_EXPIRE_MINUTES
+
+AUTH_CACHE_SIZE = config("AUTH_CACHE_SIZE", default=10_000, cast=int)
+AUTH_CACHE_TTL = config("AUTH_CACHE_TTL", default=60, cast=float)
+
+
+class Revocations:
+    # user_id -> time of the last revocation, tokens issued before it are rejected. Unlike the
+    # caches it's never bounded by size: a revocation dropped early would bring back every
+    # token it revoked. Entries go once no token issued before them can still be valid, so it
+    # holds the password changes and deletions of one token lifetime.
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._data: dict[int, float] = {}
+
+    def get(self, user_id: int) -> float | None:
+        revoked_at = self._data.get(user_id)
+        return revoked_at if revoked_at is not None and revoked_at > time.time() - self.ttl else None
+
+    def set(self, user_id: int, revoked_at: float) -> None:
+        # Kept in revocation order, so the expired entries are always the oldest ones
+        self._data.pop(user_id, None)
+        self._data[user_id] = revoked_at
+        expired_before = time.time() - self.ttl
+        while (oldest := next(iter(self._data))) != user_id and self._data[oldest] <= expired_before:
+            del self._data[oldest]
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+# token -> decoded claims, user_id -> principal row
+token_cache = TTLCache(maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL)
+principal_cache = TTLCache(maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL)
+revocations = Revocations(ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
+
+def forget_principal(user_id: int) -> None:
+    principal_cache.pop(user_id)
+
+
+def invalidate_user(user_id: int) -> None:
+    # Called by UserService after a user is deleted or changes password. The caches are per
+    # process: other workers drop the principal once their AUTH_CACHE_TTL runs out, which
+    # ends a deleted user's tokens there, but they keep accepting a password-changed user's
+    # older tokens until those expire.
+    principal_cache.pop(user_id)
+    revocations.set(user_id, time.time())
+
+
+def is_revoked(payload: dict) -> bool:
+    user_id = payload.get("uid")
+    revoked_at = revocations.get(user_id) if user_id is not None else None
+    return revoked_at is not None and payload.get("iat", 0) < revoked_at
@@ -1,12 +1,19 @@
+import time
+
+from decouple import config
 from pydantic import BaseModel
 from fastapi import Depends, status, HTTPException
 from jose import JWTError, jwt
 from fastapi.security import OAuth2PasswordBearer
 
+import instrumentation
 from deps import get_user_service
-from .jwt_token import SECRET_KEY, ALGORITHM
+from .jwt_token import ALGORITHM, secret_key
+from .principals import is_revoked, principal_cache, token_cache
 from services.user_service import UserService
 
+AUTH_STATELESS = config("AUTH_STATELESS", default=True, cast=bool)
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 
@@ -14,27 +21,63 @@ class TokenData(BaseModel):
     username: str | None = None
 
 
+def decode_token(token: str) -> dict | None:
+    payload = token_cache.get(token)
+    if payload is None:
+        try:
+            payload = jwt.decode(token, secret_key(), algorithms=[ALGORITHM])
+        except JWTError:
+            return None
+        token_cache.set(token, payload, ttl=payload["exp"] - time.time())
+    elif payload["exp"] <= time.time():
+        token_cache.pop(token)
+        return None
+
+    if is_revoked(payload):
+        return None
+
+    return payload
+
+
 async def get_current_user(
         token: str = Depends(oauth2_scheme),
         user_service: UserService = Depends(get_user_service)
 ):
+    with instrumentation.timed("auth"):
+        return await _resolve_user(token, user_service)
+
+
+async def _resolve_user(token: str, user_service: UserService):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
 
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-        token_data = TokenData(username=username)
-    except JWTError:
+    payload = decode_token(token)
+    if payload is None:
+        raise credentials_exception
+
+    username: str = payload.get("sub")
+    if username is None:
         raise credentials_exception
+    token_data = TokenData(username=username)
+
+    user_id = payload.get("uid")
+    if AUTH_STATELESS and user_id is not None:
+        user = principal_cache.get(user_id)
+        if user is not None:
+            return user
 
-    user = await user_service.get_by_username(token_data.username) # not implemented yet
+    user = await user_service.get_by_username(token_data.username)
     if user is None:
         raise credentials_exception
 
-    return user
\ No newline at end of file
+    # A username can be re-registered after the original account was deleted
+    if user_id is not None and user.user_id != user_id:
+        raise credentials_exception
+
+    if AUTH_STATELESS:
+        principal_cache.set(user.user_id, user)
+
+    return user
@@ -0,0 +1,60 @@
+import argparse
+import asyncio
+import sys
+
+from benchmarks.common import write_results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    seed_parser = commands.add_parser("seed", help="create benchmark users and todos")
+    seed_parser.add_argument("--users", type=int, default=20)
+    seed_parser.add_argument("--todos", type=int, default=1000)
+
+    run_parser = commands.add_parser("run", help="run the mixed workload")
+    run_parser.add_argument("--base-url", help="target a running server instead of the in-process app")
+    run_parser.add_argument("--users", type=int, default=20)
+    run_parser.add_argument("--concurrency", type=int, default=50)
+    run_parser.add_argument("--duration", type=float, default=30)
+    run_parser.add_argument("--weights", type=lambda value: tuple(int(part) for part in value.split(",")),
+                            help="list,get,create,update,delete,login weights, e.g. 60,10,10,10,5,5")
+    run_parser.add_argument("--output", help="results file, defaults to bench_results/<time>-<commit>.json")
+
+    compare_parser = commands.add_parser("compare", help="compare two result files")
+    compare_parser.add_argument("before")
+    compare_parser.add_argument("after")
+    compare_parser.add_argument("--max-p95-regression", type=float,
+                                help="exit with 1 when any p95 grows by more than this many percent")
+
+    import_time_parser = commands.add_parser("import-time", help="check the app's import and startup time")
+    import_time_parser.add_argument("--module", default="main")
+    import_time_parser.add_argument("--runs", type=int, default=5)
+    import_time_parser.add_argument("--budget-ms", type=float, help="exit with 1 when the import takes longer")
+    import_time_parser.add_argument("--top", type=int, default=15, help="slowest imports to list")
+
+    args = parser.parse_args()
+
+    if args.command == "seed":
+        from benchmarks.seed import seed
+        asyncio.run(seed(args.users, args.todos))
+    elif args.command == "run":
+        from benchmarks.workload import DEFAULT_WEIGHTS, run_workload
+        results = asyncio.run(run_workload(args.base_url, args.users, args.concurrency, args.duration,
+                                           args.weights or DEFAULT_WEIGHTS))
+        overall = results["overall"]
+        print(f"{overall['requests']} requests, {overall['rps']:.1f} rps, p50 {overall['p50_ms']:.1f}ms, "
+              f"p95 {overall['p95_ms']:.1f}ms, p99 {overall['p99_ms']:.1f}ms")
+        print(f"results written to {write_results(results, args.output)}")
+    elif args.command == "compare":
+        from benchmarks.compare import compare
+        return 0 if compare(args.before, args.after, args.max_p95_regression) else 1
+    elif args.command == "import-time":
+        from benchmarks.import_time import check_import_time
+        return 0 if check_import_time(args.module, args.runs, args.budget_ms, args.top) else 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+# Opens --subscribers idle change feed streams for one user, then makes --writes todo writes
+# and measures how long each event takes to reach every stream. Needs a live Postgres.
+#
+#   RATE_LIMIT_PER_IP= hypercorn main:app --bind 127.0.0.1:8000
+#   python -m benchmarks.change_feed --subscribers 1000 --writes 20
+#
+# Watch the server's RSS while the streams are open to see the per-subscriber memory cost.
+import argparse
+import asyncio
+import time
+import uuid
+
+import httpx
+import orjson
+
+from benchmarks.common import percentile, signup_and_login
+
+
+async def subscribe(client: httpx.AsyncClient, headers: dict[str, str], write_started: list[float],
+                    latencies: list[float], ready: asyncio.Event, expected: int):
+    received = 0
+    async with client.stream("GET", "/api/v1/users/todos/events", headers=headers) as response:
+        async for line in response.aiter_lines():
+            # The server subscribes before it sends the first line
+            ready.set()
+            if not line.startswith("data: "):
+                continue
+            event = orjson.loads(line[6:])
+            if event.get("type") == "created":
+                latencies.append((time.perf_counter() - write_started[0]) * 1000)
+                received += 1
+                if received == expected:
+                    return
+
+
+async def main(args):
+    limits = httpx.Limits(max_connections=args.subscribers + 10)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=None, limits=limits) as client:
+        headers = await signup_and_login(client, f"feed_{uuid.uuid4().hex[:8]}")
+
+        # Writes are sequential, so every created event belongs to the latest write
+        write_started = [0.0]
+        latencies: list[float] = []
+        readiness = [asyncio.Event() for _ in range(args.subscribers)]
+        streams = [
+            asyncio.create_task(subscribe(client, headers, write_started, latencies, ready, args.writes))
+            for ready in readiness
+        ]
+        await asyncio.gather(*(ready.wait() for ready in readiness))
+        print(f"{args.subscribers} streams open")
+
+        for index in range(args.writes):
+            write_started[0] = time.perf_counter()
+            await client.post("/api/v1/users/todos/", json={"label": f"feed {index}"}, headers=headers)
+            await asyncio.sleep(args.interval)
+
+        await asyncio.wait_for(asyncio.gather(*streams), timeout=30)
+
+    print(f"events delivered: {len(latencies)} of {args.subscribers * args.writes}")
+    print(f"p50: {percentile(latencies, 50):.1f}ms  p99: {percentile(latencies, 99):.1f}ms  "
+          f"max: {max(latencies):.1f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--subscribers", type=int, default=1000)
+    parser.add_argument("--writes", type=int, default=20)
+    parser.add_argument("--interval", type=float, default=0.2)
+    asyncio.run(main(parser.parse_args()))
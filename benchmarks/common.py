@@ -0,0 +1,72 @@
+import datetime
+import os
+import platform
+import subprocess
+
+import httpx
+import orjson
+
+PASSWORD = "bench-password"
+
+
+def username_for(index: int) -> str:
+    return f"bench_user_{index}"
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def summarize(latencies_ms: list[float], seconds: float) -> dict:
+    return {
+        "requests": len(latencies_ms),
+        "rps": len(latencies_ms) / seconds if seconds else 0.0,
+        "p50_ms": percentile(latencies_ms, 50),
+        "p95_ms": percentile(latencies_ms, 95),
+        "p99_ms": percentile(latencies_ms, 99),
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_results(results: dict, path: str | None) -> str:
+    results = {
+        "commit": git_commit(),
+        "timestamp": datetime.datetime.now(datetime.UTC).isoformat(),
+        "python": platform.python_version(),
+        **results,
+    }
+    if path is None:
+        path = os.path.join("bench_results", f"{results['timestamp'][:19].replace(':', '-')}-{results['commit']}.json")
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "wb") as file:
+        file.write(orjson.dumps(results, option=orjson.OPT_INDENT_2))
+    return path
+
+
+async def login(client: httpx.AsyncClient, username: str, password: str = PASSWORD) -> dict[str, str]:
+    response = await client.post("/api/v1/auth/login", json={"username": username, "password": password})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def signup_and_login(client: httpx.AsyncClient, username: str, password: str = PASSWORD) -> dict[str, str]:
+    await client.post("/api/v1/auth/users", json={
+        "first_name": "Bench",
+        "last_name": "User",
+        "email": f"{username}@example.com",
+        "birthdate": "1990-01-01",
+        "username": username,
+        "password": password,
+    })
+    return await login(client, username, password)
@@ -0,0 +1,39 @@
+import orjson
+
+METRICS = ("rps", "p50_ms", "p95_ms", "p99_ms")
+
+
+def load(path: str) -> dict:
+    with open(path, "rb") as file:
+        return orjson.loads(file.read())
+
+
+def _change(before: float, after: float) -> str:
+    if not before:
+        return "     n/a"
+    return f"{(after - before) / before * 100:+7.1f}%"
+
+
+def compare(before_path: str, after_path: str, max_p95_regression: float | None = None) -> bool:
+    before, after = load(before_path), load(after_path)
+    print(f"before: {before.get('commit')} ({before_path})")
+    print(f"after:  {after.get('commit')} ({after_path})")
+
+    rows = [("overall", before["overall"], after["overall"])]
+    rows += [(name, before["operations"].get(name, {}), stats) for name, stats in after["operations"].items()]
+
+    ok = True
+    for name, old, new in rows:
+        cells = []
+        for metric in METRICS:
+            cells.append(f"{metric} {new.get(metric, 0):9.1f} {_change(old.get(metric, 0), new.get(metric, 0))}")
+        print(f"{name:>8}: " + "  ".join(cells))
+
+        if max_p95_regression is not None and old.get("p95_ms"):
+            if (new["p95_ms"] - old["p95_ms"]) / old["p95_ms"] * 100 > max_p95_regression:
+                ok = False
+
+    if "db_queries_per_request" in after["overall"]:
+        print(f"db queries/request: {before['overall'].get('db_queries_per_request', 0):.2f} -> "
+              f"{after['overall']['db_queries_per_request']:.2f}")
+    return ok
@@ -0,0 +1,99 @@
+# Compares plain polling of GET /api/v1/users/todos/ with conditional polling (If-None-Match).
+#
+#   RATE_LIMIT_BACKEND=none hypercorn main:app --bind 127.0.0.1:8000
+#   python -m benchmarks.etag_polling --todos 200 --clients 50 --polls 20 --interval 0.5 \
+#       --server-pid $(pgrep -of hypercorn)
+#
+# With --server-pid the CPU time the server and its workers spent during the polling phase is
+# reported too (Linux only, read from /proc).
+# Each simulated client polls its list every --interval seconds; one in --write-every polls is
+# preceded by a write, which is the realistic ratio of "something changed" for a todo list.
+import argparse
+import asyncio
+import os
+import time
+import uuid
+
+import httpx
+
+from benchmarks.common import signup_and_login
+
+
+def server_cpu_seconds(pid: int) -> float:
+    # utime + stime of the process and all of its descendants, e.g. hypercorn's workers
+    ticks = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        with open(f"/proc/{current}/stat") as f:
+            # The command name can contain spaces, the fields after it can't
+            fields = f.read().rpartition(")")[2].split()
+        ticks += int(fields[11]) + int(fields[12])
+        for task in os.listdir(f"/proc/{current}/task"):
+            with open(f"/proc/{current}/task/{task}/children") as f:
+                pending.extend(int(child) for child in f.read().split())
+    return ticks / os.sysconf("SC_CLK_TCK")
+
+
+async def create_client_user(client: httpx.AsyncClient, todos: int) -> dict[str, str]:
+    headers = await signup_and_login(client, f"poll_{uuid.uuid4().hex[:8]}")
+
+    for start in range(0, todos, 500):
+        items = [{"label": f"todo {index}"} for index in range(start, min(todos, start + 500))]
+        await client.post("/api/v1/users/todos/bulk", json={"items": items}, headers=headers)
+    return headers
+
+
+async def poll(client: httpx.AsyncClient, headers: dict[str, str], args, conditional: bool, stats: dict):
+    etag = None
+    for index in range(args.polls):
+        if args.write_every and index % args.write_every == args.write_every - 1:
+            await client.post("/api/v1/users/todos/", json={"label": uuid.uuid4().hex}, headers=headers)
+
+        request_headers = dict(headers)
+        if conditional and etag:
+            request_headers["If-None-Match"] = etag
+
+        start = time.perf_counter()
+        response = await client.get("/api/v1/users/todos/", params={"limit": args.todos},
+                                    headers=request_headers)
+        stats["seconds"] += time.perf_counter() - start
+        stats["bytes"] += len(response.content)
+        stats[response.status_code] = stats.get(response.status_code, 0) + 1
+        etag = response.headers.get("etag", etag)
+
+        await asyncio.sleep(args.interval)
+
+
+async def run(args, conditional: bool) -> dict:
+    stats = {"seconds": 0.0, "bytes": 0, "cpu": None}
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=60) as client:
+        users = await asyncio.gather(*(create_client_user(client, args.todos) for _ in range(args.clients)))
+        cpu_start = server_cpu_seconds(args.server_pid) if args.server_pid else None
+        await asyncio.gather(*(poll(client, headers, args, conditional, stats) for headers in users))
+        if cpu_start is not None:
+            stats["cpu"] = server_cpu_seconds(args.server_pid) - cpu_start
+    return stats
+
+
+async def main(args):
+    for conditional in (False, True):
+        stats = await run(args, conditional)
+        requests = args.clients * args.polls
+        cpu = "" if stats["cpu"] is None else f"{stats['cpu'] / requests * 1000:.2f}ms server CPU per poll, "
+        print(f"{'conditional' if conditional else 'plain':>11}: "
+              f"{stats['bytes'] / 1024:.1f} KiB transferred, "
+              f"{stats['seconds'] / requests * 1000:.2f}ms mean latency, {cpu}"
+              f"{stats.get(200, 0)} x 200, {stats.get(304, 0)} x 304")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--todos", type=int, default=200)
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--polls", type=int, default=20)
+    parser.add_argument("--interval", type=float, default=0.5)
+    parser.add_argument("--write-every", type=int, default=10)
+    parser.add_argument("--server-pid", type=int, help="hypercorn's pid, to report the server's CPU time")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,53 @@
+# Startup time budget: times `import main` (module imports plus create_app) in fresh
+# interpreters and lists the slowest imports from `python -X importtime`.
+#
+#   python -m benchmarks import-time --budget-ms 1500
+#
+# Exits with 1 when the best of --runs runs is over budget. tests/test_import_time.py runs
+# the same check under pytest. Nothing here needs a database: the engine is only created
+# by the first query.
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TIMED_IMPORT = "import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+
+
+def _run(module: str) -> tuple[float, str]:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", TIMED_IMPORT.format(module=module)],
+        capture_output=True, text=True, check=True, cwd=ROOT, env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+    )
+    return float(result.stdout.strip().splitlines()[-1]) * 1000, result.stderr
+
+
+def slowest_imports(importtime_output: str, count: int) -> list[tuple[str, float, float]]:
+    # Lines look like "import time:       120 |       3456 |   package.module", the
+    # indentation of the name is its depth in the import tree
+    imports = []
+    for line in importtime_output.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        imports.append((name.rstrip(), int(self_us) / 1000, int(cumulative_us) / 1000))
+    return sorted(imports, key=lambda item: item[2], reverse=True)[:count]
+
+
+def best_import(module: str, runs: int) -> tuple[float, str]:
+    # The first run also pays for cold disk caches, the best run is what a warm container sees
+    return min((_run(module) for _ in range(runs)), key=lambda run: run[0])
+
+
+def check_import_time(module: str, runs: int, budget_ms: float | None, top: int) -> bool:
+    best_ms, best_output = best_import(module, runs)
+
+    print(f"import {module}: {best_ms:.1f}ms (best of {runs})")
+    print(f"{'cumulative':>11} {'self':>11}  module")
+    for name, self_ms, cumulative_ms in slowest_imports(best_output, top):
+        print(f"{cumulative_ms:9.1f}ms {self_ms:9.1f}ms  {name}")
+
+    if budget_ms is not None and best_ms > budget_ms:
+        print(f"over the {budget_ms:.0f}ms budget")
+        return False
+    return True
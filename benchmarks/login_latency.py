@@ -0,0 +1,66 @@
+# Measures p50/p99 latency of GET /api/v1/users/todos/ while a burst of logins is in flight.
+#
+#   RATE_LIMIT_BACKEND=none hypercorn main:app --bind 127.0.0.1:8000
+#   python -m benchmarks.login_latency --base-url http://127.0.0.1:8000 --logins 200 --concurrency 20
+#
+# Run it once against the baseline and once with the worker pool to compare the list latency.
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+import httpx
+
+from benchmarks.common import percentile, signup_and_login
+
+
+async def login_burst(client: httpx.AsyncClient, username: str, password: str, logins: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    statuses: dict[int, int] = {}
+
+    async def login():
+        async with semaphore:
+            response = await client.post("/api/v1/auth/login", json={"username": username, "password": password})
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    await asyncio.gather(*(login() for _ in range(logins)))
+    return statuses
+
+
+async def poll_todos(client: httpx.AsyncClient, headers: dict[str, str], stop: asyncio.Event) -> list[float]:
+    latencies = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        await client.get("/api/v1/users/todos/", headers=headers)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+async def main(args):
+    username = f"bench_{uuid.uuid4().hex[:8]}"
+    password = "bench-password"
+
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=60) as client:
+        headers = await signup_and_login(client, username, password)
+
+        stop = asyncio.Event()
+        poller = asyncio.create_task(poll_todos(client, headers, stop))
+        started = time.perf_counter()
+        statuses = await login_burst(client, username, password, args.logins, args.concurrency)
+        elapsed = time.perf_counter() - started
+        stop.set()
+        latencies = await poller
+
+    print(f"logins: {args.logins} in {elapsed:.2f}s, statuses: {statuses}")
+    print(f"todo list requests: {len(latencies)}")
+    print(f"p50: {statistics.median(latencies):.1f}ms  p99: {percentile(latencies, 99):.1f}ms  "
+          f"max: {max(latencies):.1f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,159 @@
+# Seeds a large todos table with generate_series and times the hot read queries on it, to
+# compare the plain table, the archived table and the hash-partitioned one.
+#
+#   python -m benchmarks.partitioning --rows 50000000 --users 100000
+#   python -m benchmarks.partitioning --skip-seed --archive
+#   python -m migrations --target 5
+#   python -m benchmarks.partitioning --skip-seed
+#   python -m benchmarks compare bench_results/<before>.json bench_results/<after>.json
+#
+# Seeding 50M rows takes a while and several GB of disk. The seeded users and their todos
+# stay in place so later runs can use --skip-seed; pass --cleanup to remove them at the end.
+import argparse
+import asyncio
+import random
+import time
+
+from sqlalchemy import text
+
+from benchmarks.common import summarize, write_results
+from database import async_session, get_engine, read_only_session
+from jobs.tasks import ARCHIVE
+from services.todo_service import TodoService
+from services.user_todo_service import UserTodoService
+
+USER_PREFIX = "partition_bench_"
+SEED_CHUNK = 1_000_000
+
+
+async def seed(rows: int, users: int, completed: float) -> None:
+    async with async_session() as session:
+        await session.execute(text(
+            "INSERT INTO users (username, first_name, last_name, email, birthdate, password, created_at) "
+            "SELECT :prefix || n, 'Partition', 'Bench', :prefix || n || '@example.com', '1990-01-01', 'x', now() "
+            "FROM generate_series(1, :users) AS n ON CONFLICT DO NOTHING"
+        ), {"prefix": USER_PREFIX, "users": users})
+        await session.commit()
+
+    # Row n belongs to seeded user n % users, is up to a year old and completed for the
+    # first `completed` fraction of every hundred rows, a day after it was created
+    for start in range(1, rows + 1, SEED_CHUNK):
+        stop = min(rows, start + SEED_CHUNK - 1)
+        started = time.perf_counter()
+        async with async_session() as session:
+            await session.execute(text(
+                "INSERT INTO todos (label, user_id, created_at, updated_at, completed, completed_at) "
+                "SELECT 'todo ' || n, u.user_id, t.created_at, t.created_at, n % 100 < :completed, "
+                "CASE WHEN n % 100 < :completed THEN t.created_at + interval '1 day' END "
+                "FROM generate_series(:start, :stop) AS n "
+                "JOIN users u ON u.username = :prefix || (n % :users + 1) "
+                "CROSS JOIN LATERAL (SELECT now() - (n % 365) * interval '1 day' AS created_at) t"
+            ), {"start": start, "stop": stop, "users": users, "completed": int(completed * 100), "prefix": USER_PREFIX})
+            await session.commit()
+        print(f"seeded rows {start}-{stop} in {time.perf_counter() - started:.1f}s")
+
+    async with async_session() as session:
+        await session.execute(text("ANALYZE todos"))
+        await session.commit()
+
+
+async def seeded_user_ids() -> list[int]:
+    async with async_session() as session:
+        result = await session.execute(text("SELECT user_id FROM users WHERE username LIKE :prefix"),
+                                       {"prefix": USER_PREFIX + "%"})
+        return result.scalars().all()
+
+
+async def archive(days: int, batch_size: int) -> None:
+    moved = 0
+    started = time.perf_counter()
+    while True:
+        async with async_session() as session:
+            result = await session.execute(ARCHIVE, {"days": days, "batch_size": batch_size})
+            count = len(result.scalars().all())
+            await session.commit()
+        moved += count
+        if count < batch_size:
+            break
+    print(f"archived {moved} todos in {time.perf_counter() - started:.1f}s")
+
+    # VACUUM can't run inside a transaction
+    async with get_engine().connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text("VACUUM ANALYZE todos"))
+
+
+async def table_size() -> int:
+    async with async_session() as session:
+        # Sums the partitions too when todos is partitioned
+        return (await session.execute(text(
+            "SELECT coalesce(sum(pg_total_relation_size(relid)), 0) FROM pg_partition_tree('todos')"
+        ))).scalar_one()
+
+
+async def measure(user_ids: list[int], queries: int) -> dict:
+    operations = {}
+
+    async def timed(name: str, run) -> None:
+        latencies = []
+        started = time.perf_counter()
+        for _ in range(queries):
+            start = time.perf_counter()
+            await run()
+            latencies.append((time.perf_counter() - start) * 1000)
+        operations[name] = (latencies, time.perf_counter() - started)
+
+    async with read_only_session() as session:
+        user_todos = UserTodoService(session)
+        todos = TodoService(session)
+
+        await timed("list", lambda: user_todos.get_todos(random.choice(user_ids), 0, 10))
+        await timed("archived", lambda: user_todos.get_archived_todos(random.choice(user_ids), 10))
+        await timed("search", lambda: user_todos.search_todos(random.choice(user_ids), "todo 1", 10))
+        await timed("global", lambda: todos.get_todos(random.randrange(0, 10_000), 10))
+
+    every = [latency for latencies, _ in operations.values() for latency in latencies]
+    return {
+        "overall": summarize(every, sum(seconds for _, seconds in operations.values())),
+        "operations": {name: summarize(latencies, seconds) for name, (latencies, seconds) in operations.items()},
+    }
+
+
+async def cleanup() -> None:
+    async with async_session() as session:
+        await session.execute(text("DELETE FROM users WHERE username LIKE :prefix"), {"prefix": USER_PREFIX + "%"})
+        await session.commit()
+
+
+async def main(args):
+    if not args.skip_seed:
+        await seed(args.rows, args.users, args.completed)
+    if args.archive:
+        await archive(args.archive_after_days, args.batch_size)
+
+    user_ids = await seeded_user_ids()
+    results = await measure(user_ids, args.queries)
+    results["table_bytes"] = await table_size()
+
+    for name, stats in results["operations"].items():
+        print(f"{name:>8}: p50 {stats['p50_ms']:.2f}ms  p95 {stats['p95_ms']:.2f}ms  p99 {stats['p99_ms']:.2f}ms")
+    print(f"todos size: {results['table_bytes'] / 1024 ** 3:.2f} GB")
+    print(f"results written to {write_results(results, args.output)}")
+
+    if args.cleanup:
+        await cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=50_000_000)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--completed", type=float, default=0.5, help="fraction of seeded todos marked completed")
+    parser.add_argument("--skip-seed", action="store_true")
+    parser.add_argument("--archive", action="store_true", help="archive old completed todos before measuring")
+    parser.add_argument("--archive-after-days", type=int, default=30)
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--output")
+    parser.add_argument("--cleanup", action="store_true", help="delete the seeded users and todos at the end")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,53 @@
+# Memory per page and rows/sec of the todo read paths, no database needed.
+#
+#   python -m benchmarks.read_models
+#
+# Compares hydrating full SQLModel Todo instances (what select(Todo) did) with the
+# TodoRead projection the list and detail queries use now.
+import datetime
+import time
+import tracemalloc
+
+from models.todo import Todo
+from models.todo_read import TodoRead
+
+
+def make_values(count: int) -> list[tuple]:
+    now = datetime.datetime.now(datetime.UTC)
+    return [(index, f"todo number {index}", now) for index in range(count)]
+
+
+def orm_page(values):
+    return [Todo(id=todo_id, label=label, user_id=1, created_at=created_at, updated_at=created_at)
+            for todo_id, label, created_at in values]
+
+
+def read_model_page(values):
+    return [TodoRead(*value) for value in values]
+
+
+def measure(build, values) -> tuple[float, float]:
+    tracemalloc.start()
+    page = build(values)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del page
+
+    rounds = max(1, 20_000 // len(values))
+    start = time.perf_counter()
+    for _ in range(rounds):
+        build(values)
+    rows_per_second = rounds * len(values) / (time.perf_counter() - start)
+    return size / len(values), rows_per_second
+
+
+def main():
+    for count in (10, 100, 1000):
+        values = make_values(count)
+        for name, build in (("orm", orm_page), ("read model", read_model_page)):
+            bytes_per_row, rows_per_second = measure(build, values)
+            print(f"{count:>5} rows  {name:>10}: {bytes_per_row:8.0f} bytes/row  {rows_per_second:12,.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# Seeds one user with --todos todos and times UserTodoService.search_todos against them.
+#
+#   python -m benchmarks.search --todos 100000 --queries 200
+#
+# Needs the database from .env with the schema and search indexes in place. The seeded
+# user is removed again at the end (todos go with it through ON DELETE CASCADE).
+import argparse
+import asyncio
+import random
+import statistics
+import time
+import uuid
+
+from sqlalchemy import text
+
+from database import async_session, read_only_session
+from services.user_todo_service import UserTodoService
+
+WORDS = ("buy", "milk", "call", "mom", "fix", "bike", "write", "report", "book", "flight", "pay", "rent",
+         "clean", "kitchen", "review", "pull", "request", "water", "plants", "renew", "passport")
+
+
+async def seed(todos: int) -> int:
+    username = f"search_{uuid.uuid4().hex[:8]}"
+    async with async_session() as session:
+        user_id = (await session.execute(text(
+            "INSERT INTO users (username, first_name, last_name, email, birthdate, password, created_at) "
+            "VALUES (:username, 'Search', 'Bench', :email, '1990-01-01', 'x', now()) RETURNING user_id"
+        ), {"username": username, "email": f"{username}@example.com"})).scalar_one()
+
+        # Labels are three pseudo-random words plus the row number to keep them unique
+        words = "ARRAY[" + ",".join(f"'{word}'" for word in WORDS) + "]"
+        await session.execute(text(
+            "INSERT INTO todos (label, user_id, created_at, updated_at) "
+            f"SELECT ({words})[1 + (n * 7) % {len(WORDS)}] || ' ' || ({words})[1 + (n * 13) % {len(WORDS)}] "
+            f"|| ' ' || ({words})[1 + (n * 17) % {len(WORDS)}] || ' ' || n, :user_id, now(), now() "
+            "FROM generate_series(1, :todos) AS n"
+        ), {"user_id": user_id, "todos": todos})
+        await session.execute(text("ANALYZE todos"))
+        await session.commit()
+    return user_id
+
+
+async def cleanup(user_id: int) -> None:
+    async with async_session() as session:
+        await session.execute(text("DELETE FROM users WHERE user_id = :user_id"), {"user_id": user_id})
+        await session.commit()
+
+
+def make_queries(count: int) -> list[str]:
+    queries = []
+    for _ in range(count):
+        kind = random.choice(("words", "prefix", "typo"))
+        word = random.choice(WORDS)
+        if kind == "words":
+            queries.append(f"{word} {random.choice(WORDS)}")
+        elif kind == "prefix":
+            queries.append(word[:3])
+        else:
+            queries.append(word[:-1] + "x")
+    return queries
+
+
+async def main(args):
+    started = time.perf_counter()
+    user_id = await seed(args.todos)
+    print(f"seeded {args.todos} todos in {time.perf_counter() - started:.1f}s")
+
+    try:
+        latencies = []
+        async with read_only_session() as session:
+            service = UserTodoService(session)
+            for q in make_queries(args.queries):
+                start = time.perf_counter()
+                await service.search_todos(user_id, q, args.limit)
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        latencies.sort()
+        print(f"queries: {len(latencies)}  p50: {statistics.median(latencies):.2f}ms  "
+              f"p95: {latencies[int(len(latencies) * 0.95)]:.2f}ms  max: {latencies[-1]:.2f}ms")
+    finally:
+        await cleanup(user_id)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--todos", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=10)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,45 @@
+# Seeds bench_user_0..N-1, each with --todos todos, through the same service code the API uses.
+#
+#   python -m benchmarks seed --users 20 --todos 1000
+import asyncio
+
+from sqlalchemy import select
+
+from benchmarks.common import PASSWORD, username_for
+from database import async_session
+from models.user import User
+from requests import CreateTodoRequest, CreateUserRequest, BULK_MAX_ITEMS
+from services.user_service import UserService
+from services.user_todo_service import UserTodoService
+
+
+async def seed_user(index: int, todos: int) -> None:
+    username = username_for(index)
+    async with async_session() as session:
+        user_id = (await session.execute(select(User.user_id).where(User.username == username))).scalar()
+        if user_id is None:
+            user = await UserService(session).create_user(CreateUserRequest(
+                first_name="Bench",
+                last_name="User",
+                email=f"{username}@example.com",
+                birthdate="1990-01-01",
+                username=username,
+                password=PASSWORD,
+            ))
+            user_id = user.user_id
+
+        service = UserTodoService(session)
+        for start in range(0, todos, BULK_MAX_ITEMS):
+            items = [CreateTodoRequest(label=f"seeded todo {number}")
+                     for number in range(start, min(todos, start + BULK_MAX_ITEMS))]
+            await service.create_todos(user_id, items)
+
+
+async def seed(users: int, todos: int, concurrency: int = 4) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def seed_one(index: int):
+        async with semaphore:
+            await seed_user(index, todos)
+
+    await asyncio.gather(*(seed_one(index) for index in range(users)))
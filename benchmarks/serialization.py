@@ -0,0 +1,49 @@
+# Microbenchmark of the todo list response pipeline, no database or server needed.
+#
+#   python -m benchmarks.serialization
+#
+# "before" is what FastAPI did for response_model=list[Todo]: validate the ORM objects
+# against the model, run jsonable_encoder and dump with the stdlib json module.
+# "after" builds the TodoRead read models from the selected row tuples and encodes them with orjson.
+import datetime
+import json
+import timeit
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from encoders import encode_todos
+from models.todo import Todo
+from models.todo_read import TodoRead
+
+
+def make_values(count: int) -> list[tuple]:
+    now = datetime.datetime.now(datetime.UTC)
+    return [(index, f"todo number {index}", now) for index in range(count)]
+
+
+def before(values, adapter: TypeAdapter) -> bytes:
+    todos = [Todo(id=todo_id, label=label, user_id=1, created_at=created_at, updated_at=created_at)
+             for todo_id, label, created_at in values]
+    validated = adapter.validate_python(todos, from_attributes=True)
+    return json.dumps(jsonable_encoder(validated)).encode("utf-8")
+
+
+def after(values) -> bytes:
+    return encode_todos([TodoRead(*value) for value in values])
+
+
+def main():
+    adapter = TypeAdapter(list[Todo])
+    for count in (10, 100, 1000):
+        values = make_values(count)
+        number = max(10, 10_000 // count)
+
+        before_time = min(timeit.repeat(lambda: before(values, adapter), number=number, repeat=5)) / number
+        after_time = min(timeit.repeat(lambda: after(values), number=number, repeat=5)) / number
+        print(f"{count:>5} rows: before {before_time * 1e6:9.1f}us  after {after_time * 1e6:9.1f}us  "
+              f"speedup {before_time / after_time:5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+# Mixed API workload against /api/v1/users/todos, either in-process through ASGI or
+# against a running server (--base-url). Users have to be seeded first. Every virtual user
+# logs in from the same address, so the server has to run without the rate limiter; the
+# in-process app turns it off unless RATE_LIMIT_BACKEND is set.
+#
+#   python -m benchmarks run --users 20 --concurrency 50 --duration 30
+#   RATE_LIMIT_BACKEND=none hypercorn --config python:server_config main:app --bind 127.0.0.1:8000
+#   python -m benchmarks run --base-url http://127.0.0.1:8000 --output bench_results/main.json
+import asyncio
+import os
+import random
+import re
+import time
+import uuid
+
+import httpx
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from benchmarks.common import login, summarize, username_for
+
+SERVER_TIMING_STATEMENTS = re.compile(r'db;dur=[\d.]+;desc="(\d+) statements"')
+OPERATIONS = ("list", "get", "create", "update", "delete", "login")
+DEFAULT_WEIGHTS = (60, 10, 10, 10, 5, 5)
+
+
+class QueryCounter:
+    # Counts statements on every engine in this process, only meaningful in-process
+    def __init__(self):
+        self.count = 0
+        event.listen(Engine, "before_cursor_execute", self._count)
+
+    def _count(self, *args, **kwargs):
+        self.count += 1
+
+    def close(self):
+        event.remove(Engine, "before_cursor_execute", self._count)
+
+
+class VirtualUser:
+    def __init__(self, client: httpx.AsyncClient, username: str, headers: dict[str, str], rng: random.Random):
+        self.client = client
+        self.username = username
+        self.headers = headers
+        self.rng = rng
+        self.todo_ids: list[int] = []
+
+    async def list(self):
+        response = await self.client.get("/api/v1/users/todos/", params={"limit": 20}, headers=self.headers)
+        if response.status_code == 200:
+            self.todo_ids = [todo["id"] for todo in response.json()]
+        return response
+
+    async def get(self):
+        if not self.todo_ids:
+            return await self.list()
+        todo_id = self.rng.choice(self.todo_ids)
+        return await self.client.get(f"/api/v1/users/todos/{todo_id}", headers=self.headers)
+
+    async def create(self):
+        response = await self.client.post("/api/v1/users/todos/", json={"label": uuid.uuid4().hex},
+                                          headers=self.headers)
+        if response.status_code == 201:
+            self.todo_ids.append(response.json()["todo_id"])
+        return response
+
+    async def update(self):
+        if not self.todo_ids:
+            return await self.create()
+        todo_id = self.rng.choice(self.todo_ids)
+        return await self.client.patch("/api/v1/users/todos/", json={"id": todo_id, "label": uuid.uuid4().hex},
+                                       headers=self.headers)
+
+    async def delete(self):
+        if not self.todo_ids:
+            return await self.create()
+        todo_id = self.todo_ids.pop(self.rng.randrange(len(self.todo_ids)))
+        return await self.client.delete(f"/api/v1/users/todos/{todo_id}", headers=self.headers)
+
+    async def login(self):
+        self.headers = await login(self.client, self.username)
+
+
+async def run_workload(base_url: str | None, users: int, concurrency: int, duration: float,
+                       weights: tuple[int, ...] = DEFAULT_WEIGHTS, seed: int = 0) -> dict:
+    counter = None
+    if base_url is None:
+        os.environ.setdefault("RATE_LIMIT_BACKEND", "none")
+        from main import app
+        transport = httpx.ASGITransport(app=app)
+        base_url = "http://benchmark"
+        counter = QueryCounter()
+    else:
+        transport = None
+
+    # Against a remote server the statement counts come from the Server-Timing header
+    remote_statements = 0
+    latencies: dict[str, list[float]] = {operation: [] for operation in OPERATIONS}
+    errors: dict[str, int] = {operation: 0 for operation in OPERATIONS}
+
+    async with httpx.AsyncClient(transport=transport, base_url=base_url, timeout=60) as client:
+        virtual_users = []
+        for index in range(concurrency):
+            username = username_for(index % users)
+            virtual_users.append(VirtualUser(client, username, await login(client, username),
+                                             random.Random(seed + index)))
+
+        queries_before = counter.count if counter else 0
+        started = time.perf_counter()
+        deadline = started + duration
+
+        async def drive(user: VirtualUser):
+            nonlocal remote_statements
+            while time.perf_counter() < deadline:
+                operation = user.rng.choices(OPERATIONS, weights)[0]
+                start = time.perf_counter()
+                try:
+                    response = await getattr(user, operation)()
+                    failed = response is not None and response.status_code >= 400
+                    if response is not None and counter is None:
+                        match = SERVER_TIMING_STATEMENTS.search(response.headers.get("server-timing", ""))
+                        remote_statements += int(match.group(1)) if match else 0
+                except httpx.HTTPError:
+                    failed = True
+                latencies[operation].append((time.perf_counter() - start) * 1000)
+                errors[operation] += failed
+
+        await asyncio.gather(*(drive(user) for user in virtual_users))
+        elapsed = time.perf_counter() - started
+
+    total_requests = sum(len(values) for values in latencies.values())
+    results = {
+        "mode": "asgi" if counter else "http",
+        "users": users,
+        "concurrency": concurrency,
+        "duration_s": elapsed,
+        "overall": summarize([value for values in latencies.values() for value in values], elapsed),
+        "operations": {
+            operation: {**summarize(values, elapsed), "errors": errors[operation]}
+            for operation, values in latencies.items()
+        },
+    }
+    if counter:
+        results["overall"]["db_queries_per_request"] = (counter.count - queries_before) / max(1, total_requests)
+        counter.close()
+    else:
+        results["overall"]["db_queries_per_request"] = remote_statements / max(1, total_requests)
+    return results
@@ -0,0 +1,117 @@
+import time
+from collections import OrderedDict
+
+
+class LRUBackend:
+    # In-process backend bounded by the total size of the stored values. Every worker
+    # process has its own copy, so it's only coherent for single process deployments.
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._data: OrderedDict[str, tuple[float | None, bytes]] = OrderedDict()
+
+    async def get(self, key: str) -> bytes | None:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._remove(key)
+            return None
+
+        self._data.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: float | None = None) -> None:
+        if len(value) > self.max_bytes:
+            return
+
+        self._remove(key)
+        expires_at = time.monotonic() + ttl if ttl else None
+        self._data[key] = (expires_at, value)
+        self.size += len(value)
+
+        while self.size > self.max_bytes:
+            oldest = next(iter(self._data))
+            self._remove(oldest)
+
+    async def add(self, key: str, value: bytes, ttl: float | None = None) -> bool:
+        # Sets the key only when it's missing, returns whether it did
+        if await self.get(key) is not None:
+            return False
+        await self.set(key, value, ttl)
+        return True
+
+    async def delete(self, key: str) -> None:
+        self._remove(key)
+
+    async def incr(self, key: str) -> int:
+        value = int(await self.get(key) or 0) + 1
+        await self.set(key, str(value).encode())
+        return value
+
+    def _remove(self, key: str) -> None:
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[1])
+
+
+class RedisBackend:
+    # Works with redis.asyncio.Redis or anything exposing the same get/set/delete/incr coroutines
+    def __init__(self, client):
+        self.client = client
+
+    async def get(self, key: str) -> bytes | None:
+        return await self.client.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: float | None = None) -> None:
+        await self.client.set(key, value, ex=int(ttl) if ttl else None)
+
+    async def add(self, key: str, value: bytes, ttl: float | None = None) -> bool:
+        return bool(await self.client.set(key, value, ex=int(ttl) if ttl else None, nx=True))
+
+    async def delete(self, key: str) -> None:
+        await self.client.delete(key)
+
+    async def incr(self, key: str) -> int:
+        return await self.client.incr(key)
+
+
+class FakeRedis:
+    # Dict backed stand-in for a Redis client, for local development without a Redis server.
+    # Lua scripts can't run here, so users of eval register a Python equivalent on the
+    # instance they use, see register_script.
+    def __init__(self):
+        self._data: dict[str, tuple[float | None, bytes]] = {}
+        self.scripts: dict = {}
+
+    def register_script(self, script: str, fn) -> None:
+        # fn(client, keys, args) is awaited instead of the Lua source
+        self.scripts[script] = fn
+
+    async def get(self, key: str) -> bytes | None:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[0] is not None and entry[0] <= time.monotonic():
+            del self._data[key]
+            return None
+        return entry[1]
+
+    async def set(self, key: str, value: bytes, ex: int | None = None, nx: bool = False) -> bool | None:
+        if nx and await self.get(key) is not None:
+            return None
+        self._data[key] = (time.monotonic() + ex if ex else None, value)
+        return True
+
+    async def delete(self, *keys: str) -> int:
+        return sum(self._data.pop(key, None) is not None for key in keys)
+
+    async def incr(self, key: str) -> int:
+        value = int(await self.get(key) or 0) + 1
+        self._data[key] = (None, str(value).encode())
+        return value
+
+    async def eval(self, script: str, numkeys: int, *args):
+        return await self.scripts[script](self, args[:numkeys], args[numkeys:])
@@ -0,0 +1,111 @@
+import orjson
+from decouple import config
+
+from cache.backends import FakeRedis, LRUBackend, RedisBackend
+from cache.singleflight import SingleFlight
+
+TODO_CACHE_BACKEND = config("TODO_CACHE_BACKEND", default="memory")  # memory, redis, fake-redis or none
+TODO_CACHE_MAX_BYTES = config("TODO_CACHE_MAX_BYTES", default=64 * 1024 * 1024, cast=int)
+TODO_CACHE_TTL = config("TODO_CACHE_TTL", default=300, cast=int)
+# Seconds a cached todos_version is trusted, and so how long another worker's write can go unseen
+TODO_CACHE_VERSION_TTL = config("TODO_CACHE_VERSION_TTL", default=2, cast=int)
+REDIS_URL = config("REDIS_URL", default="redis://localhost:6379/0")
+
+
+def list_key(offset: int | None, limit: int | None, cursor: str | None) -> str:
+    return f"list:{offset}:{limit}:{cursor}"
+
+
+def _pack(body: bytes, headers: dict[str, str]) -> bytes:
+    # orjson never emits a newline, so it can separate the headers from the body
+    return orjson.dumps(headers) + b"\n" + body
+
+
+def _unpack(value: bytes) -> tuple[bytes, dict[str, str]]:
+    headers, _, body = value.partition(b"\n")
+    return body, orjson.loads(headers)
+
+
+class TodoCache:
+    # Entries are keyed by the response's ETag, which is derived from the user's
+    # todos_version (see UserTodoService.get_todos_version), so an entry is only ever served
+    # for the data it was rendered from and outdated ones fall out through the LRU or their
+    # TTL. The version itself is kept for version_ttl seconds, which lets hits and 304s skip
+    # the database: a worker drops its copy after its own writes, writes made anywhere else
+    # show up once the copy expires. So the per-process default is fine with any number of
+    # workers, redis only saves each of them from loading the same pages.
+    def __init__(self, backend, ttl: int, version_ttl: int, shared: bool = False):
+        self.backend = backend
+        self.ttl = ttl
+        self.version_ttl = version_ttl
+        # Whether other processes see our entries, only then is warming from a job useful
+        self.shared = shared
+        # Identical misses arriving together run one query instead of one each
+        self.loads = SingleFlight()
+
+    @staticmethod
+    def _version_key(user_id: int) -> str:
+        return f"todos:{user_id}:version"
+
+    async def version(self, user_id: int) -> int | None:
+        version = await self.backend.get(self._version_key(user_id))
+        return int(version) if version is not None else None
+
+    async def set_version(self, user_id: int, version: int) -> None:
+        await self.backend.set(self._version_key(user_id), str(version).encode(), self.version_ttl)
+
+    async def invalidate(self, user_id: int) -> None:
+        await self.backend.delete(self._version_key(user_id))
+
+    async def get(self, user_id: int, key: str) -> tuple[bytes, dict[str, str]] | None:
+        value = await self.backend.get(f"todos:{user_id}:{key}")
+        return _unpack(value) if value is not None else None
+
+    async def get_or_load(self, user_id: int, key: str, loader) -> tuple[bytes, dict[str, str]]:
+        entry_key = f"todos:{user_id}:{key}"
+        value = await self.backend.get(entry_key)
+        if value is not None:
+            return _unpack(value)
+
+        async def load():
+            body, headers = await loader()
+            await self.backend.set(entry_key, _pack(body, headers), self.ttl)
+            return body, headers
+
+        return await self.loads.do(entry_key, load)
+
+
+class NullTodoCache(TodoCache):
+    def __init__(self):
+        super().__init__(backend=None, ttl=0, version_ttl=0)
+
+    async def version(self, user_id: int) -> int | None:
+        return None
+
+    async def set_version(self, user_id: int, version: int) -> None:
+        pass
+
+    async def invalidate(self, user_id: int) -> None:
+        pass
+
+    async def get(self, user_id: int, key: str) -> tuple[bytes, dict[str, str]] | None:
+        return None
+
+    async def get_or_load(self, user_id: int, key: str, loader) -> tuple[bytes, dict[str, str]]:
+        return await loader()
+
+
+def create_todo_cache() -> TodoCache:
+    if TODO_CACHE_BACKEND == "none":
+        return NullTodoCache()
+    if TODO_CACHE_BACKEND == "fake-redis":
+        return TodoCache(RedisBackend(FakeRedis()), TODO_CACHE_TTL, TODO_CACHE_VERSION_TTL)
+    if TODO_CACHE_BACKEND == "redis":
+        # Imported on demand, the other backends never pay for loading the client
+        from redis.asyncio import Redis
+        return TodoCache(RedisBackend(Redis.from_url(REDIS_URL)), TODO_CACHE_TTL, TODO_CACHE_VERSION_TTL,
+                         shared=True)
+    return TodoCache(LRUBackend(TODO_CACHE_MAX_BYTES), TODO_CACHE_TTL, TODO_CACHE_VERSION_TTL)
+
+
+todo_cache = create_todo_cache()
@@ -0,0 +1,123 @@
+import asyncio
+import contextlib
+from typing import Callable
+
+import asyncpg
+import orjson
+from decouple import config
+
+import metrics
+from database import database_url
+
+# The todos_changed trigger (migration m0006) notifies on this channel for every write to todos
+CHANGE_FEED_CHANNEL = "todo_changes"
+# Events a slow subscriber may fall behind by before it is told to resync instead
+CHANGE_FEED_QUEUE_SIZE = config("CHANGE_FEED_QUEUE_SIZE", default=64, cast=int)
+CHANGE_FEED_KEEPALIVE = config("CHANGE_FEED_KEEPALIVE", default=15, cast=float)
+CHANGE_FEED_RECONNECT_DELAY = config("CHANGE_FEED_RECONNECT_DELAY", default=1, cast=float)
+# Consecutive failures double the delay up to this
+CHANGE_FEED_RECONNECT_MAX_DELAY = config("CHANGE_FEED_RECONNECT_MAX_DELAY", default=30, cast=float)
+
+RESYNC = b'event: resync\ndata: {"type":"resync"}\n\n'
+KEEPALIVE = b": keepalive\n\n"
+
+subscribers_gauge = metrics.Gauge("change_feed_subscribers", "Open change feed streams",
+                                  lambda: change_feed.subscriber_count)
+dropped_events = metrics.Counter("change_feed_resyncs_total", "Subscribers told to resync after falling behind")
+
+
+class ChangeFeed:
+    # One LISTEN connection per worker fans out to every subscriber of that worker. Each
+    # stream subscribes with its own bounded queue of pre-encoded SSE frames, and a user's
+    # queues are kept in one set, so an idle stream costs a queue and a set entry.
+    def __init__(self, connect_kwargs: Callable[[], dict], queue_size: int):
+        self.connect_kwargs = connect_kwargs
+        self.queue_size = queue_size
+        self.subscribers: dict[int, set[asyncio.Queue]] = {}
+        self._listener: asyncio.Task | None = None
+        self._connection: asyncpg.Connection | None = None
+
+    @property
+    def subscriber_count(self) -> int:
+        return sum(len(queues) for queues in self.subscribers.values())
+
+    @contextlib.asynccontextmanager
+    async def subscribe(self, user_id: int):
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._listen())
+
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self.subscribers.setdefault(user_id, set()).add(queue)
+        try:
+            yield queue
+        finally:
+            queues = self.subscribers.get(user_id)
+            if queues is not None:
+                queues.discard(queue)
+                if not queues:
+                    del self.subscribers[user_id]
+
+    def publish(self, user_id: int, frame: bytes) -> None:
+        for queue in self.subscribers.get(user_id, ()):
+            self._put(queue, frame)
+
+    def _put(self, queue: asyncio.Queue, frame: bytes) -> None:
+        try:
+            queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            # The client missed events anyway, one resync replaces everything it hasn't read
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(RESYNC)
+            dropped_events.inc()
+
+    def _on_notification(self, connection, pid, channel, payload: str) -> None:
+        event = orjson.loads(payload)
+        user_id = event.get("user_id")
+        if user_id in self.subscribers:
+            self.publish(user_id, f"event: {event['type']}\ndata: {payload}\n\n".encode())
+
+    async def _listen(self) -> None:
+        failures = 0
+        while self.subscribers:
+            lost = asyncio.Event()
+            try:
+                self._connection = await asyncpg.connect(**self.connect_kwargs())
+                self._connection.add_termination_listener(lambda connection: lost.set())
+                await self._connection.add_listener(CHANGE_FEED_CHANNEL, self._on_notification)
+                failures = 0
+
+                # Anything committed before LISTEN took effect is lost, whether the streams were
+                # opened just now or we were reconnecting: every client has to refetch
+                for queues in self.subscribers.values():
+                    for queue in queues:
+                        self._put(queue, RESYNC)
+
+                await lost.wait()
+            except Exception as e:
+                # Anything but a cancellation, an error escaping here would end the feed for good
+                failures += 1
+                print(f"change feed listener failed ({failures} in a row), reconnecting: {e!r}")
+            finally:
+                if self._connection is not None and not self._connection.is_closed():
+                    with contextlib.suppress(Exception):
+                        await self._connection.close()
+                self._connection = None
+
+            await asyncio.sleep(min(CHANGE_FEED_RECONNECT_MAX_DELAY, CHANGE_FEED_RECONNECT_DELAY * 2 ** failures))
+
+    async def close(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._listener
+            self._listener = None
+
+
+def connect_kwargs() -> dict:
+    url = database_url()
+    return {"host": url.host, "port": url.port, "user": url.username, "password": url.password,
+            "database": url.database}
+
+
+change_feed = ChangeFeed(connect_kwargs, queue_size=CHANGE_FEED_QUEUE_SIZE)
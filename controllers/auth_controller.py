@@ -1,13 +1,14 @@
-import json
+import traceback
 
 from fastapi import Body, Response, status, HTTPException, Depends
 from sqlalchemy.exc import NoResultFound
 
 from auth.jwt_token import create_access_token
+from auth.user import get_current_user
 from deps import get_user_service
 from custom_exceptions import EmailDuplicationException, InvalidData, UserNotFoundException, \
-    UsernameDuplicationException
-from requests import CreateUserRequest, LoginRequest
+    UsernameDuplicationException, PasswordHasherBusyException
+from requests import ChangePasswordRequest, CreateUserRequest, LoginRequest
 
 from services.user_service import UserService
 
@@ -26,10 +27,9 @@ async def login(*, user_service: UserService = Depends(get_user_service),
         user = await user_service.login(request)
 
         access_token = create_access_token(
-            data={"sub": user.username},
+            data={"sub": user.username, "uid": user.user_id},
         )
-        return Response(status_code=status.HTTP_200_OK,
-                        content=json.dumps({"access_token": access_token, "token_type": "bearer"}))
+        return {"access_token": access_token, "token_type": "bearer"}
     except UserNotFoundException as e:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -38,6 +38,12 @@ async def login(*, user_service: UserService = Depends(get_user_service),
         )
     except NoResultFound:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid password or username")
+    except PasswordHasherBusyException as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail={
+            "message": str(e),
+            "code": "SERVICE_BUSY",
+            "status_code": status.HTTP_503_SERVICE_UNAVAILABLE,
+        }, headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail={
             "message": "Something went wrong",
@@ -70,6 +76,12 @@ async def create_user(*, user_service: UserService = Depends(get_user_service),
             "code": "USERNAME_DUPLICATION",
             "status_code": status.HTTP_409_CONFLICT,
         })
+    except PasswordHasherBusyException as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail={
+            "message": str(e),
+            "code": "SERVICE_BUSY",
+            "status_code": status.HTTP_503_SERVICE_UNAVAILABLE,
+        }, headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         print(e)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail={
@@ -77,3 +89,50 @@ async def create_user(*, user_service: UserService = Depends(get_user_service),
             "code": "INTERNAL_SERVER_ERROR",
             "status_code": status.HTTP_500_INTERNAL_SERVER_ERROR,
         })
+
+
+@auth_router.put("/users/me/password", response_class=Response, status_code=status.HTTP_204_NO_CONTENT)
+async def change_password(*, user_service: UserService = Depends(get_user_service),
+                          user=Depends(get_current_user), request: ChangePasswordRequest = Body()):
+    try:
+        await user_service.change_password(user.user_id, request)
+        return Response(status_code=status.HTTP_204_NO_CONTENT)
+    except UserNotFoundException as e:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=str(e),
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    except PasswordHasherBusyException as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail={
+            "message": str(e),
+            "code": "SERVICE_BUSY",
+            "status_code": status.HTTP_503_SERVICE_UNAVAILABLE,
+        }, headers={"Retry-After": str(e.retry_after)})
+    except Exception:
+        traceback.print_exc()
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail={
+            "message": "Something went wrong",
+            "code": "INTERNAL_SERVER_ERROR",
+            "status_code": status.HTTP_500_INTERNAL_SERVER_ERROR,
+        })
+
+
+@auth_router.delete("/users/me", response_class=Response, status_code=status.HTTP_204_NO_CONTENT)
+async def delete_user(*, user_service: UserService = Depends(get_user_service), user=Depends(get_current_user)):
+    try:
+        await user_service.delete_user(user.user_id)
+        return Response(status_code=status.HTTP_204_NO_CONTENT)
+    except UserNotFoundException as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail={
+            "message": str(e),
+            "code": "USER_NOT_FOUND",
+            "status_code": status.HTTP_404_NOT_FOUND,
+        })
+    except Exception:
+        traceback.print_exc()
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail={
+            "message": "Something went wrong",
+            "code": "INTERNAL_SERVER_ERROR",
+            "status_code": status.HTTP_500_INTERNAL_SERVER_ERROR,
+        })
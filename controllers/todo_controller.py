@@ -3,8 +3,11 @@ from typing import Annotated
 from sqlalchemy.exc import NoResultFound
 
 from auth.user import get_current_user
+from custom_exceptions import InvalidCursorException
 from deps import get_todo_service
 from models.todo import Todo
+from encoders import encode_todo, encode_todos
+from pagination import next_todo_cursor
 from requests import CreateTodoRequest, UpdateTodoRequest
 from responses import GetByUsernameResponse
 from services.todo_service import TodoService
@@ -17,27 +20,42 @@ todo_router = APIRouter(
 )
 
 
-@todo_router.get("/todos", response_model=list[Todo])
+@todo_router.get("/todos")
 async def get_todos(*,
                     todo_service: TodoService = Depends(get_todo_service),
                     offset: Annotated[int | None, Query()] = 0,
                     limit: Annotated[int | None, Query()] = 10,
+                    cursor: Annotated[str | None, Query()] = None,
                     current_user: GetByUsernameResponse = Depends(get_current_user),
                     ):
     print(current_user)  # @TODO We will use this later
 
-    todo_list = await todo_service.get_todos(offset, limit)
+    try:
+        todo_list = await todo_service.get_todos(offset, limit, cursor)
+    except InvalidCursorException as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail={
+            "message": str(e),
+            "code": "INVALID_CURSOR",
+            "status_code": status.HTTP_400_BAD_REQUEST,
+        })
+
+    headers = {}
+    next_cursor = next_todo_cursor(todo_list, limit)
+    if next_cursor is not None:
+        headers["X-Next-Cursor"] = next_cursor
 
-    return todo_list
+    # Rows are encoded directly, skipping response_model validation and jsonable_encoder
+    return Response(content=encode_todos(todo_list), media_type="application/json", headers=headers)
 
 
-@todo_router.get("/todos/{todo_id}", response_model=Todo)
+@todo_router.get("/todos/{todo_id}")
 async def get_todo(*,
                    todo_service: TodoService = Depends(get_todo_service),
                    todo_id: int
                    ):
     try:
-        return await todo_service.get_todo(todo_id)
+        todo = await todo_service.get_todo(todo_id)
+        return Response(content=encode_todo(todo), media_type="application/json")
     except NoResultFound as e:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail={
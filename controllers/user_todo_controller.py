@@ -1,15 +1,29 @@
-from typing import Annotated
+import asyncio
+from typing import Annotated, Literal
 
-from fastapi import APIRouter, status, Body, Depends, HTTPException, Response, Query
-from fastapi.responses import JSONResponse
+from decouple import config
+from fastapi import APIRouter, status, Body, Depends, HTTPException, Response, Query, Request
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from sqlalchemy.exc import NoResultFound
 
-from fastapi.encoders import jsonable_encoder
 from auth.user import get_current_user
+from cache.todo_cache import list_key, todo_cache
+from change_feed import CHANGE_FEED_KEEPALIVE, KEEPALIVE, change_feed
+from database import async_session
+from etags import etag_matches, make_etag
+from encoders import csv_header, encode_csv, encode_ndjson, encode_todo, encode_todos
+from importers import iter_lines, parse_csv_labels, parse_ndjson_labels
 from deps import get_user_todo_service
-from custom_exceptions import TodoDuplicationException
-from responses import GetByUsernameResponse
+from custom_exceptions import InvalidCursorException, InvalidData, TodoDuplicationException, TodoNotFoundException
+from pagination import next_search_cursor, next_todo_cursor
+from replicas import wants_primary
+from responses import BulkResponse, GetByUsernameResponse
 from services.user_todo_service import UserTodoService
-from requests import CreateTodoRequest, UpdateTodoRequest
+from requests import CreateTodoRequest, UpdateTodoRequest, BulkCreateTodosRequest, BulkUpdateTodosRequest, \
+    BulkDeleteTodosRequest
+
+EXPORT_BATCH_SIZE = config("EXPORT_BATCH_SIZE", default=1000, cast=int)
+IMPORT_BATCH_SIZE = config("IMPORT_BATCH_SIZE", default=5000, cast=int)
 
 user_todo_router = APIRouter(
     prefix="/users/todos",
@@ -17,6 +31,51 @@ user_todo_router = APIRouter(
 )
 
 
+def conditional_response(request: Request, etag: str) -> Response | None:
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    return None
+
+
+def with_etag(headers: dict[str, str], etag: str) -> dict[str, str]:
+    return {**headers, "ETag": etag, "Cache-Control": "private, no-cache"}
+
+
+# The ETag is derived from the user's todos_version and the page requested, so any worker
+# answers a revalidation the same way, with or without a todo cache. With the version
+# cached, a 304 or a cache hit never touches the database. Otherwise the version is read
+# on the request's own session before the page is loaded, and the page is cached under
+# that version: a replica that is behind stores it under the older version it belongs to.
+async def cached_response(request: Request, todo_service: UserTodoService, user_id: int, key: str,
+                          load) -> Response:
+    cached_version = None
+    if not wants_primary(request.headers, request.cookies):
+        cached_version = await todo_cache.version(user_id)
+
+    if cached_version is not None:
+        etag = make_etag(cached_version, key)
+        not_modified = conditional_response(request, etag)
+        if not_modified is not None:
+            return not_modified
+        cached = await todo_cache.get(user_id, etag)
+        if cached is not None:
+            body, headers = cached
+            return Response(content=body, media_type="application/json", headers=with_etag(headers, etag))
+
+    version = await todo_service.get_todos_version(user_id)
+    if cached_version is None or version > cached_version:
+        await todo_cache.set_version(user_id, version)
+
+    etag = make_etag(version, key)
+    if version != cached_version:
+        not_modified = conditional_response(request, etag)
+        if not_modified is not None:
+            return not_modified
+
+    body, headers = await todo_cache.get_or_load(user_id, etag, load)
+    return Response(content=body, media_type="application/json", headers=with_etag(headers, etag))
+
+
 @user_todo_router.post("/", status_code=status.HTTP_201_CREATED)
 async def create_todo(*, todo: CreateTodoRequest,
                       todo_service: UserTodoService = Depends(get_user_todo_service),
@@ -28,14 +87,12 @@ async def create_todo(*, todo: CreateTodoRequest,
         todo_id = new_todo.id
         label = new_todo.label
 
-        return JSONResponse(status_code=status.HTTP_201_CREATED,
-                            content=jsonable_encoder(
-                                {
-                                    "todo_id": todo_id,
-                                    "label": label,
-                                    "created_at": created_at,
-                                }
-                            ))
+        return ORJSONResponse(status_code=status.HTTP_201_CREATED,
+                              content={
+                                  "todo_id": todo_id,
+                                  "label": label,
+                                  "created_at": created_at,
+                              })
     except TodoDuplicationException as e:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail={
             "message": str(e),
@@ -50,37 +107,235 @@ async def create_todo(*, todo: CreateTodoRequest,
         })
 
 
+# Bulk routes have to be registered before the /{todo_id} ones
+@user_todo_router.post("/bulk", response_model=BulkResponse)
+async def create_todos(*,
+                       data: BulkCreateTodosRequest,
+                       todo_service: UserTodoService = Depends(get_user_todo_service),
+                       current_user: GetByUsernameResponse = Depends(get_current_user),
+                       ):
+    items = await todo_service.create_todos(current_user.user_id, data.items)
+    return BulkResponse(items=items)
+
+
+@user_todo_router.patch("/bulk", response_model=BulkResponse)
+async def update_todos(*,
+                       data: BulkUpdateTodosRequest,
+                       todo_service: UserTodoService = Depends(get_user_todo_service),
+                       current_user: GetByUsernameResponse = Depends(get_current_user),
+                       ):
+    try:
+        items = await todo_service.update_todos(current_user.user_id, data.items)
+        return BulkResponse(items=items)
+    except TodoDuplicationException as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail={
+            "message": str(e),
+            "code": "TODO_DUPLICATION",
+            "status_code": status.HTTP_409_CONFLICT,
+        })
+
+
+@user_todo_router.delete("/bulk", response_model=BulkResponse)
+async def delete_todos(*,
+                       data: BulkDeleteTodosRequest,
+                       todo_service: UserTodoService = Depends(get_user_todo_service),
+                       current_user: GetByUsernameResponse = Depends(get_current_user),
+                       ):
+    items = await todo_service.delete_todos(current_user.user_id, data.ids)
+    return BulkResponse(items=items)
+
+
+@user_todo_router.post("/import")
+async def import_todos(*,
+                       request: Request,
+                       format: Annotated[Literal["ndjson", "csv"] | None, Query()] = None,
+                       todo_service: UserTodoService = Depends(get_user_todo_service),
+                       current_user: GetByUsernameResponse = Depends(get_current_user),
+                       ):
+    if format is None:
+        format = "csv" if "csv" in request.headers.get("content-type", "") else "ndjson"
+    parse = parse_csv_labels if format == "csv" else parse_ndjson_labels
+
+    try:
+        labels = parse(iter_lines(request.stream()))
+        inserted, skipped = await todo_service.import_todos(current_user.user_id, labels, IMPORT_BATCH_SIZE)
+        return {"inserted": inserted, "skipped": skipped}
+    except InvalidData as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail={
+            "message": str(e),
+            "code": "INVALID_DATA",
+            "status_code": status.HTTP_400_BAD_REQUEST,
+        })
+
+
+@user_todo_router.get("/export")
+async def export_todos(*,
+                       format: Annotated[Literal["ndjson", "csv"], Query()] = "ndjson",
+                       current_user: GetByUsernameResponse = Depends(get_current_user),
+                       ):
+    user_id = current_user.user_id
+    encode = encode_csv if format == "csv" else encode_ndjson
+
+    # Dependency sessions are closed before the body is streamed, so the export owns its session
+    async def stream():
+        if format == "csv":
+            yield csv_header()
+        async with async_session() as session:
+            async for rows in UserTodoService(session).export_todos(user_id, EXPORT_BATCH_SIZE):
+                yield encode(rows)
+
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(stream(), media_type=media_type, headers={
+        "Content-Disposition": f'attachment; filename="todos.{format}"',
+    })
+
+
+@user_todo_router.get("/search")
+async def search_todos(*,
+                       request: Request,
+                       q: Annotated[str, Query(min_length=1, max_length=200)],
+                       limit: Annotated[int, Query(ge=1, le=100)] = 10,
+                       cursor: Annotated[str | None, Query()] = None,
+                       todo_service: UserTodoService = Depends(get_user_todo_service),
+                       current_user: GetByUsernameResponse = Depends(get_current_user),
+                       ):
+    async def load():
+        hits = await todo_service.search_todos(current_user.user_id, q, limit, cursor)
+
+        headers = {}
+        next_cursor = next_search_cursor(hits, limit)
+        if next_cursor is not None:
+            headers["X-Next-Cursor"] = next_cursor
+        return encode_todos(hits), headers
+
+    try:
+        return await cached_response(request, todo_service, current_user.user_id,
+                                     f"search:{limit}:{cursor}:{q}", load)
+    except InvalidCursorException as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail={
+            "message": str(e),
+            "code": "INVALID_CURSOR",
+            "status_code": status.HTTP_400_BAD_REQUEST,
+        })
+
+
+@user_todo_router.get("/archived")
+async def get_archived_todos(*,
+                             limit: Annotated[int, Query(ge=1, le=100)] = 10,
+                             cursor: Annotated[str | None, Query()] = None,
+                             todo_service: UserTodoService = Depends(get_user_todo_service),
+                             current_user: GetByUsernameResponse = Depends(get_current_user),
+                             ):
+    try:
+        todos = await todo_service.get_archived_todos(current_user.user_id, limit, cursor)
+    except InvalidCursorException as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail={
+            "message": str(e),
+            "code": "INVALID_CURSOR",
+            "status_code": status.HTTP_400_BAD_REQUEST,
+        })
+
+    headers = {}
+    next_cursor = next_todo_cursor(todos, limit)
+    if next_cursor is not None:
+        headers["X-Next-Cursor"] = next_cursor
+    return Response(content=encode_todos(todos), media_type="application/json", headers=headers)
+
+
+@user_todo_router.get("/events")
+async def todo_events(*, current_user: GetByUsernameResponse = Depends(get_current_user)):
+    user_id = current_user.user_id
+
+    # Server-sent events: created, updated and deleted carry the todo, resync means the
+    # client has to refetch its list. The request's session is already closed while this
+    # streams, so an idle subscriber holds no database connection.
+    async def stream():
+        async with change_feed.subscribe(user_id) as queue:
+            yield b"retry: 3000\n\n"
+            while True:
+                try:
+                    yield await asyncio.wait_for(queue.get(), CHANGE_FEED_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield KEEPALIVE
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+
+
 @user_todo_router.get("/")
 async def get_todos(*,
+                    request: Request,
                     todo_service: UserTodoService = Depends(get_user_todo_service),
                     offset: Annotated[int | None, Query()] = 0,
                     limit: Annotated[int | None, Query()] = 10,
+                    cursor: Annotated[str | None, Query()] = None,
                     current_user: GetByUsernameResponse = Depends(get_current_user),
                     ):
-    todo = await todo_service.get_todos(current_user.user_id, offset, limit)
+    async def load():
+        todo = await todo_service.get_todos(current_user.user_id, offset, limit, cursor)
 
-    return todo
+        headers = {}
+        next_cursor = next_todo_cursor(todo, limit)
+        if next_cursor is not None:
+            headers["X-Next-Cursor"] = next_cursor
+        return encode_todos(todo), headers
+
+    try:
+        return await cached_response(request, todo_service, current_user.user_id,
+                                     list_key(offset, limit, cursor), load)
+    except InvalidCursorException as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail={
+            "message": str(e),
+            "code": "INVALID_CURSOR",
+            "status_code": status.HTTP_400_BAD_REQUEST,
+        })
 
 
 @user_todo_router.get("/{todo_id}")
 async def get_todo(*,
+                   request: Request,
                    todo_id: int,
                    todo_service: UserTodoService = Depends(get_user_todo_service),
                    current_user: GetByUsernameResponse = Depends(get_current_user),
                    ):
-    todo = await todo_service.get_todo(current_user.user_id, todo_id)
+    async def load():
+        todo = await todo_service.get_todo(current_user.user_id, todo_id)
+        return encode_todo(todo), {}
 
-    return todo
+    try:
+        return await cached_response(request, todo_service, current_user.user_id, f"todo:{todo_id}", load)
+    except NoResultFound:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail={
+            "message": f"Todo [{todo_id}] not found",
+            "code": "TODO_NOT_FOUND",
+            "status_code": status.HTTP_404_NOT_FOUND,
+        })
 
 
-@user_todo_router.patch("/", status_code=status.HTTP_204_NO_CONTENT)
+@user_todo_router.patch("/")
 async def update_todo(*,
                       todo: UpdateTodoRequest,
                       todo_service: UserTodoService = Depends(get_user_todo_service),
                       current_user: GetByUsernameResponse = Depends(get_current_user),
                       ):
-    await todo_service.update_todo(current_user.user_id, todo)
-    return Response(status_code=status.HTTP_204_NO_CONTENT)
+    try:
+        updated_todo = await todo_service.update_todo(current_user.user_id, todo)
+    except TodoNotFoundException as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail={
+            "message": str(e),
+            "code": "TODO_NOT_FOUND",
+            "status_code": status.HTTP_404_NOT_FOUND,
+        })
+    except TodoDuplicationException as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail={
+            "message": str(e),
+            "code": "TODO_DUPLICATION",
+            "status_code": status.HTTP_409_CONFLICT,
+        })
+
+    return Response(content=encode_todo(updated_todo), media_type="application/json")
 
 
 @user_todo_router.delete("/{todo_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -89,5 +344,13 @@ async def delete_todo(*,
                       todo_service: UserTodoService = Depends(get_user_todo_service),
                       current_user: GetByUsernameResponse = Depends(get_current_user),
                       ):
-    await todo_service.delete_todo(current_user.user_id, todo_id)
+    try:
+        await todo_service.delete_todo(current_user.user_id, todo_id)
+    except TodoNotFoundException as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail={
+            "message": str(e),
+            "code": "TODO_NOT_FOUND",
+            "status_code": status.HTTP_404_NOT_FOUND,
+        })
+
     return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -16,3 +16,17 @@ class InvalidData(Exception):
 
 class TodoDuplicationException(Exception):
     pass
+
+
+class PasswordHasherBusyException(Exception):
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class InvalidCursorException(Exception):
+    pass
+
+
+class TodoNotFoundException(Exception):
+    pass
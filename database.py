@@ -1,32 +1,177 @@
-from sqlmodel import SQLModel
+import time
 
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
 from sqlalchemy import URL
 
-from decouple import config
+from decouple import Csv, config
 
-# Create the database connection URL using our credentials from the .env file
-SQLALCHEMY_DATABASE_URL = URL.create(
-    "postgresql+asyncpg",
-    username=config("USERNAME"),
-    password=config("PASSWORD"),
-    host=config("HOST"),
-    port=config("PORT"),
-    database=config("DATABASE"),
-)
+import instrumentation
+import metrics
+from replicas import ReplicaSet, routing_session_class
+from server_config import worker_count
 
-# Create the engine using the URL and enable future support and echoing of SQL statements
-engine = create_async_engine(SQLALCHEMY_DATABASE_URL, echo=True)
+# Total connections all workers of one server may open. When set, every worker gets an
+# equal share as a fixed size pool and DB_POOL_SIZE/DB_MAX_OVERFLOW are ignored.
+DB_CONNECTION_BUDGET = config("DB_CONNECTION_BUDGET", default=0, cast=int)
+if DB_CONNECTION_BUDGET:
+    DB_POOL_SIZE = max(1, DB_CONNECTION_BUDGET // worker_count())
+    DB_MAX_OVERFLOW = 0
+else:
+    DB_POOL_SIZE = config("DB_POOL_SIZE", default=5, cast=int)
+    DB_MAX_OVERFLOW = config("DB_MAX_OVERFLOW", default=10, cast=int)
+DB_POOL_TIMEOUT = config("DB_POOL_TIMEOUT", default=30, cast=float)
+# A ping is a round trip on every checkout, as much again as most requests' one statement.
+# Instead pool_recycle retires connections before anything between us and the server drops
+# them idle, keep it below those timeouts. A connection lost anyway fails its statement and
+# SQLAlchemy then invalidates the rest of the pool.
+DB_POOL_PRE_PING = config("DB_POOL_PRE_PING", default=False, cast=bool)
+DB_POOL_RECYCLE = config("DB_POOL_RECYCLE", default=1800, cast=int)
+# Set to True when running behind PgBouncer: connections are pooled there, not here
+DB_NULL_POOL = config("DB_NULL_POOL", default=False, cast=bool)
+# Prepared statements per connection, has to be 0 behind PgBouncer in transaction mode
+DB_STATEMENT_CACHE_SIZE = config("DB_STATEMENT_CACHE_SIZE", default=100, cast=int)
+DB_STATEMENT_TIMEOUT_MS = config("DB_STATEMENT_TIMEOUT_MS", default=0, cast=int)
+DB_ECHO = config("DB_ECHO", default=False, cast=bool)
+# host:port pairs of read replicas, they share the primary's credentials and database name
+DB_REPLICA_HOSTS = config("DB_REPLICA_HOSTS", default="", cast=Csv())
+DB_REPLICA_COOLDOWN = config("DB_REPLICA_COOLDOWN", default=30, cast=float)
 
 
-# Define an async function to initialize our database
-async def init_db(drop=True):
-    async with engine.begin() as conn:
-        if drop:
-            await conn.run_sync(SQLModel.metadata.drop_all)
-        await conn.run_sync(SQLModel.metadata.create_all)
+def database_url() -> URL:
+    # Read when the engine is first created, so importing this module needs no credentials
+    return URL.create(
+        "postgresql+asyncpg",
+        username=config("USERNAME"),
+        password=config("PASSWORD"),
+        host=config("HOST"),
+        port=config("PORT"),
+        database=config("DATABASE"),
+        query={"prepared_statement_cache_size": str(DB_STATEMENT_CACHE_SIZE)},
+    )
 
 
-# Create an async session maker to use in our FastAPI application
-async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+pool_wait_seconds = metrics.Histogram("db_pool_wait_seconds", "Time spent waiting for a pooled connection")
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            elapsed = time.perf_counter() - start
+            pool_wait_seconds.observe(elapsed)
+            instrumentation.add("pool", elapsed)
+
+
+def engine_options() -> dict:
+    server_settings = {}
+    if DB_STATEMENT_TIMEOUT_MS:
+        server_settings["statement_timeout"] = str(DB_STATEMENT_TIMEOUT_MS)
+
+    options = {
+        "echo": DB_ECHO,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "connect_args": {
+            "statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+            "server_settings": server_settings,
+        },
+    }
+
+    if DB_NULL_POOL:
+        options["poolclass"] = NullPool
+    else:
+        options.update(
+            poolclass=InstrumentedPool,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+        )
+    return options
+
+
+# The engines and session makers are created on first use: creating an engine loads the
+# asyncpg dialect and reads the credentials, neither of which an import should need
+_engine: AsyncEngine | None = None
+_replica_set: ReplicaSet | None = None
+_async_session: sessionmaker | None = None
+_read_only_session: sessionmaker | None = None
+
+
+def get_engine() -> AsyncEngine:
+    global _engine
+    if _engine is None:
+        _engine = create_async_engine(database_url(), **engine_options())
+    return _engine
+
+
+def _pool_stat(name: str) -> float:
+    pool = _engine.pool if _engine is not None else None
+    return getattr(pool, name)() if hasattr(pool, name) else 0
+
+
+metrics.Gauge("db_pool_size", "Configured number of pooled connections", lambda: _pool_stat("size"))
+metrics.Gauge("db_pool_checked_out", "Connections currently in use", lambda: _pool_stat("checkedout"))
+metrics.Gauge("db_pool_checked_in", "Idle connections in the pool", lambda: _pool_stat("checkedin"))
+metrics.Gauge("db_pool_overflow", "Connections opened above pool_size", lambda: _pool_stat("overflow"))
+
+
+def pool_status() -> dict:
+    return {
+        "size": _pool_stat("size"),
+        "checked_out": _pool_stat("checkedout"),
+        "checked_in": _pool_stat("checkedin"),
+        "overflow": _pool_stat("overflow"),
+    }
+
+
+def replica_url(host: str) -> URL:
+    hostname, _, port = host.rpartition(":")
+    return database_url().set(host=hostname or port, port=int(port) if hostname else None)
+
+
+def get_replica_set() -> ReplicaSet:
+    global _replica_set
+    if _replica_set is None:
+        _replica_set = ReplicaSet(
+            [
+                create_async_engine(replica_url(host), **engine_options()).execution_options(isolation_level="AUTOCOMMIT")
+                for host in DB_REPLICA_HOSTS
+            ],
+            cooldown=DB_REPLICA_COOLDOWN,
+        )
+    return _replica_set
+
+
+# Used like the session makers they wrap: `async with async_session() as session`
+def async_session() -> AsyncSession:
+    global _async_session
+    if _async_session is None:
+        _async_session = sessionmaker(get_engine(), class_=AsyncSession, expire_on_commit=False)
+    return _async_session()
+
+
+# Sessions for read-only requests run in autocommit, so a GET doesn't pay for a
+# BEGIN/COMMIT round trip around its single SELECT. They go to a replica when any
+# are configured and healthy, otherwise to the primary.
+def read_only_session() -> AsyncSession:
+    global _read_only_session
+    if _read_only_session is None:
+        read_only_engine = get_engine().execution_options(isolation_level="AUTOCOMMIT")
+        _read_only_session = sessionmaker(
+            class_=AsyncSession,
+            sync_session_class=routing_session_class(read_only_engine, get_replica_set()),
+            expire_on_commit=False,
+        )
+    return _read_only_session()
+
+
+async def dispose_engines() -> None:
+    if _engine is not None:
+        await _engine.dispose()
+    if _replica_set is not None:
+        for replica in _replica_set.engines:
+            await replica.dispose()
@@ -1,22 +1,33 @@
+from fastapi import Depends, Request
+
+from cache.todo_cache import todo_cache
 from services.todo_service import TodoService
-from database import async_session
+from database import async_session, read_only_session
+from replicas import wants_primary
 from services.user_service import UserService
 from services.user_todo_service import UserTodoService
 
+READ_ONLY_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+# FastAPI caches dependencies per request, so every service of a request shares this
+# session and at most one pooled connection. The connection is only checked out and
+# the transaction only started when the first statement runs.
+async def get_session(request: Request):
+    read_only = request.method in READ_ONLY_METHODS and not wants_primary(request.headers, request.cookies)
+    session_factory = read_only_session if read_only else async_session
+    async with session_factory() as session:
+        yield session
+
+
+async def get_todo_service(session=Depends(get_session)):
+    return TodoService(session, todo_cache)
 
-async def get_todo_service():
-    async with async_session() as session:
-        async with session.begin():
-            yield TodoService(session)
 
+async def get_user_service(session=Depends(get_session)):
+    return UserService(session)
 
-async def get_user_service():
-    async with async_session() as session:
-        async with session.begin():
-            yield UserService(session)
 
+async def get_user_todo_service(session=Depends(get_session)):
+    return UserTodoService(session, todo_cache)
 
-async def get_user_todo_service():
-    async with async_session() as session:
-        async with session.begin():
-            yield UserTodoService(session)
@@ -0,0 +1,33 @@
+import csv
+import io
+
+import orjson
+
+import instrumentation
+from models.todo_read import TodoRead, TodoSearchHit
+
+EXPORT_COLUMNS = ("id", "label", "created_at")
+
+
+def encode_todos(todos: list[TodoRead] | list[TodoSearchHit]) -> bytes:
+    with instrumentation.timed("encode"):
+        return orjson.dumps(todos)
+
+
+def encode_todo(todo: TodoRead) -> bytes:
+    with instrumentation.timed("encode"):
+        return orjson.dumps(todo)
+
+
+def encode_ndjson(rows) -> bytes:
+    return b"".join(orjson.dumps(row._asdict()) + b"\n" for row in rows)
+
+
+def encode_csv(rows) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows((row.id, row.label, row.created_at.isoformat()) for row in rows)
+    return buffer.getvalue().encode("utf-8")
+
+
+def csv_header() -> bytes:
+    return (",".join(EXPORT_COLUMNS) + "\r\n").encode("utf-8")
@@ -0,0 +1,308 @@
+import hashlib
+
+import orjson
+from decouple import config
+from sqlalchemy import text
+
+import metrics
+from auth.user import decode_token
+from cache.backends import FakeRedis, LRUBackend, RedisBackend
+from cache.singleflight import SingleFlight
+from cache.todo_cache import REDIS_URL
+from database import get_engine
+from replicas import UNSAFE_METHODS
+
+IDEMPOTENCY_BACKEND = config("IDEMPOTENCY_BACKEND", default="postgres")  # postgres, memory, redis, fake-redis or none
+IDEMPOTENCY_MAX_BYTES = config("IDEMPOTENCY_MAX_BYTES", default=16 * 1024 * 1024, cast=int)
+IDEMPOTENCY_TTL = config("IDEMPOTENCY_TTL", default=24 * 60 * 60, cast=int)
+# Requests and responses bigger than this are passed through without idempotency
+IDEMPOTENCY_MAX_BODY = config("IDEMPOTENCY_MAX_BODY", default=64 * 1024, cast=int)
+# How long a running attempt holds its key, so a worker that died mid-request frees it eventually
+IDEMPOTENCY_LOCK_TTL = config("IDEMPOTENCY_LOCK_TTL", default=60, cast=int)
+
+IDEMPOTENT_PATH_PREFIX = "/api/v1/users/todos"
+# Imports stream their body, it can't be held in memory for a fingerprint
+EXCLUDED_PATHS = {"/api/v1/users/todos/import"}
+MAX_KEY_LENGTH = 255
+# Stored in place of the status while the first attempt runs
+IN_PROGRESS = 0
+
+replays = metrics.Counter("idempotent_replays_total", "Mutations answered from a stored or in-flight response")
+store_errors = metrics.Counter("idempotency_store_errors_total", "Idempotency store calls that failed")
+
+
+class PostgresStore:
+    # Shared by every worker without running anything besides the database. Each call holds
+    # a pooled connection for one autocommit statement, expired rows are ignored until the
+    # idempotency.purge job deletes them.
+    GET = text("SELECT value FROM idempotency_keys WHERE key = :key AND expires_at > now()")
+    SET = text("""
+        INSERT INTO idempotency_keys (key, value, expires_at)
+        VALUES (:key, :value, now() + make_interval(secs => :ttl))
+        ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at
+    """)
+    # Only takes over a row that has expired, RETURNING tells whether anything was written
+    ADD = text("""
+        INSERT INTO idempotency_keys (key, value, expires_at)
+        VALUES (:key, :value, now() + make_interval(secs => :ttl))
+        ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at
+        WHERE idempotency_keys.expires_at <= now()
+        RETURNING key
+    """)
+    DELETE = text("DELETE FROM idempotency_keys WHERE key = :key")
+
+    def __init__(self):
+        self._engine = None
+
+    async def _execute(self, statement, **params):
+        if self._engine is None:
+            self._engine = get_engine().execution_options(isolation_level="AUTOCOMMIT")
+        async with self._engine.connect() as conn:
+            result = await conn.execute(statement, params)
+            return result.scalar_one_or_none() if result.returns_rows else None
+
+    async def get(self, key: str) -> bytes | None:
+        return await self._execute(self.GET, key=key)
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        await self._execute(self.SET, key=key, value=value, ttl=float(ttl))
+
+    async def add(self, key: str, value: bytes, ttl: float) -> bool:
+        return await self._execute(self.ADD, key=key, value=value, ttl=float(ttl)) is not None
+
+    async def delete(self, key: str) -> None:
+        await self._execute(self.DELETE, key=key)
+
+
+def create_idempotency_store():
+    if IDEMPOTENCY_BACKEND == "none":
+        return None
+    if IDEMPOTENCY_BACKEND == "postgres":
+        return PostgresStore()
+    if IDEMPOTENCY_BACKEND == "fake-redis":
+        return RedisBackend(FakeRedis())
+    if IDEMPOTENCY_BACKEND == "redis":
+        from redis.asyncio import Redis
+        return RedisBackend(Redis.from_url(REDIS_URL))
+    return LRUBackend(IDEMPOTENCY_MAX_BYTES)
+
+
+def _pack(fingerprint: str, status: int, headers: list, body: bytes) -> bytes:
+    # Same layout as the todo cache: orjson metadata, a newline, then the raw body
+    meta = [fingerprint, status, [[name.decode("latin-1"), value.decode("latin-1")] for name, value in headers]]
+    return orjson.dumps(meta) + b"\n" + body
+
+
+def _unpack(value: bytes) -> tuple[str, int, list, bytes]:
+    meta, _, body = value.partition(b"\n")
+    fingerprint, status, headers = orjson.loads(meta)
+    return fingerprint, status, [(name.encode("latin-1"), value.encode("latin-1")) for name, value in headers], body
+
+
+def header(scope, name: bytes) -> str | None:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def user_id_for(scope) -> int | None:
+    authorization = header(scope, b"authorization") or ""
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    payload = decode_token(token)
+    return payload.get("uid") if payload is not None else None
+
+
+class IdempotencyMiddleware:
+    # A mutation sent with an Idempotency-Key runs once per (user, key): the first attempt
+    # claims the key in the store, retries get the stored response without running the
+    # route. Retries arriving while the first attempt is still running wait for it on the
+    # same worker and get a 409 on any other. Reusing a key for a different request is a 422.
+    #
+    # Like the rate limiter, it fails open: when the store is down the mutation runs without
+    # replay protection rather than failing. Concurrent retries to the same worker are still
+    # coalesced, retries after the first attempt finished may run again.
+    def __init__(self, app, store=None):
+        self.app = app
+        self.store = store if store is not None else create_idempotency_store()
+        self.in_flight = SingleFlight()
+        self.fingerprints: dict[tuple[int, str], str] = {}
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or self.store is None
+            or scope["method"] not in UNSAFE_METHODS
+            or not scope["path"].startswith(IDEMPOTENT_PATH_PREFIX)
+            or scope["path"] in EXCLUDED_PATHS
+        ):
+            return await self.app(scope, receive, send)
+
+        key = header(scope, b"idempotency-key")
+        if not key or len(key) > MAX_KEY_LENGTH or not self._body_fits(scope):
+            return await self.app(scope, receive, send)
+
+        # Invalid tokens go through untouched, the route answers them with a 401
+        user_id = user_id_for(scope)
+        if user_id is None:
+            return await self.app(scope, receive, send)
+
+        body, messages = await self._read_body(receive)
+        if body is None:
+            return await self.app(scope, self._replay_receive(messages, receive), send)
+        fingerprint = hashlib.sha256(
+            scope["method"].encode() + b" " + scope["raw_path"] + b"?" + scope["query_string"] + b"\n" + body
+        ).hexdigest()
+        store_key = f"idempotency:{user_id}:{key}"
+
+        flight_key = (user_id, key)
+        if flight_key in self.in_flight and self.fingerprints.get(flight_key) != fingerprint:
+            return await self._mismatch(send)
+
+        executed = False
+
+        async def execute():
+            nonlocal executed
+            try:
+                claimed = await self.store.add(store_key, _pack(fingerprint, IN_PROGRESS, [], b""),
+                                               IDEMPOTENCY_LOCK_TTL)
+            except Exception:
+                store_errors.inc()
+                claimed = True
+            if not claimed:
+                return None
+
+            executed = True
+            self.fingerprints[flight_key] = fingerprint
+            try:
+                status, headers, chunks = await self._run(scope, messages, receive, send)
+            except BaseException:
+                await self._release(store_key)
+                raise
+            finally:
+                del self.fingerprints[flight_key]
+
+            response_body = b"".join(chunks)
+            # Server errors may be transient, a retry should get to run again
+            if status < 500 and len(response_body) <= IDEMPOTENCY_MAX_BODY:
+                try:
+                    await self.store.set(store_key, _pack(fingerprint, status, headers, response_body),
+                                         IDEMPOTENCY_TTL)
+                except Exception:
+                    # The response already went out, only a later retry loses its replay
+                    store_errors.inc()
+            else:
+                await self._release(store_key)
+            return status, headers, response_body
+
+        # Joins the attempt already running for this key on this worker, if there is one
+        result = await self.in_flight.do(flight_key, execute)
+        if result is None:
+            # The key was claimed first, by an attempt that finished or one running elsewhere
+            try:
+                stored = await self.store.get(store_key)
+            except Exception:
+                store_errors.inc()
+                stored = None
+            if stored is None:
+                # Released again in between, the retry may run once it's sent again
+                return await self._in_progress(send)
+            return await self._replay(send, fingerprint, *_unpack(stored))
+
+        status, headers, response_body = result
+        if not executed:
+            replays.inc()
+            await self._respond(send, status, headers, response_body, replayed=True)
+
+    @staticmethod
+    def _body_fits(scope) -> bool:
+        # Bodies without a length up front (chunked, HTTP/2) are held to the limit while they're read
+        length = header(scope, b"content-length")
+        if length is None:
+            return True
+        # A malformed length is left to the server and the route, the request isn't stored
+        return length.isdigit() and int(length) <= IDEMPOTENCY_MAX_BODY
+
+    @staticmethod
+    def _replay_receive(messages: list[dict], receive):
+        async def replay_receive():
+            if messages:
+                return messages.pop(0)
+            return await receive()
+        return replay_receive
+
+    async def _run(self, scope, messages: list[dict], receive, send):
+        status = 500
+        headers = []
+        chunks = []
+
+        async def capture(message):
+            nonlocal status, headers
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        await self.app(scope, self._replay_receive(messages, receive), capture)
+        return status, headers, chunks
+
+    @staticmethod
+    async def _read_body(receive) -> tuple[bytes | None, list[dict]]:
+        # The body is None once it grows past IDEMPOTENCY_MAX_BODY, the messages read so far
+        # are handed on with the rest of the stream
+        messages = []
+        body = b""
+        while True:
+            message = await receive()
+            messages.append(message)
+            if message["type"] != "http.request":
+                break
+            body += message.get("body", b"")
+            if len(body) > IDEMPOTENCY_MAX_BODY:
+                return None, messages
+            if not message.get("more_body"):
+                break
+        return body, messages
+
+    async def _release(self, store_key: str) -> None:
+        try:
+            await self.store.delete(store_key)
+        except Exception:
+            # The claim then expires after IDEMPOTENCY_LOCK_TTL
+            store_errors.inc()
+
+    async def _replay(self, send, fingerprint: str, stored_fingerprint: str, status: int, headers: list,
+                      body: bytes) -> None:
+        if fingerprint != stored_fingerprint:
+            return await self._mismatch(send)
+        if status == IN_PROGRESS:
+            return await self._in_progress(send)
+        replays.inc()
+        await self._respond(send, status, headers, body, replayed=True)
+
+    @staticmethod
+    async def _respond(send, status: int, headers: list, body: bytes, replayed: bool = False) -> None:
+        if replayed:
+            headers = headers + [(b"idempotent-replayed", b"true")]
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+    async def _mismatch(self, send) -> None:
+        await self._error(send, 422, "Idempotency-Key was already used for a different request",
+                          "IDEMPOTENCY_KEY_REUSED")
+
+    async def _in_progress(self, send) -> None:
+        await self._error(send, 409, "A request with this Idempotency-Key is still being processed",
+                          "IDEMPOTENCY_KEY_IN_USE", [(b"retry-after", b"1")])
+
+    async def _error(self, send, status: int, message: str, code: str, headers: list | None = None) -> None:
+        body = orjson.dumps({"detail": {"message": message, "code": code, "status_code": status}})
+        await self._respond(send, status, [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            *(headers or []),
+        ], body)
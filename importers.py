@@ -0,0 +1,101 @@
+import codecs
+import csv
+
+import orjson
+from decouple import config
+
+from custom_exceptions import InvalidData
+
+# Characters in one line, or one CSV record spanning several, far above any label a todo can hold
+IMPORT_MAX_LINE_LENGTH = config("IMPORT_MAX_LINE_LENGTH", default=64 * 1024, cast=int)
+
+
+async def iter_lines(chunks, max_length: int = IMPORT_MAX_LINE_LENGTH):
+    # Only the current incomplete line is kept between chunks, and it can't grow past max_length
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pending = ""
+    line_number = 0
+    try:
+        async for chunk in chunks:
+            pending += decoder.decode(chunk)
+            *lines, pending = pending.split("\n")
+            for line in lines:
+                line_number += 1
+                if len(line) > max_length:
+                    raise InvalidData(f"Line [{line_number}] is longer than {max_length} characters")
+                yield line.rstrip("\r")
+            if len(pending) > max_length:
+                raise InvalidData(f"Line [{line_number + 1}] is longer than {max_length} characters")
+
+        pending += decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        raise InvalidData("The body is not valid UTF-8")
+    if pending:
+        yield pending.rstrip("\r")
+
+
+async def parse_ndjson_labels(lines):
+    line_number = 0
+    async for line in lines:
+        line_number += 1
+        if not line.strip():
+            continue
+
+        try:
+            item = orjson.loads(line)
+            label = item["label"]
+        except (orjson.JSONDecodeError, KeyError, TypeError):
+            raise InvalidData(f"Line [{line_number}] is not a valid todo")
+
+        if not isinstance(label, str):
+            raise InvalidData(f"Line [{line_number}] is not a valid todo")
+        yield label
+
+
+async def parse_csv_labels(lines, max_length: int = IMPORT_MAX_LINE_LENGTH):
+    # The label is the first column, an optional "label" header row is skipped. A quoted
+    # field may contain newlines, so lines are joined until their quotes are balanced:
+    # quotes inside a quoted field are doubled, an odd count means the field is still open.
+    line_number = 0
+    record = []
+    record_length = quotes = 0
+    async for line in lines:
+        line_number += 1
+        record.append(line)
+        record_length += len(line) + 1
+        quotes += line.count('"')
+        if quotes % 2:
+            if record_length > max_length:
+                raise InvalidData(f"Line [{line_number - len(record) + 1}] is longer than {max_length} characters")
+            continue
+
+        first_line = line_number - len(record) + 1
+        text = "\n".join(record)
+        record = []
+        record_length = quotes = 0
+        if not text.strip():
+            continue
+
+        try:
+            row = next(csv.reader([text], strict=True))
+        except csv.Error:
+            raise InvalidData(f"Line [{first_line}] is not valid CSV")
+
+        if first_line == 1 and row[0].strip().lower() == "label":
+            continue
+        yield row[0]
+
+    if record:
+        raise InvalidData(f"Line [{line_number - len(record) + 1}] has an unterminated quoted field")
+
+
+async def batched(items, size: int):
+    batch = []
+    async for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
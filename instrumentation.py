@@ -0,0 +1,168 @@
+import asyncio
+import contextlib
+import cProfile
+import os
+import random
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Callable
+
+from decouple import config
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import metrics
+
+# Fraction of requests run under cProfile, 0 disables profiling
+PROFILE_SAMPLE_RATE = config("PROFILE_SAMPLE_RATE", default=0.0, cast=float)
+PROFILE_SLOW_MS = config("PROFILE_SLOW_MS", default=500, cast=float)
+PROFILE_DIR = config("PROFILE_DIR", default="profiles")
+
+# Responses that stream for as long as the client stays, their duration says nothing about
+# the server and a profile would stay enabled for the whole stream
+STREAMING_PATHS = {"/api/v1/users/todos/events", "/api/v1/users/todos/export"}
+
+request_duration = metrics.Histogram("http_request_duration_seconds", "Request latency by route")
+request_db_duration = metrics.Histogram("http_request_db_seconds", "Time spent in SQL per request by route")
+db_statements = metrics.Counter("db_statements_total", "SQL statements executed")
+
+
+@dataclass(slots=True)
+class RequestTimings:
+    statements: int = 0
+    db: float = 0.0
+    pool: float = 0.0
+    auth: float = 0.0
+    bcrypt: float = 0.0
+    encode: float = 0.0
+
+
+current_timings: ContextVar[RequestTimings | None] = ContextVar("current_timings", default=None)
+
+# Called as hook(scope, duration_seconds, timings, profile) for requests slower than PROFILE_SLOW_MS,
+# profile is None unless the request was sampled for profiling
+slow_request_hooks: list[Callable] = []
+# cProfile can only profile one request of the thread at a time. It sees everything the
+# event loop runs while it is enabled, so a profile also holds the requests interleaved
+# with the sampled one; at a low sample rate those are few.
+_profiling = False
+
+
+def add(field: str, seconds: float) -> None:
+    timings = current_timings.get()
+    if timings is not None:
+        setattr(timings, field, getattr(timings, field) + seconds)
+
+
+@contextlib.contextmanager
+def timed(field: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add(field, time.perf_counter() - start)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    db_statements.inc()
+
+    timings = current_timings.get()
+    if timings is not None:
+        timings.statements += 1
+        timings.db += elapsed
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(context):
+    starts = context.connection.info.get("query_start") if context.connection is not None else None
+    if starts:
+        starts.pop()
+
+
+def server_timing(timings: RequestTimings, total: float) -> str:
+    return ", ".join((
+        f'db;dur={timings.db * 1000:.2f};desc="{timings.statements} statements"',
+        f"pool;dur={timings.pool * 1000:.2f}",
+        f"auth;dur={timings.auth * 1000:.2f}",
+        f"bcrypt;dur={timings.bcrypt * 1000:.2f}",
+        f"encode;dur={timings.encode * 1000:.2f}",
+        f"total;dur={total * 1000:.2f}",
+    ))
+
+
+def _dump_profile(profile: cProfile.Profile, path: str) -> None:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    profile.dump_stats(path)
+
+
+def write_profile(scope, duration: float, timings: RequestTimings, profile: cProfile.Profile | None) -> None:
+    if profile is None:
+        return
+
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{scope['method']}-{route_name(scope).strip('/').replace('/', '_')}"
+    path = os.path.join(PROFILE_DIR, f"{name}-{int(duration * 1000)}ms.prof")
+    # Marshalling the stats and writing the file would block the event loop
+    asyncio.get_running_loop().run_in_executor(None, _dump_profile, profile, path)
+
+
+slow_request_hooks.append(write_profile)
+
+
+def route_name(scope) -> str:
+    # The route template keeps the label cardinality bounded, raw paths would not
+    route = scope.get("route")
+    return getattr(route, "path", "unmatched")
+
+
+class InstrumentationMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in STREAMING_PATHS:
+            return await self.app(scope, receive, send)
+
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                header = server_timing(timings, time.perf_counter() - start)
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", header.encode())]
+            await send(message)
+
+        global _profiling
+        profile = None
+        if PROFILE_SAMPLE_RATE and not _profiling and random.random() < PROFILE_SAMPLE_RATE:
+            profile = cProfile.Profile()
+            _profiling = True
+            profile.enable()
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if profile is not None:
+                profile.disable()
+                _profiling = False
+            current_timings.reset(token)
+
+            duration = time.perf_counter() - start
+            labels = {"route": route_name(scope), "method": scope["method"], "status": str(status_code)}
+            request_duration.observe(duration, **labels)
+            request_db_duration.observe(timings.db, **labels)
+
+            if duration * 1000 >= PROFILE_SLOW_MS:
+                for hook in slow_request_hooks:
+                    hook(scope, duration, timings, profile)
@@ -0,0 +1,28 @@
+import asyncio
+import signal
+import sys
+
+import jobs.tasks  # noqa: F401 registers the jobs
+from database import async_session, dispose_engines
+from jobs.worker import Worker
+
+
+async def run() -> None:
+    worker = Worker(async_session)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.stop)
+
+    try:
+        await worker.run()
+    finally:
+        await dispose_engines()
+
+
+def main() -> int:
+    asyncio.run(run())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,38 @@
+import datetime
+from typing import Awaitable, Callable
+
+import sqlalchemy as sa
+from decouple import config
+from sqlmodel import Session
+
+from models.job import Job
+
+JOB_MAX_ATTEMPTS = config("JOB_MAX_ATTEMPTS", default=5, cast=int)
+
+# name -> coroutine function called as fn(session, payload), filled by the @job decorator
+registry: dict[str, Callable[[Session, dict], Awaitable[None]]] = {}
+# Jobs that enqueue their own next run, workers queue the first one when none is pending
+recurring_jobs: set[str] = set()
+
+
+def job(name: str, recurring: bool = False):
+    def register(fn):
+        registry[name] = fn
+        if recurring:
+            recurring_jobs.add(name)
+        return fn
+    return register
+
+
+def after_commit(session: Session, callback: Callable[[], Awaitable[None]]) -> None:
+    # For work that must only happen once the job's transaction is committed, like cache invalidation
+    session.info.setdefault("after_commit", []).append(callback)
+
+
+async def enqueue(session: Session, name: str, payload: dict, delay: float = 0,
+                  attempts: int = JOB_MAX_ATTEMPTS) -> None:
+    # Runs in the caller's transaction, so the job exists exactly when the caller's write commits
+    values = {"name": name, "payload": payload, "max_attempts": attempts}
+    if delay:
+        values["run_at"] = sa.func.now() + datetime.timedelta(seconds=delay)
+    await session.execute(sa.insert(Job).values(**values))
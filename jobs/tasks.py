@@ -0,0 +1,97 @@
+from decouple import config
+from sqlalchemy import text
+from sqlmodel import Session
+
+from cache.todo_cache import list_key, todo_cache
+from encoders import encode_todos
+from jobs.queue import after_commit, enqueue, job
+from pagination import next_todo_cursor
+from services.user_todo_service import UserTodoService
+
+TODO_ARCHIVE_AFTER_DAYS = config("TODO_ARCHIVE_AFTER_DAYS", default=30, cast=int)
+TODO_ARCHIVE_BATCH_SIZE = config("TODO_ARCHIVE_BATCH_SIZE", default=1000, cast=int)
+TODO_ARCHIVE_INTERVAL = config("TODO_ARCHIVE_INTERVAL", default=3600, cast=int)
+
+WARM_PAGE_SIZE = 10
+
+
+@job("todos.warm_cache")
+async def warm_todo_cache(session: Session, payload: dict) -> None:
+    # Renders the first list page into the shared cache after a large write, so the client's
+    # next poll is a cache hit instead of a cold query
+    user_id = payload["user_id"]
+    service = UserTodoService(session, todo_cache)
+
+    async def load():
+        todos = await service.get_todos(user_id, 0, WARM_PAGE_SIZE)
+        headers = {}
+        next_cursor = next_todo_cursor(todos, WARM_PAGE_SIZE)
+        if next_cursor is not None:
+            headers["X-Next-Cursor"] = next_cursor
+        return encode_todos(todos), headers
+
+    etag = await service.get_etag(user_id, list_key(0, WARM_PAGE_SIZE, None))
+    await todo_cache.get_or_load(user_id, etag, load)
+
+
+# Moves up to TODO_ARCHIVE_BATCH_SIZE todos completed more than TODO_ARCHIVE_AFTER_DAYS ago
+# into todos_archive in one statement. (user_id, id) finds the rows whether todos is
+# partitioned by user_id or not.
+ARCHIVE = text("""
+    WITH moved AS (
+        DELETE FROM todos
+        WHERE (user_id, id) IN (
+            SELECT user_id, id FROM todos
+            WHERE completed AND completed_at < now() - make_interval(days => :days)
+            ORDER BY completed_at
+            LIMIT :batch_size
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id, label, user_id, created_at, updated_at, completed_at
+    )
+    INSERT INTO todos_archive (id, label, user_id, created_at, updated_at, completed_at)
+    SELECT id, label, user_id, created_at, updated_at, completed_at FROM moved
+    RETURNING user_id
+""")
+
+
+@job("todos.archive", recurring=True)
+async def archive_todos(session: Session, payload: dict) -> None:
+    result = await session.execute(ARCHIVE, {"days": TODO_ARCHIVE_AFTER_DAYS, "batch_size": TODO_ARCHIVE_BATCH_SIZE})
+    user_ids = result.scalars().all()
+
+    # The job schedules its own next run in the same transaction, a full batch means there's more to do now
+    delay = 0 if len(user_ids) == TODO_ARCHIVE_BATCH_SIZE else TODO_ARCHIVE_INTERVAL
+    await enqueue(session, "todos.archive", {}, delay=delay)
+
+    # The delete bumps each user's todos_version and notifies the change feed (see m0006). A
+    # per-process cache only drops its copy of the version here when the worker runs in the
+    # app process (JOBS_IN_PROCESS), the app's workers otherwise see the new version once
+    # their copy expires.
+    if user_ids:
+        async def invalidate_caches():
+            for user_id in set(user_ids):
+                await todo_cache.invalidate(user_id)
+        after_commit(session, invalidate_caches)
+
+
+IDEMPOTENCY_PURGE_BATCH_SIZE = config("IDEMPOTENCY_PURGE_BATCH_SIZE", default=1000, cast=int)
+IDEMPOTENCY_PURGE_INTERVAL = config("IDEMPOTENCY_PURGE_INTERVAL", default=3600, cast=int)
+
+# Expired rows are never read again, see idempotency.PostgresStore
+PURGE_IDEMPOTENCY_KEYS = text("""
+    DELETE FROM idempotency_keys
+    WHERE key IN (
+        SELECT key FROM idempotency_keys
+        WHERE expires_at <= now()
+        LIMIT :batch_size
+        FOR UPDATE SKIP LOCKED
+    )
+""")
+
+
+@job("idempotency.purge", recurring=True)
+async def purge_idempotency_keys(session: Session, payload: dict) -> None:
+    result = await session.execute(PURGE_IDEMPOTENCY_KEYS, {"batch_size": IDEMPOTENCY_PURGE_BATCH_SIZE})
+    delay = 0 if result.rowcount == IDEMPOTENCY_PURGE_BATCH_SIZE else IDEMPOTENCY_PURGE_INTERVAL
+    await enqueue(session, "idempotency.purge", {}, delay=delay)
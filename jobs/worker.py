@@ -0,0 +1,133 @@
+import asyncio
+import random
+import traceback
+
+from decouple import config
+from sqlalchemy import text
+
+from jobs.queue import JOB_MAX_ATTEMPTS, recurring_jobs, registry
+
+JOB_CONCURRENCY = config("JOB_CONCURRENCY", default=10, cast=int)
+JOB_POLL_INTERVAL = config("JOB_POLL_INTERVAL", default=1, cast=float)
+JOB_TIMEOUT = config("JOB_TIMEOUT", default=60, cast=float)
+# A running job older than this belongs to a worker that died, it is queued again
+JOB_LOCK_TIMEOUT = config("JOB_LOCK_TIMEOUT", default=300, cast=float)
+JOB_RETRY_BASE = config("JOB_RETRY_BASE", default=2, cast=float)
+JOB_RETRY_MAX = config("JOB_RETRY_MAX", default=600, cast=float)
+JOB_SHUTDOWN_TIMEOUT = config("JOB_SHUTDOWN_TIMEOUT", default=30, cast=float)
+
+# The claim commits right away: SKIP LOCKED keeps workers off each other's rows and
+# status = 'running' keeps them off once the row locks are released
+CLAIM = text("""
+    UPDATE jobs SET status = 'running', locked_at = now(), attempts = attempts + 1
+    WHERE id IN (
+        SELECT id FROM jobs
+        WHERE status = 'queued' AND run_at <= now()
+        ORDER BY run_at
+        LIMIT :limit
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING id, name, payload, attempts, max_attempts
+""")
+RECLAIM = text("""
+    UPDATE jobs SET status = 'queued', locked_at = NULL
+    WHERE status = 'running' AND locked_at < now() - make_interval(secs => :lock_timeout)
+""")
+# The advisory lock serializes workers starting together, the second one then sees the first one's row
+LOCK_SCHEDULE = text("SELECT pg_advisory_xact_lock(hashtext(:name))")
+SCHEDULE_IF_MISSING = text("""
+    INSERT INTO jobs (name, payload, max_attempts)
+    SELECT :name, '{}', :max_attempts
+    WHERE NOT EXISTS (SELECT 1 FROM jobs WHERE name = :name AND status IN ('queued', 'running'))
+""")
+COMPLETE = text("DELETE FROM jobs WHERE id = :id")
+FAIL = text("""
+    UPDATE jobs SET
+        status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'queued' END,
+        run_at = now() + make_interval(secs => :delay),
+        locked_at = NULL,
+        last_error = :error
+    WHERE id = :id
+""")
+
+
+def retry_delay(attempts: int) -> float:
+    # Exponential backoff with full jitter, so a burst of failures doesn't retry in lockstep
+    return random.uniform(0, min(JOB_RETRY_MAX, JOB_RETRY_BASE * 2 ** (attempts - 1)))
+
+
+class Worker:
+    def __init__(self, session_factory, concurrency: int = JOB_CONCURRENCY, poll_interval: float = JOB_POLL_INTERVAL):
+        self.session_factory = session_factory
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.running: set[asyncio.Task] = set()
+        self._stopping = asyncio.Event()
+
+    async def run(self) -> None:
+        await self._schedule_recurring()
+        stopping = asyncio.create_task(self._stopping.wait())
+        try:
+            while not self._stopping.is_set():
+                free = self.concurrency - len(self.running)
+                claimed = await self._claim(free) if free else []
+                for row in claimed:
+                    task = asyncio.create_task(self._execute(row))
+                    self.running.add(task)
+                    task.add_done_callback(self.running.discard)
+
+                # A full batch means more jobs are probably due, anything else waits for a poll
+                # or for a slot to free up
+                if free and len(claimed) == free:
+                    continue
+                if not claimed:
+                    await self._reclaim()
+                await asyncio.wait({stopping, *self.running}, timeout=self.poll_interval,
+                                   return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            stopping.cancel()
+            if self.running:
+                # Jobs still running after this are picked up again once JOB_LOCK_TIMEOUT passes
+                await asyncio.wait(self.running, timeout=JOB_SHUTDOWN_TIMEOUT)
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+    async def _schedule_recurring(self) -> None:
+        # Also brings back a recurring job that ran out of attempts, on the next worker start
+        for name in sorted(recurring_jobs):
+            async with self.session_factory() as session:
+                await session.execute(LOCK_SCHEDULE, {"name": name})
+                await session.execute(SCHEDULE_IF_MISSING, {"name": name, "max_attempts": JOB_MAX_ATTEMPTS})
+                await session.commit()
+
+    async def _claim(self, limit: int) -> list:
+        async with self.session_factory() as session:
+            rows = (await session.execute(CLAIM, {"limit": limit})).all()
+            await session.commit()
+        return rows
+
+    async def _reclaim(self) -> None:
+        async with self.session_factory() as session:
+            await session.execute(RECLAIM, {"lock_timeout": JOB_LOCK_TIMEOUT})
+            await session.commit()
+
+    async def _execute(self, row) -> None:
+        fn = registry.get(row.name)
+        try:
+            if fn is None:
+                raise LookupError(f"No job registered as [{row.name}]")
+
+            # The job's writes and the removal of the job commit together
+            async with self.session_factory() as session:
+                await asyncio.wait_for(fn(session, row.payload), JOB_TIMEOUT)
+                await session.execute(COMPLETE, {"id": row.id})
+                await session.commit()
+                for callback in session.info.pop("after_commit", ()):
+                    await callback()
+        except Exception:
+            error = traceback.format_exc()
+            print(f"job {row.id} [{row.name}] failed on attempt {row.attempts} of {row.max_attempts}\n{error}")
+            async with self.session_factory() as session:
+                await session.execute(FAIL, {"id": row.id, "delay": retry_delay(row.attempts), "error": error})
+                await session.commit()
@@ -0,0 +1,37 @@
+import argparse
+import asyncio
+import sys
+
+from database import dispose_engines, get_engine
+from migrations.runner import migrate, status
+
+
+async def run(args) -> None:
+    engine = get_engine()
+    try:
+        if args.status:
+            for migration, applied in await status(engine):
+                state = "applied" if applied else "opt-in" if migration.opt_in else "pending"
+                print(f"{migration.version:04d} {migration.name:<40} {state}")
+            return
+
+        applied = await migrate(engine, target=args.target, include_opt_in=args.include_opt_in)
+        for migration in applied:
+            print(f"applied {migration.name}")
+        if not applied:
+            print("schema is up to date")
+    finally:
+        await dispose_engines()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m migrations")
+    parser.add_argument("--status", action="store_true", help="list migrations and whether they ran")
+    parser.add_argument("--target", type=int, help="stop after this version, runs it even if it is opt-in")
+    parser.add_argument("--include-opt-in", action="store_true", help="also run opt-in migrations")
+    asyncio.run(run(parser.parse_args()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,41 @@
+# Brings both a fresh database and one created by the old create_all at startup to the
+# current schema, so every statement has to be a no-op when its object already exists.
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+STATEMENTS = [
+    # Needed by the todo search indexes
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE EXTENSION IF NOT EXISTS btree_gin",
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        user_id SERIAL PRIMARY KEY,
+        username TEXT NOT NULL UNIQUE,
+        first_name TEXT NOT NULL,
+        last_name TEXT NOT NULL,
+        email TEXT NOT NULL UNIQUE,
+        birthdate DATE NOT NULL,
+        password TEXT NOT NULL,
+        created_at TIMESTAMPTZ
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS todos (
+        id SERIAL PRIMARY KEY,
+        label TEXT NOT NULL,
+        user_id INTEGER NOT NULL REFERENCES users (user_id) ON DELETE CASCADE,
+        created_at TIMESTAMPTZ,
+        CONSTRAINT unique_todos_user_id_label UNIQUE (label, user_id)
+    )
+    """,
+    "UPDATE todos SET created_at = now() WHERE created_at IS NULL",
+    "ALTER TABLE todos ALTER COLUMN created_at SET DEFAULT now(), ALTER COLUMN created_at SET NOT NULL",
+    "ALTER TABLE todos ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT now()",
+    "ALTER TABLE todos ADD COLUMN IF NOT EXISTS search_vector TSVECTOR "
+    "GENERATED ALWAYS AS (to_tsvector('simple', label)) STORED",
+]
+
+
+async def upgrade(conn: AsyncConnection) -> None:
+    for statement in STATEMENTS:
+        await conn.execute(text(statement))
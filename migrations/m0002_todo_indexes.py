@@ -0,0 +1,40 @@
+# Builds the todo indexes without blocking writes, then moves unique_todos_user_id_label
+# onto (user_id, label) so per-user lookups can use it. The old (label, user_id) order
+# made user_id the second column, useless for anything scoped to one user.
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from migrations.runner import MIGRATION_LOCK_TIMEOUT, create_index_concurrently
+
+TRANSACTIONAL = False
+
+INDEXES = [
+    # Keyset pagination: every page is a range scan on (user_id, created_at, id)
+    ("ix_todos_user_id_created_at_id", "ON todos (user_id, created_at, id)"),
+    ("ix_todos_created_at_id", "ON todos (created_at, id)"),
+    ("ix_todos_user_id_search_vector", "ON todos USING gin (user_id, search_vector)"),
+    ("ix_todos_user_id_label_trgm", "ON todos USING gin (user_id, label gin_trgm_ops)"),
+]
+
+
+async def upgrade(conn: AsyncConnection) -> None:
+    for name, definition in INDEXES:
+        await create_index_concurrently(conn, name, definition)
+
+    leading_column = await conn.scalar(text(
+        "SELECT a.attname FROM pg_constraint c "
+        "JOIN pg_attribute a ON a.attrelid = c.conrelid AND a.attnum = c.conkey[1] "
+        "WHERE c.conname = 'unique_todos_user_id_label'"
+    ))
+    if leading_column == "user_id":
+        return
+
+    await create_index_concurrently(conn, "ix_todos_user_id_label", "ON todos (user_id, label)", unique=True)
+    # Once the index is built this is only a catalog change, and a single ALTER TABLE is
+    # atomic. USING INDEX renames the index to the constraint name.
+    await conn.execute(text(f"SET lock_timeout = '{MIGRATION_LOCK_TIMEOUT}'"))
+    await conn.execute(text(
+        "ALTER TABLE todos DROP CONSTRAINT unique_todos_user_id_label, "
+        "ADD CONSTRAINT unique_todos_user_id_label UNIQUE USING INDEX ix_todos_user_id_label"
+    ))
+    await conn.execute(text("RESET lock_timeout"))
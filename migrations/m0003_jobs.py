@@ -0,0 +1,27 @@
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id BIGSERIAL PRIMARY KEY,
+        name TEXT NOT NULL,
+        payload JSONB NOT NULL,
+        status TEXT NOT NULL DEFAULT 'queued',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        max_attempts INTEGER NOT NULL,
+        run_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        locked_at TIMESTAMPTZ,
+        last_error TEXT,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+    """,
+    # The table is new and empty, so there's no need to build these concurrently
+    "CREATE INDEX IF NOT EXISTS ix_jobs_run_at_queued ON jobs (run_at) WHERE status = 'queued'",
+    "CREATE INDEX IF NOT EXISTS ix_jobs_locked_at_running ON jobs (locked_at) WHERE status = 'running'",
+]
+
+
+async def upgrade(conn: AsyncConnection) -> None:
+    for statement in STATEMENTS:
+        await conn.execute(text(statement))
@@ -0,0 +1,32 @@
+# Completion state on todos and the todos_archive cold table the todos.archive job moves
+# old completed todos into. Adding the columns is a catalog change only (constant
+# defaults), the archival index is built without blocking writes.
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from migrations.runner import create_index_concurrently
+
+TRANSACTIONAL = False
+
+STATEMENTS = [
+    "ALTER TABLE todos ADD COLUMN IF NOT EXISTS completed BOOLEAN NOT NULL DEFAULT false",
+    "ALTER TABLE todos ADD COLUMN IF NOT EXISTS completed_at TIMESTAMPTZ",
+    """
+    CREATE TABLE IF NOT EXISTS todos_archive (
+        id INTEGER PRIMARY KEY,
+        label TEXT NOT NULL,
+        user_id INTEGER NOT NULL REFERENCES users (user_id) ON DELETE CASCADE,
+        created_at TIMESTAMPTZ NOT NULL,
+        updated_at TIMESTAMPTZ NOT NULL,
+        completed_at TIMESTAMPTZ,
+        archived_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_todos_archive_user_id_created_at_id ON todos_archive (user_id, created_at, id)",
+]
+
+
+async def upgrade(conn: AsyncConnection) -> None:
+    for statement in STATEMENTS:
+        await conn.execute(text(statement))
+    await create_index_concurrently(conn, "ix_todos_completed_at", "ON todos (completed_at) WHERE completed")
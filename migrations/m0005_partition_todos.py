@@ -0,0 +1,70 @@
+# Opt-in: rebuilds todos as a table hash-partitioned on user_id, so every per-user query
+# and its indexes only touch one TODO_PARTITIONS-th of the rows, and vacuum works on
+# small partitions. Run it with `python -m migrations --target 5`.
+#
+# The rows are copied under an exclusive lock, so writes to todos wait for the whole
+# copy: run it in a maintenance window. It is one transaction, a failure leaves the old
+# table as it was. Postgres requires the partition key in every unique constraint, so
+# the primary key becomes (user_id, id); ids still come from the same sequence.
+from decouple import config
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from migrations.m0006_todos_version import TRIGGERS
+
+TODO_PARTITIONS = config("TODO_PARTITIONS", default=16, cast=int)
+
+OPT_IN = True
+
+COLUMNS = "id, label, user_id, created_at, updated_at, completed, completed_at"
+
+
+def statements(partitions: int) -> list[str]:
+    return [
+        "LOCK TABLE todos IN ACCESS EXCLUSIVE MODE",
+        # Otherwise dropping the old table drops the sequence with it
+        "ALTER SEQUENCE todos_id_seq OWNED BY NONE",
+        """
+        CREATE TABLE todos_partitioned (
+            id INTEGER NOT NULL DEFAULT nextval('todos_id_seq'),
+            label TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            completed BOOLEAN NOT NULL DEFAULT false,
+            completed_at TIMESTAMPTZ,
+            search_vector TSVECTOR GENERATED ALWAYS AS (to_tsvector('simple', label)) STORED
+        ) PARTITION BY HASH (user_id)
+        """,
+        *(
+            f"CREATE TABLE todos_p{remainder} PARTITION OF todos_partitioned "
+            f"FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})"
+            for remainder in range(partitions)
+        ),
+        f"INSERT INTO todos_partitioned ({COLUMNS}) SELECT {COLUMNS} FROM todos",
+        "DROP TABLE todos",
+        "ALTER TABLE todos_partitioned RENAME TO todos",
+        "ALTER SEQUENCE todos_id_seq OWNED BY todos.id",
+        # Constraints and indexes are added after the copy, building them once is faster
+        # than maintaining them row by row
+        "ALTER TABLE todos ADD CONSTRAINT todos_pkey PRIMARY KEY (user_id, id)",
+        "ALTER TABLE todos ADD CONSTRAINT unique_todos_user_id_label UNIQUE (user_id, label)",
+        "ALTER TABLE todos ADD CONSTRAINT todos_user_id_fkey "
+        "FOREIGN KEY (user_id) REFERENCES users (user_id) ON DELETE CASCADE",
+        "CREATE INDEX ix_todos_user_id_created_at_id ON todos (user_id, created_at, id)",
+        "CREATE INDEX ix_todos_created_at_id ON todos (created_at, id)",
+        "CREATE INDEX ix_todos_user_id_search_vector ON todos USING gin (user_id, search_vector)",
+        "CREATE INDEX ix_todos_user_id_label_trgm ON todos USING gin (user_id, label gin_trgm_ops)",
+        "CREATE INDEX ix_todos_completed_at ON todos (completed_at) WHERE completed",
+        "ANALYZE todos",
+    ]
+
+
+async def upgrade(conn: AsyncConnection) -> None:
+    for statement in statements(TODO_PARTITIONS):
+        await conn.execute(text(statement))
+
+    # Triggers went with the old table. m0006 creates them itself when it runs after this.
+    if await conn.scalar(text("SELECT to_regprocedure('todos_changed()') IS NOT NULL")):
+        for statement in TRIGGERS:
+            await conn.execute(text(statement))
@@ -0,0 +1,60 @@
+# users.todos_version counts the statements that wrote a user's todos. A statement level
+# trigger bumps it inside the writing transaction, so every write path (the API, bulk
+# imports, the archive job) moves it without an extra round trip, and an ETag derived
+# from it costs one primary key lookup. The same trigger sends the change feed's
+# notification. Adding the column is a catalog change only.
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+FUNCTION = """
+    CREATE OR REPLACE FUNCTION todos_changed() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        -- Rows are locked in user_id order, statements touching several users can't deadlock
+        UPDATE users SET todos_version = users.todos_version + 1
+        FROM (
+            SELECT user_id FROM users WHERE user_id IN (SELECT user_id FROM changed)
+            ORDER BY user_id FOR UPDATE
+        ) locked
+        WHERE users.user_id = locked.user_id;
+
+        -- Delivered on commit. A user with one changed row gets the row, anything more is a
+        -- resync. NOTIFY payloads are capped at 8000 bytes, longer labels are left for the
+        -- client to fetch. The channel is change_feed.CHANGE_FEED_CHANNEL.
+        PERFORM pg_notify('todo_changes', CASE WHEN per_user.rows = 1 THEN jsonb_strip_nulls(jsonb_build_object(
+            'type', CASE TG_OP WHEN 'INSERT' THEN 'created' WHEN 'UPDATE' THEN 'updated' ELSE 'deleted' END,
+            'user_id', per_user.user_id,
+            'id', per_user.id,
+            'label', CASE WHEN TG_OP <> 'DELETE' AND octet_length(per_user.label) <= 2000 THEN per_user.label END
+        )) ELSE jsonb_build_object('type', 'resync', 'user_id', per_user.user_id) END::text)
+        FROM (
+            SELECT user_id, count(*) AS rows, min(id) AS id, min(label) AS label
+            FROM changed WHERE user_id IS NOT NULL GROUP BY user_id
+        ) per_user;
+        RETURN NULL;
+    END
+    $$
+"""
+
+# Transition tables only allow one event per trigger. Also run by m0005, which rebuilds todos.
+TRIGGERS = [
+    "DROP TRIGGER IF EXISTS todos_changed_insert ON todos",
+    "CREATE TRIGGER todos_changed_insert AFTER INSERT ON todos "
+    "REFERENCING NEW TABLE AS changed FOR EACH STATEMENT EXECUTE FUNCTION todos_changed()",
+    "DROP TRIGGER IF EXISTS todos_changed_update ON todos",
+    "CREATE TRIGGER todos_changed_update AFTER UPDATE ON todos "
+    "REFERENCING NEW TABLE AS changed FOR EACH STATEMENT EXECUTE FUNCTION todos_changed()",
+    "DROP TRIGGER IF EXISTS todos_changed_delete ON todos",
+    "CREATE TRIGGER todos_changed_delete AFTER DELETE ON todos "
+    "REFERENCING OLD TABLE AS changed FOR EACH STATEMENT EXECUTE FUNCTION todos_changed()",
+]
+
+STATEMENTS = [
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS todos_version BIGINT NOT NULL DEFAULT 0",
+    FUNCTION,
+    *TRIGGERS,
+]
+
+
+async def upgrade(conn: AsyncConnection) -> None:
+    for statement in STATEMENTS:
+        await conn.execute(text(statement))
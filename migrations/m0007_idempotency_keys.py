@@ -0,0 +1,21 @@
+# Stored responses for IdempotencyMiddleware, shared by every app worker. Rows past
+# expires_at are never read and are deleted by the idempotency.purge job.
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS idempotency_keys (
+        key TEXT PRIMARY KEY,
+        value BYTEA NOT NULL,
+        expires_at TIMESTAMPTZ NOT NULL
+    )
+    """,
+    # The table is new and empty, so there's no need to build this concurrently
+    "CREATE INDEX IF NOT EXISTS ix_idempotency_keys_expires_at ON idempotency_keys (expires_at)",
+]
+
+
+async def upgrade(conn: AsyncConnection) -> None:
+    for statement in STATEMENTS:
+        await conn.execute(text(statement))
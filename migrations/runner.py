@@ -0,0 +1,111 @@
+import importlib
+import pkgutil
+import re
+from dataclasses import dataclass
+from types import ModuleType
+
+from decouple import config
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+# Transactional migrations give up instead of queueing every request behind their ALTER TABLE
+MIGRATION_LOCK_TIMEOUT = config("MIGRATION_LOCK_TIMEOUT", default="5s")
+
+MIGRATION_NAME = re.compile(r"^m(\d{4})_\w+$")
+# Any constant works, it only has to be the same for every deploy running migrations
+ADVISORY_LOCK_KEY = 80_917_001
+
+
+@dataclass(frozen=True, slots=True)
+class Migration:
+    version: int
+    name: str
+    module: ModuleType
+
+    @property
+    def transactional(self) -> bool:
+        # CREATE INDEX CONCURRENTLY can't run inside a transaction block
+        return getattr(self.module, "TRANSACTIONAL", True)
+
+    @property
+    def opt_in(self) -> bool:
+        # Only run when asked for by --target or --include-opt-in, never by a plain deploy
+        return getattr(self.module, "OPT_IN", False)
+
+
+def discover() -> list[Migration]:
+    migrations = []
+    for module_info in pkgutil.iter_modules(importlib.import_module("migrations").__path__):
+        match = MIGRATION_NAME.match(module_info.name)
+        if match:
+            module = importlib.import_module(f"migrations.{module_info.name}")
+            migrations.append(Migration(int(match.group(1)), module_info.name, module))
+    return sorted(migrations, key=lambda migration: migration.version)
+
+
+async def applied_versions(conn: AsyncConnection) -> set[int]:
+    result = await conn.execute(text("SELECT version FROM schema_migrations"))
+    return set(result.scalars().all())
+
+
+async def _record(conn: AsyncConnection, migration: Migration) -> None:
+    await conn.execute(
+        text("INSERT INTO schema_migrations (version, name) VALUES (:version, :name)"),
+        {"version": migration.version, "name": migration.name},
+    )
+
+
+async def create_index_concurrently(conn: AsyncConnection, name: str, definition: str, unique: bool = False) -> None:
+    # A failed concurrent build leaves an INVALID index behind that IF NOT EXISTS would keep
+    invalid = await conn.scalar(text(
+        "SELECT NOT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = :name"
+    ), {"name": name})
+    if invalid:
+        await conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"'))
+
+    kind = "UNIQUE INDEX" if unique else "INDEX"
+    await conn.execute(text(f'CREATE {kind} CONCURRENTLY IF NOT EXISTS "{name}" {definition}'))
+
+
+async def migrate(engine: AsyncEngine, target: int | None = None, include_opt_in: bool = False) -> list[Migration]:
+    applied = []
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        # Index builds can take far longer than the statement timeout the app runs with
+        await conn.execute(text("SET statement_timeout = 0"))
+        await conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": ADVISORY_LOCK_KEY})
+        try:
+            await conn.execute(text(
+                "CREATE TABLE IF NOT EXISTS schema_migrations ("
+                "version INTEGER PRIMARY KEY, "
+                "name TEXT NOT NULL, "
+                "applied_at TIMESTAMPTZ NOT NULL DEFAULT now())"
+            ))
+            done = await applied_versions(conn)
+
+            for migration in discover():
+                if migration.version in done or (target is not None and migration.version > target):
+                    continue
+                if migration.opt_in and not include_opt_in and migration.version != target:
+                    continue
+
+                if migration.transactional:
+                    async with engine.begin() as transaction:
+                        await transaction.execute(text("SET LOCAL statement_timeout = 0"))
+                        await transaction.execute(text(f"SET LOCAL lock_timeout = '{MIGRATION_LOCK_TIMEOUT}'"))
+                        await migration.module.upgrade(transaction)
+                        await _record(transaction, migration)
+                else:
+                    await migration.module.upgrade(conn)
+                    await _record(conn, migration)
+                applied.append(migration)
+        finally:
+            await conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": ADVISORY_LOCK_KEY})
+    return applied
+
+
+async def status(engine: AsyncEngine) -> list[tuple[Migration, bool]]:
+    async with engine.connect() as conn:
+        exists = await conn.scalar(text("SELECT to_regclass('schema_migrations') IS NOT NULL"))
+        done = await applied_versions(conn) if exists else set()
+    return [(migration, migration.version in done) for migration in discover()]
@@ -0,0 +1,17 @@
+import datetime
+
+import sqlalchemy as sa
+from sqlmodel import SQLModel, Field
+
+
+# A response stored by IdempotencyMiddleware, value is the packed fingerprint, status, headers and body
+class IdempotencyKey(SQLModel, table=True):
+    __tablename__ = "idempotency_keys"
+
+    key: str = Field(sa_column=sa.Column(sa.TEXT, primary_key=True))
+    value: bytes = Field(sa_column=sa.Column(sa.LargeBinary, nullable=False))
+    expires_at: datetime.datetime = Field(sa_column=sa.Column(sa.DateTime(timezone=True), nullable=False))
+
+    __table_args__ = (
+        sa.Index("ix_idempotency_keys_expires_at", "expires_at"),
+    )
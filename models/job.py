@@ -0,0 +1,29 @@
+import datetime
+
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlmodel import SQLModel, Field
+
+
+class Job(SQLModel, table=True):
+    __tablename__ = "jobs"
+
+    id: int | None = Field(default=None, sa_column=sa.Column(sa.BigInteger, primary_key=True))
+    name: str = Field(sa_column=sa.Column(sa.TEXT, nullable=False))
+    payload: dict = Field(default_factory=dict, sa_column=sa.Column(JSONB, nullable=False))
+    # queued -> running -> deleted on success, back to queued for a retry or failed for good
+    status: str = Field(default="queued", sa_column=sa.Column(sa.TEXT, nullable=False, server_default="queued"))
+    attempts: int = Field(default=0, sa_column=sa.Column(sa.Integer, nullable=False, server_default="0"))
+    max_attempts: int = Field(sa_column=sa.Column(sa.Integer, nullable=False))
+    run_at: datetime.datetime = Field(
+        sa_column=sa.Column(sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()))
+    locked_at: datetime.datetime | None = Field(default=None, sa_column=sa.Column(sa.DateTime(timezone=True)))
+    last_error: str | None = Field(default=None, sa_column=sa.Column(sa.TEXT))
+    created_at: datetime.datetime = Field(
+        sa_column=sa.Column(sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()))
+
+    __table_args__ = (
+        # Workers only ever scan the due queued jobs and the stale running ones
+        sa.Index("ix_jobs_run_at_queued", "run_at", postgresql_where=sa.text("status = 'queued'")),
+        sa.Index("ix_jobs_locked_at_running", "locked_at", postgresql_where=sa.text("status = 'running'")),
+    )
@@ -1,6 +1,7 @@
 import datetime
 
 from sqlalchemy import UniqueConstraint
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlmodel import SQLModel, Field, Relationship
 
 import sqlalchemy as sa
@@ -16,10 +17,34 @@ class Todo(SQLModel, table=True):
     user_id: int = Field(
         sa_column=sa.Column(sa.Integer, sa.ForeignKey(User.user_id, ondelete="CASCADE"), nullable=False))
     created_at: datetime.datetime = Field(
-        sa_column=sa.Column(sa.DateTime(timezone=True), default=datetime.datetime.now(datetime.UTC)))
+        sa_column=sa.Column(sa.DateTime(timezone=True), nullable=False,
+                            default=lambda: datetime.datetime.now(datetime.UTC), server_default=sa.func.now()))
+    updated_at: datetime.datetime = Field(
+        sa_column=sa.Column(sa.DateTime(timezone=True), nullable=False,
+                            default=lambda: datetime.datetime.now(datetime.UTC), server_default=sa.func.now(),
+                            onupdate=sa.func.now()))
+    completed: bool = Field(
+        default=False, sa_column=sa.Column(sa.Boolean, nullable=False, server_default=sa.false()))
+    # When the todo was completed, old completed todos are moved to todos_archive
+    completed_at: datetime.datetime | None = Field(
+        default=None, sa_column=sa.Column(sa.DateTime(timezone=True)))
+    # Maintained by Postgres, only used for search and never serialized
+    search_vector: str | None = Field(
+        default=None, exclude=True,
+        sa_column=sa.Column(TSVECTOR, sa.Computed("to_tsvector('simple', label)", persisted=True)))
 
     user: User = Relationship(back_populates="todos")
 
     __table_args__ = (
-        UniqueConstraint("label", "user_id", name="unique_todos_user_id_label"),
+        # The schema is owned by migrations/, keep these in step with the latest migration
+        UniqueConstraint("user_id", "label", name="unique_todos_user_id_label"),
+        # Keyset pagination: every page is a range scan on (user_id, created_at, id)
+        sa.Index("ix_todos_user_id_created_at_id", "user_id", "created_at", "id"),
+        sa.Index("ix_todos_created_at_id", "created_at", "id"),
+        # Search is always scoped to one user, btree_gin lets user_id lead the GIN indexes
+        sa.Index("ix_todos_user_id_search_vector", "user_id", "search_vector", postgresql_using="gin"),
+        sa.Index("ix_todos_user_id_label_trgm", "user_id", "label", postgresql_using="gin",
+                 postgresql_ops={"label": "gin_trgm_ops"}),
+        # Only completed todos are ever candidates for archival
+        sa.Index("ix_todos_completed_at", "completed_at", postgresql_where=sa.text("completed")),
     )
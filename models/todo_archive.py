@@ -0,0 +1,25 @@
+import datetime
+
+import sqlalchemy as sa
+from sqlmodel import SQLModel, Field
+
+from models.user import User
+
+
+# Cold storage for completed todos, filled by the todos.archive job. Rows keep their todo id.
+class TodoArchive(SQLModel, table=True):
+    __tablename__ = "todos_archive"
+
+    id: int = Field(sa_column=sa.Column(sa.Integer, primary_key=True, autoincrement=False))
+    label: str = Field(sa_column=sa.Column(sa.TEXT, nullable=False))
+    user_id: int = Field(
+        sa_column=sa.Column(sa.Integer, sa.ForeignKey(User.user_id, ondelete="CASCADE"), nullable=False))
+    created_at: datetime.datetime = Field(sa_column=sa.Column(sa.DateTime(timezone=True), nullable=False))
+    updated_at: datetime.datetime = Field(sa_column=sa.Column(sa.DateTime(timezone=True), nullable=False))
+    completed_at: datetime.datetime | None = Field(default=None, sa_column=sa.Column(sa.DateTime(timezone=True)))
+    archived_at: datetime.datetime = Field(
+        sa_column=sa.Column(sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()))
+
+    __table_args__ = (
+        sa.Index("ix_todos_archive_user_id_created_at_id", "user_id", "created_at", "id"),
+    )
@@ -0,0 +1,26 @@
+import datetime
+from dataclasses import dataclass
+
+from models.todo import Todo
+
+
+# Read model for the hot list/detail queries: no ORM identity map, no pydantic
+# validation, and orjson serializes slotted dataclasses natively
+@dataclass(slots=True, frozen=True)
+class TodoRead:
+    id: int
+    label: str
+    created_at: datetime.datetime
+    completed: bool = False
+
+
+TODO_READ_COLUMNS = (Todo.id, Todo.label, Todo.created_at, Todo.completed)
+
+
+@dataclass(slots=True, frozen=True)
+class TodoSearchHit:
+    id: int
+    label: str
+    created_at: datetime.datetime
+    completed: bool
+    rank: float
@@ -16,5 +16,7 @@ class User(SQLModel, table=True):
     birthdate: datetime.date = Field(nullable=False)
     password: str = Field(sa_column=sa.Column(sa.TEXT, nullable=False))
     created_at: str = Field(sa_column=sa.Column(sa.DateTime(timezone=True), default=datetime.datetime.now))
+    # Bumped by the todos_changed trigger on every statement that writes the user's todos
+    todos_version: int = Field(default=0, sa_column=sa.Column(sa.BigInteger, nullable=False, server_default="0"))
 
-    todos: list["Todo"] = Relationship(back_populates="user", sa_relationship_kwargs={'lazy': 'joined'})
+    todos: list["Todo"] = Relationship(back_populates="user", sa_relationship_kwargs={'lazy': 'raise'})
@@ -0,0 +1,63 @@
+import base64
+import binascii
+import datetime
+
+import orjson
+
+from custom_exceptions import InvalidCursorException
+
+
+# Cursors are opaque to clients: base64url encoded JSON of the last row's sort key
+def encode_cursor(*values) -> str:
+    return base64.urlsafe_b64encode(orjson.dumps(values)).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(cursor: str) -> list:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = orjson.loads(base64.urlsafe_b64decode(padded))
+    except (binascii.Error, ValueError):
+        raise InvalidCursorException(f"Cursor [{cursor}] is invalid")
+
+    if not isinstance(values, list):
+        raise InvalidCursorException(f"Cursor [{cursor}] is invalid")
+    return values
+
+
+def encode_todo_cursor(created_at: datetime.datetime, todo_id: int) -> str:
+    return encode_cursor(created_at.isoformat(), todo_id)
+
+
+def decode_todo_cursor(cursor: str) -> tuple[datetime.datetime, int]:
+    values = decode_cursor(cursor)
+    try:
+        created_at, todo_id = values
+        return datetime.datetime.fromisoformat(created_at), int(todo_id)
+    except (TypeError, ValueError):
+        raise InvalidCursorException(f"Cursor [{cursor}] is invalid")
+
+
+def next_todo_cursor(todos: list, limit: int | None) -> str | None:
+    # A short page is the last page
+    if not todos or limit is None or len(todos) < limit:
+        return None
+
+    last = todos[-1]
+    return encode_todo_cursor(last.created_at, last.id)
+
+
+def decode_search_cursor(cursor: str) -> tuple[float, int]:
+    values = decode_cursor(cursor)
+    try:
+        rank, todo_id = values
+        return float(rank), int(todo_id)
+    except (TypeError, ValueError):
+        raise InvalidCursorException(f"Cursor [{cursor}] is invalid")
+
+
+def next_search_cursor(hits: list, limit: int | None) -> str | None:
+    if not hits or limit is None or len(hits) < limit:
+        return None
+
+    last = hits[-1]
+    return encode_cursor(last.rank, last.id)
@@ -0,0 +1,256 @@
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import orjson
+from decouple import config
+
+import metrics
+from cache.backends import FakeRedis
+from cache.todo_cache import REDIS_URL
+
+RATE_LIMIT_BACKEND = config("RATE_LIMIT_BACKEND", default="memory")  # memory, redis, fake-redis or none
+RATE_LIMIT_MAX_KEYS = config("RATE_LIMIT_MAX_KEYS", default=100_000, cast=int)
+# Behind a reverse proxy every connection comes from the proxy, and all clients share its
+# buckets. Railway's edge proxy (see railway.json) and most load balancers append the client's
+# address to X-Forwarded-For, set this to true there. Never without such a proxy in front,
+# clients would pick their own IP.
+RATE_LIMIT_TRUST_FORWARDED = config("RATE_LIMIT_TRUST_FORWARDED", default=False, cast=bool)
+# Proxies appending to X-Forwarded-For, the client is this many entries from the right. The
+# entries left of it arrived from the client and are ignored.
+RATE_LIMIT_PROXY_HOPS = config("RATE_LIMIT_PROXY_HOPS", default=1, cast=int)
+# Limits are "<requests>/<seconds>": the bucket holds <requests> tokens and refills over <seconds>
+RATE_LIMIT_PER_IP = config("RATE_LIMIT_PER_IP", default="600/60")
+RATE_LIMIT_LOGIN_PER_IP = config("RATE_LIMIT_LOGIN_PER_IP", default="30/60")
+# Per username and client IP: the strict one, it only ever locks out the address guessing
+RATE_LIMIT_LOGIN_PER_USERNAME_AND_IP = config("RATE_LIMIT_LOGIN_PER_USERNAME_AND_IP", default="10/300")
+# Per username from any IP: softer, so guessing from many addresses is slowed down without one
+# address being able to lock a victim out of their account
+RATE_LIMIT_LOGIN_PER_USERNAME = config("RATE_LIMIT_LOGIN_PER_USERNAME", default="100/300")
+RATE_LIMIT_SIGNUP_PER_IP = config("RATE_LIMIT_SIGNUP_PER_IP", default="5/300")
+
+LOGIN_PATH = "/api/v1/auth/login"
+SIGNUP_PATH = "/api/v1/auth/users"
+# Probed by the load balancer and the metrics scraper, which share one address
+EXEMPT_PATHS = {"/", "/ready", "/metrics"}
+# Login bodies are two short strings, anything bigger isn't worth parsing for a username
+MAX_LOGIN_BODY = 4096
+
+rate_limited = metrics.Counter("rate_limited_requests_total", "Requests rejected by the rate limiter")
+store_errors = metrics.Counter("rate_limit_store_errors_total", "Rate limit checks let through after a store error")
+
+
+@dataclass(frozen=True, slots=True)
+class Rule:
+    name: str
+    capacity: float
+    refill_rate: float  # tokens per second
+
+    @classmethod
+    def parse(cls, name: str, value: str) -> "Rule | None":
+        if not value:
+            return None
+        requests, _, seconds = value.partition("/")
+        return cls(name, float(requests), float(requests) / float(seconds or 1))
+
+
+def take_token(tokens: float | None, updated_at: float | None, now: float,
+               capacity: float, refill_rate: float) -> tuple[float, float]:
+    # Returns the tokens left and how many seconds to wait, 0 when the request may go ahead
+    if tokens is None:
+        tokens = capacity
+    else:
+        tokens = min(capacity, tokens + max(0.0, now - updated_at) * refill_rate)
+
+    if tokens >= 1:
+        return tokens - 1, 0.0
+    return tokens, (1 - tokens) / refill_rate
+
+
+class InMemoryBucketStore:
+    # Per process, so with N workers a client effectively gets N times the limit
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    async def take(self, key: str, rule: Rule) -> float:
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.pop(key, (None, None))
+        tokens, wait = take_token(tokens, updated_at, now, rule.capacity, rule.refill_rate)
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            # The least recently used bucket is the one most likely to be full again anyway
+            self._buckets.popitem(last=False)
+        return wait
+
+
+# Refill and take in one round trip. Redis' clock is used so workers with skewed clocks agree.
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local refill_rate = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(state[1])
+if tokens == nil then
+    tokens = capacity
+else
+    tokens = math.min(capacity, tokens + math.max(0, now - tonumber(state[2])) * refill_rate)
+end
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / refill_rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated_at', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / refill_rate) + 1)
+return tostring(wait)
+"""
+
+
+async def _fake_token_bucket(client: FakeRedis, keys, args) -> bytes:
+    capacity, refill_rate = float(args[0]), float(args[1])
+    state = await client.get(keys[0])
+    tokens, updated_at = orjson.loads(state) if state is not None else (None, None)
+    now = time.time()
+    tokens, wait = take_token(tokens, updated_at, now, capacity, refill_rate)
+    await client.set(keys[0], orjson.dumps([tokens, now]), ex=math.ceil(capacity / refill_rate) + 1)
+    return str(wait).encode()
+
+
+class RedisBucketStore:
+    # Shared by every worker and instance. Works with redis.asyncio.Redis or FakeRedis.
+    def __init__(self, client):
+        self.client = client
+        if isinstance(client, FakeRedis):
+            client.register_script(TOKEN_BUCKET_SCRIPT, _fake_token_bucket)
+
+    async def take(self, key: str, rule: Rule) -> float:
+        wait = await self.client.eval(TOKEN_BUCKET_SCRIPT, 1, f"ratelimit:{key}", rule.capacity, rule.refill_rate)
+        return float(wait)
+
+
+def create_bucket_store():
+    if RATE_LIMIT_BACKEND == "none":
+        return None
+    if RATE_LIMIT_BACKEND == "fake-redis":
+        return RedisBucketStore(FakeRedis())
+    if RATE_LIMIT_BACKEND == "redis":
+        from redis.asyncio import Redis
+        return RedisBucketStore(Redis.from_url(REDIS_URL))
+    return InMemoryBucketStore(RATE_LIMIT_MAX_KEYS)
+
+
+def client_ip(scope) -> str:
+    if RATE_LIMIT_TRUST_FORWARDED:
+        forwarded = [
+            address.strip()
+            for name, value in scope["headers"] if name == b"x-forwarded-for"
+            for address in value.decode("latin-1").split(",") if address.strip()
+        ]
+        if forwarded:
+            return forwarded[max(0, len(forwarded) - RATE_LIMIT_PROXY_HOPS)]
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+async def read_body(receive) -> tuple[bytes, list[dict]]:
+    messages = []
+    body = b""
+    while True:
+        message = await receive()
+        messages.append(message)
+        if message["type"] != "http.request":
+            break
+        body += message.get("body", b"")
+        if not message.get("more_body") or len(body) > MAX_LOGIN_BODY:
+            break
+    return body, messages
+
+
+def login_username(body: bytes) -> str | None:
+    if len(body) > MAX_LOGIN_BODY:
+        return None
+    try:
+        username = orjson.loads(body).get("username")
+    except (orjson.JSONDecodeError, AttributeError):
+        return None
+    return username.strip().lower() if isinstance(username, str) else None
+
+
+class RateLimitMiddleware:
+    # Runs before routing and before any dependency, so a rejected request never gets a
+    # DB session, a user lookup or a bcrypt slot
+    def __init__(self, app, store=None):
+        self.app = app
+        self.store = store if store is not None else create_bucket_store()
+        self.per_ip = Rule.parse("ip", RATE_LIMIT_PER_IP)
+        self.login_per_ip = Rule.parse("login_ip", RATE_LIMIT_LOGIN_PER_IP)
+        self.login_per_username_and_ip = Rule.parse("login_username_ip", RATE_LIMIT_LOGIN_PER_USERNAME_AND_IP)
+        self.login_per_username = Rule.parse("login_username", RATE_LIMIT_LOGIN_PER_USERNAME)
+        self.signup_per_ip = Rule.parse("signup_ip", RATE_LIMIT_SIGNUP_PER_IP)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.store is None or scope["path"] in EXEMPT_PATHS:
+            return await self.app(scope, receive, send)
+
+        ip = client_ip(scope)
+        checks = [(self.per_ip, ip)]
+        if scope["method"] == "POST" and scope["path"] == LOGIN_PATH:
+            checks.append((self.login_per_ip, ip))
+            if self.login_per_username_and_ip is not None or self.login_per_username is not None:
+                body, messages = await read_body(receive)
+                receive = self._replay(messages, receive)
+                username = login_username(body)
+                if username is not None:
+                    # In this order, attempts the per-IP bucket rejects don't drain the shared one
+                    checks.append((self.login_per_username_and_ip, f"{username}:{ip}"))
+                    checks.append((self.login_per_username, username))
+        elif scope["method"] == "POST" and scope["path"] == SIGNUP_PATH:
+            checks.append((self.signup_per_ip, ip))
+
+        for rule, identity in checks:
+            if rule is None:
+                continue
+            wait = await self._take(f"{rule.name}:{identity}", rule)
+            if wait:
+                rate_limited.inc(rule=rule.name)
+                return await self._reject(send, wait)
+
+        await self.app(scope, receive, send)
+
+    async def _take(self, key: str, rule: Rule) -> float:
+        try:
+            return await self.store.take(key, rule)
+        except Exception:
+            # An unreachable shared store shouldn't take the API down with it
+            store_errors.inc()
+            return 0.0
+
+    @staticmethod
+    def _replay(messages: list[dict], receive):
+        async def replay():
+            if messages:
+                return messages.pop(0)
+            return await receive()
+        return replay
+
+    @staticmethod
+    async def _reject(send, wait: float) -> None:
+        body = orjson.dumps({"detail": {
+            "message": "Too many requests",
+            "code": "TOO_MANY_REQUESTS",
+            "status_code": 429,
+        }})
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(wait))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
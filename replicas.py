@@ -0,0 +1,105 @@
+import itertools
+import time
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.orm import Session
+
+READ_PRIMARY_COOKIE = "read_primary"
+READ_PRIMARY_HEADER = "x-read-your-writes"
+UNSAFE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+
+class ReplicaSet:
+    # Round robin over the replicas, skipping the ones that recently failed
+    def __init__(self, engines: list[AsyncEngine], cooldown: float):
+        self.engines = engines
+        self.cooldown = cooldown
+        self.down_until = [0.0] * len(engines)
+        self._counter = itertools.count()
+
+        for engine in engines:
+            event.listen(engine.sync_engine, "handle_error", self._error_handler(engine))
+
+    def _error_handler(self, engine: AsyncEngine):
+        def handle_error(context):
+            # Disconnects and failed connects (no connection yet) take the replica out of rotation
+            if context.is_disconnect or context.connection is None:
+                self.mark_down(engine)
+
+        return handle_error
+
+    def mark_down(self, engine: AsyncEngine) -> None:
+        self.down_until[self.engines.index(engine)] = time.monotonic() + self.cooldown
+
+    def is_down(self, engine: AsyncEngine) -> bool:
+        return self.down_until[self.engines.index(engine)] > time.monotonic()
+
+    def choose(self) -> AsyncEngine | None:
+        if not self.engines:
+            return None
+
+        now = time.monotonic()
+        start = next(self._counter)
+        for offset in range(len(self.engines)):
+            index = (start + offset) % len(self.engines)
+            if self.down_until[index] <= now:
+                return self.engines[index]
+        return None
+
+
+def routing_session_class(primary: AsyncEngine, replicas: ReplicaSet) -> type[Session]:
+    class RoutingSession(Session):
+        def get_bind(self, mapper=None, clause=None, **kw):
+            if self._flushing:
+                return primary.sync_engine
+
+            # Stay on one replica for the whole request so reads are consistent with each other
+            engine = self.info.get("replica")
+            if engine is None:
+                engine = self.info["replica"] = replicas.choose() or primary
+            return engine.sync_engine
+
+        def execute(self, statement, *args, **kw):
+            try:
+                return super().execute(statement, *args, **kw)
+            except Exception as e:
+                # A replica the error took out of rotation fails the statement over to the
+                # primary. Not once the session holds ORM objects, the rollback expires them.
+                engine = self.info.get("replica")
+                if engine is None or engine is primary or self.identity_map:
+                    raise
+                # asyncpg's refused and timed out connects are plain OSErrors, which never
+                # reach the handle_error event
+                if isinstance(e, OSError):
+                    replicas.mark_down(engine)
+                if not replicas.is_down(engine):
+                    raise
+            self.rollback()
+            self.info["replica"] = primary
+            return super().execute(statement, *args, **kw)
+
+    return RoutingSession
+
+
+def wants_primary(headers, cookies) -> bool:
+    return READ_PRIMARY_COOKIE in cookies or headers.get(READ_PRIMARY_HEADER) == "1"
+
+
+class ReadYourWritesMiddleware:
+    # After a successful write, pin the client's reads to the primary until replicas catch up
+    def __init__(self, app, window: int):
+        self.app = app
+        self.window = window
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in UNSAFE_METHODS:
+            return await self.app(scope, receive, send)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                cookie = f"{READ_PRIMARY_COOKIE}=1; Max-Age={self.window}; Path=/; HttpOnly; SameSite=Lax"
+                message["headers"] = list(message.get("headers", [])) + [(b"set-cookie", cookie.encode("latin-1"))]
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
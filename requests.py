@@ -1,4 +1,7 @@
-from pydantic import BaseModel
+from decouple import config
+from pydantic import BaseModel, Field
+
+BULK_MAX_ITEMS = config("BULK_MAX_ITEMS", default=500, cast=int)
 
 
 class CreateTodoRequest(BaseModel):
@@ -8,6 +11,19 @@ class CreateTodoRequest(BaseModel):
 class UpdateTodoRequest(BaseModel):
     id: int
     label: str
+    completed: bool | None = None
+
+
+class BulkCreateTodosRequest(BaseModel):
+    items: list[CreateTodoRequest] = Field(min_length=1, max_length=BULK_MAX_ITEMS)
+
+
+class BulkUpdateTodosRequest(BaseModel):
+    items: list[UpdateTodoRequest] = Field(min_length=1, max_length=BULK_MAX_ITEMS)
+
+
+class BulkDeleteTodosRequest(BaseModel):
+    ids: list[int] = Field(min_length=1, max_length=BULK_MAX_ITEMS)
 
 
 class LoginRequest(BaseModel):
@@ -15,6 +31,11 @@ class LoginRequest(BaseModel):
     password: str
 
 
+class ChangePasswordRequest(BaseModel):
+    current_password: str
+    new_password: str
+
+
 class CreateUserRequest(BaseModel):
     first_name: str
     last_name: str
@@ -6,3 +6,14 @@ class GetByUsernameResponse(BaseModel):
     username: str
     email: str
     password: str
+
+
+class BulkItemResult(BaseModel):
+    index: int
+    id: int | None = None
+    label: str | None = None
+    status: str
+
+
+class BulkResponse(BaseModel):
+    items: list[BulkItemResult]
@@ -0,0 +1,90 @@
+# Hypercorn configuration, loaded with: hypercorn --config python:server_config main:app
+#
+# Hypercorn reads the lowercase module attributes below. SERVER_PROFILE picks the
+# defaults, every value can still be overridden through the environment.
+import importlib.util
+import math
+import os
+
+from decouple import config
+
+SERVER_PROFILE = config("SERVER_PROFILE", default="production")  # production or development
+# Read here instead of imported from idempotency, which pulls in the whole app
+IDEMPOTENCY_BACKEND = config("IDEMPOTENCY_BACKEND", default="postgres")
+
+
+CGROUP_CPU_MAX = "/sys/fs/cgroup/cpu.max"  # cgroup v2
+CGROUP_CPU_QUOTA = "/sys/fs/cgroup/cpu/cpu.cfs_quota_us"  # cgroup v1
+CGROUP_CPU_PERIOD = "/sys/fs/cgroup/cpu/cpu.cfs_period_us"
+
+
+def available_cpus() -> int:
+    # In a container os.cpu_count() is the host's CPU count, the cgroup quota is what we get
+    try:
+        with open(CGROUP_CPU_MAX) as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            return max(1, math.ceil(int(quota) / int(period)))
+    except (OSError, ValueError):
+        try:
+            with open(CGROUP_CPU_QUOTA) as f:
+                quota = int(f.read())
+            with open(CGROUP_CPU_PERIOD) as f:
+                period = int(f.read())
+            if quota > 0:
+                return max(1, math.ceil(quota / period))
+        except (OSError, ValueError):
+            pass
+    return len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+
+
+def per_process_backends() -> list[str]:
+    # Backends whose state has to be seen by every worker but is kept in the worker's memory.
+    # The todo cache isn't one: its entries are keyed by the todos_version, a per-process
+    # copy is never served for data another worker changed.
+    backends = {"IDEMPOTENCY_BACKEND": IDEMPOTENCY_BACKEND}
+    return [f"{name}={value}" for name, value in backends.items() if value in ("memory", "fake-redis")]
+
+
+PROFILES = {
+    "development": {
+        "workers": 1,
+        "keep_alive_timeout": 5,
+        "backlog": 100,
+        "graceful_timeout": 1,
+        "use_reloader": True,
+    },
+    "production": {
+        # Only an explicitly configured per-process backend holds this to one worker
+        "workers": 1 if per_process_backends() else available_cpus(),
+        # Longer than the load balancer's idle timeout, so it never reuses a closed connection
+        "keep_alive_timeout": 75,
+        "backlog": 2048,
+        "graceful_timeout": 30,
+        "use_reloader": False,
+    },
+}
+
+_profile = PROFILES[SERVER_PROFILE]
+
+
+def worker_count() -> int:
+    return config("WEB_CONCURRENCY", default=_profile["workers"], cast=int)
+
+
+def _default_worker_class() -> str:
+    return "uvloop" if importlib.util.find_spec("uvloop") is not None else "asyncio"
+
+
+bind = config("SERVER_BIND", default="[::]:8000").split(",")
+workers = worker_count()
+worker_class = config("SERVER_WORKER_CLASS", default=_default_worker_class())
+keep_alive_timeout = config("SERVER_KEEP_ALIVE_TIMEOUT", default=_profile["keep_alive_timeout"], cast=float)
+backlog = config("SERVER_BACKLOG", default=_profile["backlog"], cast=int)
+# On SIGTERM workers stop accepting connections and get this long to finish in-flight requests
+graceful_timeout = config("SERVER_GRACEFUL_TIMEOUT", default=_profile["graceful_timeout"], cast=float)
+use_reloader = _profile["use_reloader"]
+alpn_protocols = ["h2", "http/1.1"] if config("SERVER_H2", default=True, cast=bool) else ["http/1.1"]
+h2_max_concurrent_streams = config("SERVER_H2_MAX_CONCURRENT_STREAMS", default=100, cast=int)
+accesslog = "-" if config("SERVER_ACCESS_LOG", default=SERVER_PROFILE == "development", cast=bool) else None
+errorlog = "-"
@@ -1,12 +1,17 @@
-from sqlalchemy import delete, update
+from sqlalchemy import delete, func, update, tuple_
 from sqlmodel import Session, select
+from cache.todo_cache import TodoCache, NullTodoCache
 from models.todo import Todo
+from models.todo_read import TodoRead, TODO_READ_COLUMNS
+from pagination import decode_todo_cursor
 from requests import CreateTodoRequest, UpdateTodoRequest
+from todo_statements import completion_values
 
 
 class TodoService:
-    def __init__(self, session: Session):
+    def __init__(self, session: Session, cache: TodoCache | None = None):
         self.session = session
+        self.cache = cache or NullTodoCache()
 
     async def create_todo(self, data: CreateTodoRequest):
         new_todo = Todo(label=data.label)
@@ -16,41 +21,53 @@ class TodoService:
 
         return new_todo
 
-    async def get_todo(self, todo_id: int) -> Todo:
+    async def get_todo(self, todo_id: int) -> TodoRead:
         query = (
-            select(Todo)
+            select(*TODO_READ_COLUMNS)
             .where(Todo.id == todo_id)
         )
 
         result = await self.session.execute(query)
 
-        return result.scalars().one()
+        return TodoRead(*result.one())
 
-    async def get_todos(self, offset: int, limit: int) -> list[Todo]:
+    async def get_todos(self, offset: int, limit: int, cursor: str | None = None) -> list[TodoRead]:
         query = (
-            select(Todo)
-            .offset(offset)
+            select(*TODO_READ_COLUMNS)
+            .order_by(Todo.created_at, Todo.id)
             .limit(limit)
         )
 
+        if cursor is not None:
+            created_at, todo_id = decode_todo_cursor(cursor)
+            query = query.where(tuple_(Todo.created_at, Todo.id) > tuple_(created_at, todo_id))
+        else:
+            query = query.offset(offset)
+
         data = await self.session.execute(query)
-        return data.scalars().all()
+        return [TodoRead(*row) for row in data]
 
     async def update_todo(self, new_todo: UpdateTodoRequest) -> None:
         query = (
             update(Todo)
-            .values(label=new_todo.label)
+            .values(label=new_todo.label, updated_at=func.now(), **completion_values(new_todo.completed))
             .where(Todo.id == new_todo.id)
+            .returning(Todo.user_id)
         )
 
-        await self.session.execute(query)
+        user_ids = (await self.session.execute(query)).scalars().all()
         await self.session.commit()
+        for user_id in user_ids:
+            await self.cache.invalidate(user_id)
 
     async def delete_todo(self, todo_id: int) -> None:
         query = (
             delete(Todo)
             .where(Todo.id == todo_id)
+            .returning(Todo.user_id)
         )
 
-        await self.session.execute(query)
+        user_ids = (await self.session.execute(query)).scalars().all()
         await self.session.commit()
+        for user_id in user_ids:
+            await self.cache.invalidate(user_id)
@@ -1,13 +1,14 @@
 from datetime import datetime
 
 import asyncpg
-from sqlmodel import Session, select
+from sqlmodel import Session, delete, select, update
 from sqlalchemy import exc
 
-from auth.password import hash_password, verify_password
-from custom_exceptions import EmailDuplicationException, UserNotFoundException
+from auth.password import PASSWORD_REHASH_ON_LOGIN, needs_rehash, password_hasher
+from auth.principals import forget_principal, invalidate_user
+from custom_exceptions import EmailDuplicationException, PasswordHasherBusyException, UserNotFoundException
 from models.user import User
-from requests import CreateUserRequest, LoginRequest
+from requests import ChangePasswordRequest, CreateUserRequest, LoginRequest
 
 
 class UserService:
@@ -15,6 +16,8 @@ class UserService:
         self.session = session
 
     async def create_user(self, data: CreateUserRequest):
+        hashed_password = await password_hasher.hash(data.password)
+
         try:
             new_user = User(
                 first_name=data.first_name,
@@ -22,7 +25,7 @@ class UserService:
                 email=data.email,
                 birthdate=datetime.strptime(data.birthdate, "%Y-%m-%d").date(),
                 username=data.username,
-                password=hash_password(data.password).decode("utf-8"),
+                password=hashed_password.decode("utf-8"),
             )
 
             self.session.add(new_user)
@@ -50,7 +53,58 @@ class UserService:
         if not user:
             raise UserNotFoundException("Username or password is invalid")
 
-        if not verify_password(data.password, user.password.encode("utf-8")):
+        hashed_password = user.password.encode("utf-8")
+        if not await password_hasher.verify(data.password, hashed_password):
             raise UserNotFoundException("Username or password is invalid")
 
+        if PASSWORD_REHASH_ON_LOGIN and needs_rehash(hashed_password):
+            await self._rehash_password(user.user_id, data.password)
+
         return user
+
+    async def _rehash_password(self, user_id: int, password: str) -> None:
+        # The login already succeeded, a busy hasher just postpones the upgrade to the next login
+        try:
+            new_password = await password_hasher.hash(password)
+        except PasswordHasherBusyException:
+            return
+
+        query = (
+            update(User)
+            .values(password=new_password.decode("utf-8"))
+            .where(User.user_id == user_id)
+        )
+
+        await self.session.execute(query)
+        await self.session.commit()
+        # Same password, so issued tokens stay valid, only the cached row is outdated
+        forget_principal(user_id)
+
+    async def change_password(self, user_id: int, data: ChangePasswordRequest) -> None:
+        result = await self.session.execute(select(User.password).where(User.user_id == user_id))
+        current_password = result.scalar_one_or_none()
+
+        if current_password is None or not await password_hasher.verify(
+                data.current_password, current_password.encode("utf-8")):
+            raise UserNotFoundException("Username or password is invalid")
+
+        new_password = await password_hasher.hash(data.new_password)
+        query = (
+            update(User)
+            .values(password=new_password.decode("utf-8"))
+            .where(User.user_id == user_id)
+        )
+
+        await self.session.execute(query)
+        await self.session.commit()
+        invalidate_user(user_id)
+
+    async def delete_user(self, user_id: int) -> None:
+        query = delete(User).where(User.user_id == user_id).returning(User.user_id)
+
+        result = await self.session.execute(query)
+        if result.scalar_one_or_none() is None:
+            raise UserNotFoundException(f"User [{user_id}] not found")
+
+        await self.session.commit()
+        invalidate_user(user_id)
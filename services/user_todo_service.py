@@ -1,23 +1,43 @@
 import asyncpg
-from sqlalchemy import exc
-from sqlmodel import select, and_, delete, update, Session
+import sqlalchemy as sa
+from sqlalchemy import exc, text, tuple_
+from sqlalchemy.dialects import postgresql
+from sqlmodel import select, and_, delete, Session
 
-from custom_exceptions import TodoDuplicationException
+from cache.todo_cache import TodoCache, NullTodoCache
+from custom_exceptions import TodoDuplicationException, TodoNotFoundException
+from etags import make_etag
+from importers import batched
+from jobs.queue import enqueue
 from models.todo import Todo
+from models.todo_archive import TodoArchive
+from models.todo_read import TodoRead, TodoSearchHit, TODO_READ_COLUMNS
 from models.user import User
+from pagination import decode_search_cursor, decode_todo_cursor
 from requests import CreateTodoRequest, UpdateTodoRequest
+from responses import BulkItemResult
+from todo_statements import delete_todo_statement, label_starts_with, update_todo_statement
 
 
 class UserTodoService:
-    def __init__(self, session: Session):
+    def __init__(self, session: Session, cache: TodoCache | None = None):
         self.session = session
+        self.cache = cache or NullTodoCache()
+
+    async def _warm_cache(self, user_id: int) -> None:
+        # Call once the write is committed and this worker's cached version is dropped
+        if self.cache.shared:
+            await enqueue(self.session, "todos.warm_cache", {"user_id": user_id})
+            await self.session.commit()
 
     async def create_todo(self, data: CreateTodoRequest, user_id: int):
         try:
             new_todo = Todo(label=data.label, user_id=user_id)
 
             self.session.add(new_todo)
+            await self.session.flush()
             await self.session.commit()
+            await self.cache.invalidate(user_id)
 
             return new_todo
         except (exc.IntegrityError, asyncpg.exceptions.UniqueViolationError):
@@ -25,41 +45,262 @@ class UserTodoService:
         except Exception as e:
             raise Exception(e)
 
-    async def get_todos(self, user_id: int, offset: int, limit: int):
+    async def get_todos_version(self, user_id: int) -> int:
+        # One primary key lookup, however many todos the user has (see m0006_todos_version)
+        result = await self.session.execute(select(User.todos_version).where(User.user_id == user_id))
+        return result.scalar_one_or_none() or 0
+
+    async def get_etag(self, user_id: int, key: str) -> str:
+        return make_etag(await self.get_todos_version(user_id), key)
+
+    async def get_todos(self, user_id: int, offset: int, limit: int, cursor: str | None = None):
         query = (
-            select(Todo)
+            select(*TODO_READ_COLUMNS)
             .where(Todo.user_id == user_id)
-            .offset(offset)
+            .order_by(Todo.created_at, Todo.id)
+            .limit(limit)
+        )
+
+        if cursor is not None:
+            created_at, todo_id = decode_todo_cursor(cursor)
+            query = query.where(tuple_(Todo.created_at, Todo.id) > tuple_(created_at, todo_id))
+        else:
+            query = query.offset(offset)
+
+        result = await self.session.execute(query)
+        return [TodoRead(*row) for row in result]
+
+    async def get_archived_todos(self, user_id: int, limit: int, cursor: str | None = None):
+        # Archived todos are never in the hot table, so the default list queries don't pay for them
+        query = (
+            select(TodoArchive.id, TodoArchive.label, TodoArchive.created_at, sa.true())
+            .where(TodoArchive.user_id == user_id)
+            .order_by(TodoArchive.created_at, TodoArchive.id)
             .limit(limit)
         )
 
+        if cursor is not None:
+            created_at, todo_id = decode_todo_cursor(cursor)
+            query = query.where(tuple_(TodoArchive.created_at, TodoArchive.id) > tuple_(created_at, todo_id))
+
         result = await self.session.execute(query)
-        return result.scalars().all()
+        return [TodoRead(*row) for row in result]
+
+    async def search_todos(self, user_id: int, q: str, limit: int, cursor: str | None = None):
+        # Full text match on the tsvector, plus prefix and typo tolerant matches through pg_trgm
+        tsquery = sa.func.websearch_to_tsquery("simple", q)
+        rank = sa.func.greatest(sa.func.ts_rank(Todo.search_vector, tsquery), sa.func.similarity(Todo.label, q))
+
+        query = (
+            select(*TODO_READ_COLUMNS, rank.label("rank"))
+            .where(and_(
+                Todo.user_id == user_id,
+                sa.or_(
+                    Todo.search_vector.op("@@")(tsquery),
+                    label_starts_with(q),
+                    Todo.label.op("%")(q),
+                ),
+            ))
+            .order_by(rank.desc(), Todo.id)
+            .limit(limit)
+        )
+
+        if cursor is not None:
+            last_rank, last_id = decode_search_cursor(cursor)
+            query = query.where(sa.or_(rank < last_rank, and_(rank == last_rank, Todo.id > last_id)))
+
+        result = await self.session.execute(query)
+        return [TodoSearchHit(*row) for row in result]
+
+    async def export_todos(self, user_id: int, batch_size: int):
+        # session.stream uses a server side cursor, only batch_size rows are held in memory at once
+        query = (
+            select(Todo.id, Todo.label, Todo.created_at)
+            .where(Todo.user_id == user_id)
+            .order_by(Todo.created_at, Todo.id)
+            .execution_options(yield_per=batch_size)
+        )
+
+        result = await self.session.stream(query)
+        async for rows in result.partitions():
+            yield rows
 
     async def get_todo(self, user_id: int, todo_id: int):
         query = (
-            select(Todo)
+            select(*TODO_READ_COLUMNS)
             .where(and_(Todo.user_id == user_id, Todo.id == todo_id))
         )
 
         result = await self.session.execute(query)
-        return result.scalars().one()
+        return TodoRead(*result.one())
 
     async def delete_todo(self, user_id: int, todo_id: int) -> None:
+        result = await self.session.execute(delete_todo_statement(user_id, todo_id))
+        if result.scalar_one_or_none() is None:
+            raise TodoNotFoundException(f"Todo [{todo_id}] not found")
+
+        await self.session.commit()
+        await self.cache.invalidate(user_id)
+
+    async def update_todo(self, user_id: int, new_todo: UpdateTodoRequest) -> TodoRead:
+        try:
+            result = await self.session.execute(
+                update_todo_statement(user_id, new_todo.id, new_todo.label, new_todo.completed))
+            row = result.one_or_none()
+        except (exc.IntegrityError, asyncpg.exceptions.UniqueViolationError):
+            raise TodoDuplicationException(f"Todo [{new_todo.label}] already exists")
+
+        if row is None:
+            raise TodoNotFoundException(f"Todo [{new_todo.id}] not found")
+
+        await self.session.commit()
+        await self.cache.invalidate(user_id)
+        return TodoRead(*row)
+
+    async def create_todos(self, user_id: int, items: list[CreateTodoRequest]) -> list[BulkItemResult]:
+        labels = list(dict.fromkeys(item.label for item in items))
         query = (
-            delete(Todo)
-            .where(and_(Todo.id == todo_id, User.user_id == user_id))
+            postgresql.insert(Todo)
+            .values([{"label": label, "user_id": user_id} for label in labels])
+            .on_conflict_do_nothing(constraint="unique_todos_user_id_label")
+            .returning(Todo.id, Todo.label)
         )
 
-        await self.session.execute(query)
+        result = await self.session.execute(query)
+        created = {row.label: row.id for row in result}
         await self.session.commit()
+        await self.cache.invalidate(user_id)
+        if created:
+            await self._warm_cache(user_id)
+
+        results = []
+        for index, item in enumerate(items):
+            todo_id = created.pop(item.label, None)
+            status = "created" if todo_id is not None else "duplicate"
+            results.append(BulkItemResult(index=index, id=todo_id, label=item.label, status=status))
+        return results
+
+    async def update_todos(self, user_id: int, items: list[UpdateTodoRequest]) -> list[BulkItemResult]:
+        # First occurrence of an id or a label wins, the rest are reported as duplicates
+        winners = {}
+        seen_labels = set()
+        for index, item in enumerate(items):
+            if item.id not in winners and item.label not in seen_labels:
+                winners[item.id] = index
+                seen_labels.add(item.label)
+        batch = [(todo_id, items[index].label, items[index].completed) for todo_id, index in winners.items()]
+
+        todos = Todo.__table__
+        other = todos.alias("other")
+        new_values = (
+            sa.values(sa.column("id", sa.Integer), sa.column("label", sa.TEXT), sa.column("completed", sa.Boolean),
+                      name="new_values")
+            .data(batch)
+        )
+        # All NULL completed values would make Postgres type the VALUES column as text
+        completed = sa.cast(new_values.c.completed, sa.Boolean)
+        # Rows whose new label is taken by another todo are skipped instead of failing the statement
+        label_taken = (
+            sa.exists()
+            .where(and_(other.c.user_id == user_id, other.c.label == new_values.c.label,
+                        other.c.id != new_values.c.id))
+        )
+        query = (
+            sa.update(todos)
+            .values(
+                label=new_values.c.label,
+                updated_at=sa.func.now(),
+                # A null completed leaves the completion state alone
+                completed=sa.func.coalesce(completed, todos.c.completed),
+                completed_at=sa.case(
+                    (completed.is_(None), todos.c.completed_at),
+                    (completed, sa.func.coalesce(todos.c.completed_at, sa.func.now())),
+                    else_=None,
+                ),
+            )
+            .where(and_(todos.c.id == new_values.c.id, todos.c.user_id == user_id, ~label_taken))
+            .returning(todos.c.id)
+        )
+
+        try:
+            result = await self.session.execute(query)
+            updated = set(result.scalars().all())
+
+            skipped = set(winners) - updated
+            existing = set()
+            if skipped:
+                existing_query = select(Todo.id).where(and_(Todo.user_id == user_id, Todo.id.in_(skipped)))
+                existing = set((await self.session.execute(existing_query)).scalars().all())
 
-    async def update_todo(self, user_id: int, new_todo: UpdateTodoRequest) -> None:
+            await self.session.commit()
+        except (exc.IntegrityError, asyncpg.exceptions.UniqueViolationError):
+            raise TodoDuplicationException("Todo labels already exist")
+        await self.cache.invalidate(user_id)
+
+        results = []
+        for index, item in enumerate(items):
+            if winners.get(item.id) != index or (item.id not in updated and item.id in existing):
+                status = "duplicate"
+            elif item.id in updated:
+                status = "updated"
+            else:
+                status = "not_found"
+            results.append(BulkItemResult(index=index, id=item.id, label=item.label, status=status))
+        return results
+
+    async def delete_todos(self, user_id: int, todo_ids: list[int]) -> list[BulkItemResult]:
+        ids = sa.bindparam("ids", list(set(todo_ids)), type_=postgresql.ARRAY(sa.Integer))
         query = (
-            update(Todo)
-            .values(label=new_todo.label)
-            .where(and_(Todo.id == new_todo.id, User.user_id == user_id))
+            delete(Todo)
+            .where(and_(Todo.user_id == user_id, Todo.id == sa.any_(ids)))
+            .returning(Todo.id)
+            .execution_options(synchronize_session=False)
         )
 
-        await self.session.execute(query)
-        await self.session.commit()
\ No newline at end of file
+        result = await self.session.execute(query)
+        deleted = set(result.scalars().all())
+        await self.session.commit()
+        await self.cache.invalidate(user_id)
+
+        results = []
+        seen = set()
+        for index, todo_id in enumerate(todo_ids):
+            if todo_id in seen:
+                status = "duplicate"
+            else:
+                status = "deleted" if todo_id in deleted else "not_found"
+            seen.add(todo_id)
+            results.append(BulkItemResult(index=index, id=todo_id, status=status))
+        return results
+
+    async def import_todos(self, user_id: int, labels, batch_size: int) -> tuple[int, int]:
+        # Running the DDL through the session starts the transaction the raw COPY joins
+        await self.session.execute(text(
+            "CREATE TEMP TABLE todo_import (label TEXT NOT NULL) ON COMMIT DROP"
+        ))
+        connection = await self.session.connection()
+        raw_connection = (await connection.get_raw_connection()).driver_connection
+
+        # Untyped, a parameter in a SELECT DISTINCT list would be resolved as text
+        merge = text(
+            "INSERT INTO todos (label, user_id, created_at, updated_at) "
+            "SELECT DISTINCT label, CAST(:user_id AS integer), now(), now() FROM todo_import "
+            "ON CONFLICT ON CONSTRAINT unique_todos_user_id_label DO NOTHING"
+        )
+
+        total = inserted = 0
+        async for batch in batched(labels, batch_size):
+            await raw_connection.copy_records_to_table(
+                "todo_import", records=[(label,) for label in batch], columns=["label"]
+            )
+            result = await self.session.execute(merge, {"user_id": user_id})
+            await self.session.execute(text("TRUNCATE todo_import"))
+
+            total += len(batch)
+            inserted += result.rowcount
+
+        await self.session.commit()
+        await self.cache.invalidate(user_id)
+        if inserted:
+            await self._warm_cache(user_id)
+        return inserted, total - inserted
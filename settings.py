@@ -0,0 +1,21 @@
+from dataclasses import dataclass
+
+from decouple import config
+
+
+@dataclass(frozen=True, slots=True)
+class Settings:
+    # Runs a job worker inside every app worker, for deployments without a separate `python -m jobs`
+    jobs_in_process: bool = False
+    # Seconds a client keeps reading from the primary after a successful write
+    read_your_writes_window: int = 5
+    # Opens the pooled connections and prepares the hot queries on them before /ready says so
+    prewarm: bool = True
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        return cls(
+            jobs_in_process=config("JOBS_IN_PROCESS", default=False, cast=bool),
+            read_your_writes_window=config("DB_READ_YOUR_WRITES_WINDOW", default=5, cast=int),
+            prewarm=config("DB_PREWARM", default=True, cast=bool),
+        )
@@ -0,0 +1,26 @@
+import pytest
+
+import server_config
+from application import create_app
+from settings import Settings
+
+
+def test_per_process_idempotency_store_is_refused_with_several_workers(monkeypatch):
+    monkeypatch.setattr(server_config, "worker_count", lambda: 4)
+    monkeypatch.setattr(server_config, "IDEMPOTENCY_BACKEND", "memory")
+
+    with pytest.raises(RuntimeError, match="IDEMPOTENCY_BACKEND"):
+        create_app(Settings())
+
+
+def test_several_workers_start_with_the_defaults(monkeypatch):
+    monkeypatch.setattr(server_config, "worker_count", lambda: 4)
+
+    assert create_app(Settings()) is not None
+
+
+def test_single_worker_starts_with_a_per_process_store(monkeypatch):
+    monkeypatch.setattr(server_config, "worker_count", lambda: 1)
+    monkeypatch.setattr(server_config, "IDEMPOTENCY_BACKEND", "memory")
+
+    assert create_app(Settings()) is not None
@@ -0,0 +1,125 @@
+import asyncio
+import time
+
+import pytest
+
+from auth import principals
+from auth.jwt_token import create_access_token
+from auth.user import decode_token
+from custom_exceptions import UserNotFoundException
+from requests import ChangePasswordRequest
+from services import user_service
+from services.user_service import UserService
+
+
+class FakeResult:
+    def __init__(self, value):
+        self.value = value
+
+    def scalar_one_or_none(self):
+        return self.value
+
+
+class FakeSession:
+    def __init__(self, *values):
+        self.values = list(values)
+        self.commits = 0
+
+    async def execute(self, query):
+        return FakeResult(self.values.pop(0) if self.values else None)
+
+    async def commit(self):
+        self.commits += 1
+
+
+class FakeHasher:
+    async def hash(self, password: str) -> bytes:
+        return f"hashed:{password}".encode("utf-8")
+
+    async def verify(self, plain_password: str, hashed_password: bytes) -> bool:
+        return hashed_password == f"hashed:{plain_password}".encode("utf-8")
+
+
+@pytest.fixture(autouse=True)
+def fresh_caches(monkeypatch):
+    monkeypatch.setattr(user_service, "password_hasher", FakeHasher())
+    for ttl_cache in (principals.token_cache, principals.principal_cache, principals.revocations):
+        ttl_cache.clear()
+
+
+def token_for(user_id: int, issued_at: float) -> dict:
+    return {"sub": f"user{user_id}", "uid": user_id, "iat": issued_at}
+
+
+def test_tokens_issued_before_invalidation_are_rejected():
+    token = create_access_token({"sub": "alice", "uid": 1})
+    assert decode_token(token) is not None
+
+    principals.invalidate_user(1)
+    assert decode_token(token) is None
+    assert not principals.is_revoked(token_for(1, time.time() + 1))
+    assert not principals.is_revoked(token_for(2, 0))
+
+
+def test_change_password_revokes_tokens_and_cached_principal():
+    principals.principal_cache.set(1, "cached row")
+    session = FakeSession("hashed:old")
+
+    asyncio.run(UserService(session).change_password(1, ChangePasswordRequest(
+        current_password="old", new_password="new")))
+
+    assert session.commits == 1
+    assert principals.principal_cache.get(1) is None
+    assert principals.is_revoked(token_for(1, time.time() - 1))
+
+
+def test_change_password_with_a_wrong_password_keeps_tokens():
+    principals.principal_cache.set(1, "cached row")
+    session = FakeSession("hashed:old")
+
+    with pytest.raises(UserNotFoundException):
+        asyncio.run(UserService(session).change_password(1, ChangePasswordRequest(
+            current_password="guess", new_password="new")))
+
+    assert session.commits == 0
+    assert principals.principal_cache.get(1) == "cached row"
+    assert not principals.is_revoked(token_for(1, time.time() - 1))
+
+
+def test_delete_user_revokes_tokens_and_cached_principal():
+    principals.principal_cache.set(1, "cached row")
+
+    asyncio.run(UserService(FakeSession(1)).delete_user(1))
+
+    assert principals.principal_cache.get(1) is None
+    assert principals.is_revoked(token_for(1, time.time() - 1))
+
+
+def test_deleting_a_missing_user_raises():
+    with pytest.raises(UserNotFoundException):
+        asyncio.run(UserService(FakeSession(None)).delete_user(1))
+
+
+def test_rehash_only_forgets_the_cached_principal():
+    principals.principal_cache.set(1, "cached row")
+
+    asyncio.run(UserService(FakeSession())._rehash_password(1, "secret"))
+
+    assert principals.principal_cache.get(1) is None
+    assert not principals.is_revoked(token_for(1, time.time() - 1))
+
+
+def test_revocations_are_kept_until_the_tokens_they_revoke_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(principals.time, "time", lambda: now[0])
+    revocations = principals.Revocations(ttl=60)
+
+    # More revocations than any cache holds, none of them is dropped early
+    for user_id in range(principals.AUTH_CACHE_SIZE + 1):
+        revocations.set(user_id, now[0])
+    assert revocations.get(0) == 1000.0
+
+    now[0] += 60
+    revocations.set(-1, now[0])
+    assert revocations.get(0) is None
+    assert len(revocations) == 1
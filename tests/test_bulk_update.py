@@ -0,0 +1,53 @@
+import asyncio
+import datetime
+import uuid
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.todo import Todo
+from models.user import User
+from requests import UpdateTodoRequest
+from services.user_todo_service import UserTodoService
+
+
+async def bulk_update(engine, completed: list[bool | None]) -> list[tuple]:
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        user = User(username=f"bulk_{uuid.uuid4().hex[:8]}", first_name="Bulk", last_name="Update",
+                    email=f"{uuid.uuid4().hex[:8]}@example.com", birthdate=datetime.date(2000, 1, 1), password="x")
+        session.add(user)
+        await session.flush()
+        todos = [Todo(label=f"todo {index}", user_id=user.user_id) for index in range(len(completed))]
+        session.add_all(todos)
+        await session.commit()
+
+    try:
+        async with AsyncSession(engine) as session:
+            items = [UpdateTodoRequest(id=todo.id, label=f"renamed {todo.id}", completed=value)
+                     for todo, value in zip(todos, completed)]
+            results = await UserTodoService(session).update_todos(user.user_id, items)
+            assert [result.status for result in results] == ["updated"] * len(completed)
+
+            query = (
+                select(Todo.label, Todo.completed, Todo.completed_at.is_not(None))
+                .where(Todo.user_id == user.user_id)
+                .order_by(Todo.id)
+            )
+            return (await session.execute(query)).all()
+    finally:
+        async with AsyncSession(engine) as session:
+            await session.execute(delete(User).where(User.user_id == user.user_id))
+            await session.commit()
+
+
+def test_bulk_update_without_completed_values(db_engine):
+    # Only NULLs in the VALUES list used to type the column as text and fail the statement
+    rows = asyncio.run(bulk_update(db_engine, [None, None]))
+    assert [(completed, has_completed_at) for _, completed, has_completed_at in rows] == [(False, False)] * 2
+    assert all(label.startswith("renamed") for label, _, _ in rows)
+
+
+def test_bulk_update_with_mixed_completed_values(db_engine):
+    rows = asyncio.run(bulk_update(db_engine, [True, None, False]))
+    assert [(completed, has_completed_at) for _, completed, has_completed_at in rows] == [
+        (True, True), (False, False), (False, False)]
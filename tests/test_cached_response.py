@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+from starlette.requests import Request
+
+from cache.backends import LRUBackend
+from cache.todo_cache import TodoCache
+from controllers import user_todo_controller
+from controllers.user_todo_controller import cached_response
+
+
+class FakeService:
+    def __init__(self, version: int):
+        self.version = version
+        self.version_reads = 0
+
+    async def get_todos_version(self, user_id: int) -> int:
+        self.version_reads += 1
+        return self.version
+
+
+class Loader:
+    def __init__(self):
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        return f"page {self.calls}".encode(), {}
+
+
+def request(etag: str | None = None, cookie: str | None = None) -> Request:
+    headers = []
+    if etag is not None:
+        headers.append((b"if-none-match", etag.encode()))
+    if cookie is not None:
+        headers.append((b"cookie", cookie.encode()))
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers})
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = TodoCache(LRUBackend(1024 * 1024), ttl=60, version_ttl=60)
+    monkeypatch.setattr(user_todo_controller, "todo_cache", cache)
+    return cache
+
+
+def get(service, load, **kwargs):
+    return asyncio.run(cached_response(request(**kwargs), service, 1, "list:0:10:None", load))
+
+
+def test_hits_and_304s_skip_the_database_once_the_version_is_cached(cache):
+    service, load = FakeService(version=3), Loader()
+
+    first = get(service, load)
+    assert (service.version_reads, load.calls) == (1, 1)
+
+    assert get(service, load).body == first.body
+    assert get(service, load, etag=first.headers["etag"]).status_code == 304
+    assert (service.version_reads, load.calls) == (1, 1)
+
+
+def test_a_new_version_is_read_once_the_cached_one_is_dropped(cache):
+    service, load = FakeService(version=3), Loader()
+    first = get(service, load)
+
+    service.version = 4
+    asyncio.run(cache.invalidate(1))
+
+    second = get(service, load, etag=first.headers["etag"])
+    assert second.status_code == 200 and second.body == b"page 2"
+    assert second.headers["etag"] != first.headers["etag"]
+
+
+def test_a_lagging_session_caches_under_the_version_it_read(cache):
+    service, load = FakeService(version=3), Loader()
+    # A write on this worker left version 4 cached, the replica still answers 3
+    asyncio.run(cache.set_version(1, 4))
+
+    response = get(service, load)
+    assert response.body == b"page 1"
+    assert asyncio.run(cache.version(1)) == 4
+
+    # Once the replica catches up the page is loaded again instead of served from version 3
+    service.version = 4
+    assert get(service, load).body == b"page 2"
+
+
+def test_read_your_writes_clients_skip_the_cached_version(cache):
+    service, load = FakeService(version=4), Loader()
+    asyncio.run(cache.set_version(1, 3))
+
+    get(service, load, cookie="read_primary=1")
+    assert service.version_reads == 1
+    assert asyncio.run(cache.version(1)) == 4
@@ -0,0 +1,103 @@
+import asyncio
+
+import orjson
+
+import change_feed
+from change_feed import RESYNC, ChangeFeed
+
+
+class FakeConnection:
+    def __init__(self):
+        self.listeners = {}
+        self.on_terminate = None
+        self.closed = False
+
+    def add_termination_listener(self, callback):
+        self.on_terminate = callback
+
+    async def add_listener(self, channel, callback):
+        self.listeners[channel] = callback
+
+    def notify(self, payload: dict):
+        self.listeners[change_feed.CHANGE_FEED_CHANNEL](self, 1, change_feed.CHANGE_FEED_CHANNEL,
+                                                         orjson.dumps(payload).decode())
+
+    def is_closed(self):
+        return self.closed
+
+    async def close(self):
+        self.closed = True
+
+
+async def next_frame(queue: asyncio.Queue) -> bytes:
+    return await asyncio.wait_for(queue.get(), 1)
+
+
+def fake_connect(monkeypatch, *results):
+    results = list(results)
+    connected = asyncio.Queue()
+
+    async def connect(**kwargs):
+        result = results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        await connected.put(result)
+        return result
+
+    monkeypatch.setattr(change_feed.asyncpg, "connect", connect)
+    monkeypatch.setattr(change_feed, "CHANGE_FEED_RECONNECT_DELAY", 0.001)
+    return connected
+
+
+def test_first_listen_sends_a_resync_and_delivers_events(monkeypatch):
+    connection = FakeConnection()
+    connected = fake_connect(monkeypatch, connection)
+    feed = ChangeFeed(dict, queue_size=8)
+
+    async def run():
+        async with feed.subscribe(1) as queue:
+            await connected.get()
+            assert await next_frame(queue) == RESYNC
+
+            connection.notify({"type": "created", "user_id": 1, "id": 5})
+            connection.notify({"type": "created", "user_id": 2, "id": 6})
+            frame = await next_frame(queue)
+            assert frame.startswith(b"event: created\n")
+            assert b'"id":5' in frame
+            assert queue.empty()
+        await feed.close()
+
+    asyncio.run(run())
+
+
+def test_unexpected_errors_are_retried(monkeypatch):
+    # Not an OSError or a PostgresError, e.g. a timeout or a bug in a callback
+    connected = fake_connect(monkeypatch, RuntimeError("boom"), asyncio.TimeoutError(), FakeConnection())
+    feed = ChangeFeed(dict, queue_size=8)
+
+    async def run():
+        async with feed.subscribe(1) as queue:
+            await asyncio.wait_for(connected.get(), 1)
+            assert await next_frame(queue) == RESYNC
+            assert not feed._listener.done()
+        await feed.close()
+
+    asyncio.run(run())
+
+
+def test_reconnect_after_a_lost_connection_resyncs(monkeypatch):
+    first, second = FakeConnection(), FakeConnection()
+    connected = fake_connect(monkeypatch, first, second)
+    feed = ChangeFeed(dict, queue_size=8)
+
+    async def run():
+        async with feed.subscribe(1) as queue:
+            await connected.get()
+            assert await next_frame(queue) == RESYNC
+
+            first.on_terminate(first)
+            assert await asyncio.wait_for(connected.get(), 1) is second
+            assert await next_frame(queue) == RESYNC
+        await feed.close()
+
+    asyncio.run(run())
@@ -0,0 +1,32 @@
+from etags import etag_matches, make_etag
+
+ETAG = make_etag(3, "list:0:10:None")
+
+
+def test_etag_is_weak_and_stable():
+    assert ETAG.startswith('W/"') and ETAG.endswith('"')
+    assert make_etag(3, "list:0:10:None") == ETAG
+
+
+def test_etag_changes_with_the_version_and_the_page():
+    assert make_etag(4, "list:0:10:None") != ETAG
+    assert make_etag(3, "list:10:10:None") != ETAG
+
+
+def test_matching_ignores_weak_prefixes():
+    assert etag_matches(ETAG, ETAG)
+    assert etag_matches(ETAG.removeprefix("W/"), ETAG)
+
+
+def test_any_candidate_in_the_list_matches():
+    assert etag_matches(f'W/"3", {ETAG}', ETAG)
+    assert not etag_matches('W/"3", W/"4"', ETAG)
+
+
+def test_star_matches_anything():
+    assert etag_matches("*", ETAG)
+
+
+def test_missing_header_never_matches():
+    assert not etag_matches(None, ETAG)
+    assert not etag_matches("", ETAG)
@@ -0,0 +1,261 @@
+import asyncio
+import uuid
+
+import httpx
+import orjson
+
+import idempotency
+from auth.jwt_token import create_access_token
+from cache.backends import LRUBackend
+from idempotency import IdempotencyMiddleware, PostgresStore
+
+TODOS_PATH = "/api/v1/users/todos/"
+
+
+class CountingApp:
+    def __init__(self, status: int = 201, delay: float = 0):
+        self.status = status
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self, scope, receive, send):
+        while (await receive()).get("more_body"):
+            pass
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        body = orjson.dumps({"call": self.calls})
+        await send({"type": "http.response.start", "status": self.status,
+                    "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": body})
+
+
+def auth_headers(user_id: int, key: str) -> dict[str, str]:
+    token = create_access_token({"sub": f"user{user_id}", "uid": user_id})
+    return {"Authorization": f"Bearer {token}", "Idempotency-Key": key}
+
+
+def client_for(app) -> httpx.AsyncClient:
+    middleware = IdempotencyMiddleware(app, store=LRUBackend(1024 * 1024))
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=middleware), base_url="http://test")
+
+
+def test_retry_is_replayed_without_running_again():
+    app = CountingApp()
+
+    async def run():
+        async with client_for(app) as client:
+            first = await client.post(TODOS_PATH, json={"label": "a"}, headers=auth_headers(1, "k1"))
+            retry = await client.post(TODOS_PATH, json={"label": "a"}, headers=auth_headers(1, "k1"))
+            return first, retry
+
+    first, retry = asyncio.run(run())
+    assert app.calls == 1
+    assert (retry.status_code, retry.content) == (first.status_code, first.content)
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert "idempotent-replayed" not in first.headers
+
+
+def test_concurrent_duplicates_wait_for_the_first_attempt():
+    app = CountingApp(delay=0.05)
+
+    async def run():
+        async with client_for(app) as client:
+            return await asyncio.gather(*(
+                client.post(TODOS_PATH, json={"label": "a"}, headers=auth_headers(1, "k1")) for _ in range(5)
+            ))
+
+    responses = asyncio.run(run())
+    assert app.calls == 1
+    assert {response.content for response in responses} == {orjson.dumps({"call": 1})}
+
+
+def test_a_retry_reaching_another_worker_meanwhile_is_told_to_wait():
+    app = CountingApp(delay=0.05)
+    store = LRUBackend(1024 * 1024)
+    workers = [IdempotencyMiddleware(app, store=store) for _ in range(2)]
+
+    async def run():
+        clients = [httpx.AsyncClient(transport=httpx.ASGITransport(app=worker), base_url="http://test")
+                   for worker in workers]
+        first = asyncio.create_task(clients[0].post(TODOS_PATH, json={"label": "a"}, headers=auth_headers(1, "k1")))
+        await asyncio.sleep(0.01)
+        during = await clients[1].post(TODOS_PATH, json={"label": "a"}, headers=auth_headers(1, "k1"))
+        await first
+        after = await clients[1].post(TODOS_PATH, json={"label": "a"}, headers=auth_headers(1, "k1"))
+        return during, after
+
+    during, after = asyncio.run(run())
+    assert app.calls == 1
+    assert during.status_code == 409
+    assert during.json()["detail"]["code"] == "IDEMPOTENCY_KEY_IN_USE"
+    assert after.headers["idempotent-replayed"] == "true"
+    assert after.content == orjson.dumps({"call": 1})
+
+
+def test_reusing_a_key_for_a_different_request_is_rejected():
+    app = CountingApp()
+
+    async def run():
+        async with client_for(app) as client:
+            await client.post(TODOS_PATH, json={"label": "a"}, headers=auth_headers(1, "k1"))
+            return await client.post(TODOS_PATH, json={"label": "b"}, headers=auth_headers(1, "k1"))
+
+    response = asyncio.run(run())
+    assert response.status_code == 422
+    assert response.json()["detail"]["code"] == "IDEMPOTENCY_KEY_REUSED"
+    assert app.calls == 1
+
+
+def test_keys_are_scoped_per_user():
+    app = CountingApp()
+
+    async def run():
+        async with client_for(app) as client:
+            await client.post(TODOS_PATH, json={"label": "a"}, headers=auth_headers(1, "k1"))
+            return await client.post(TODOS_PATH, json={"label": "a"}, headers=auth_headers(2, "k1"))
+
+    response = asyncio.run(run())
+    assert app.calls == 2
+    assert "idempotent-replayed" not in response.headers
+
+
+def test_server_errors_are_not_stored():
+    app = CountingApp(status=500)
+
+    async def run():
+        async with client_for(app) as client:
+            for _ in range(2):
+                await client.post(TODOS_PATH, json={"label": "a"}, headers=auth_headers(1, "k1"))
+
+    asyncio.run(run())
+    assert app.calls == 2
+
+
+def test_requests_without_a_key_or_token_pass_through():
+    app = CountingApp()
+
+    async def run():
+        async with client_for(app) as client:
+            await client.post(TODOS_PATH, json={"label": "a"})
+            await client.post(TODOS_PATH, json={"label": "a"}, headers={"Idempotency-Key": "k1"})
+            await client.post(TODOS_PATH, json={"label": "a"})
+
+    asyncio.run(run())
+    assert app.calls == 3
+
+
+def test_malformed_content_length_is_passed_through():
+    app = CountingApp()
+    middleware = IdempotencyMiddleware(app, store=LRUBackend(1024 * 1024))
+    headers = [(name.lower().encode(), value.encode()) for name, value in auth_headers(1, "k1").items()]
+    scope = {"type": "http", "method": "POST", "path": TODOS_PATH, "raw_path": TODOS_PATH.encode(),
+             "query_string": b"", "headers": headers + [(b"content-length", b"12abc")]}
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"{}", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    async def run():
+        for _ in range(2):
+            await middleware(scope, receive, send)
+
+    asyncio.run(run())
+    assert app.calls == 2
+    assert sent[0]["status"] == 201
+
+
+def test_bodies_without_a_length_are_held_to_the_limit_while_read(monkeypatch):
+    monkeypatch.setattr(idempotency, "IDEMPOTENCY_MAX_BODY", 8)
+    received = []
+
+    async def app(scope, receive, send):
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        received.append(body)
+        await send({"type": "http.response.start", "status": 201, "headers": []})
+        await send({"type": "http.response.body", "body": b"created"})
+
+    middleware = IdempotencyMiddleware(app, store=LRUBackend(1024 * 1024))
+    headers = [(name.lower().encode(), value.encode()) for name, value in auth_headers(1, "k1").items()]
+    scope = {"type": "http", "method": "POST", "path": TODOS_PATH, "raw_path": TODOS_PATH.encode(),
+             "query_string": b"", "headers": headers + [(b"transfer-encoding", b"chunked")]}
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    async def post(chunks: list[bytes]):
+        messages = [{"type": "http.request", "body": chunk, "more_body": index < len(chunks) - 1}
+                    for index, chunk in enumerate(chunks)]
+
+        async def receive():
+            return messages.pop(0)
+
+        await middleware(scope, receive, send)
+
+    async def run():
+        for _ in range(2):
+            await post([b"12345", b"67890", b"abc"])
+        for _ in range(2):
+            await post([b"1234", b"5678"])
+
+    asyncio.run(run())
+    # The big body reached the route whole both times, the small one ran once and was replayed
+    assert received == [b"1234567890abc", b"1234567890abc", b"12345678"]
+    assert [message["headers"] for message in sent if message["type"] == "http.response.start"][-1][-1] == \
+        (b"idempotent-replayed", b"true")
+
+
+def test_store_errors_fail_open():
+    class BrokenStore:
+        async def get(self, key):
+            raise ConnectionError("store is down")
+
+        async def set(self, key, value, ttl=None):
+            raise ConnectionError("store is down")
+
+        async def add(self, key, value, ttl=None):
+            raise ConnectionError("store is down")
+
+        async def delete(self, key):
+            raise ConnectionError("store is down")
+
+    app = CountingApp()
+    middleware = IdempotencyMiddleware(app, store=BrokenStore())
+
+    async def run():
+        transport = httpx.ASGITransport(app=middleware)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return [await client.post(TODOS_PATH, json={"label": "a"}, headers=auth_headers(1, "k1"))
+                    for _ in range(2)]
+
+    responses = asyncio.run(run())
+    assert [response.status_code for response in responses] == [201, 201]
+    assert app.calls == 2
+
+
+async def store_calls(engine) -> list:
+    store = PostgresStore()
+    store._engine = engine.execution_options(isolation_level="AUTOCOMMIT")
+    key = f"idempotency:test:{uuid.uuid4().hex}"
+    try:
+        return [
+            await store.add(key, b"claim", 60),
+            await store.add(key, b"again", 60),
+            await store.get(key),
+            await store.set(key, b"response", 60),
+            await store.get(key),
+        ]
+    finally:
+        await store.delete(key)
+
+
+def test_postgres_store(db_engine):
+    assert asyncio.run(store_calls(db_engine)) == [True, False, b"claim", None, b"response"]
@@ -0,0 +1,26 @@
+import os
+import subprocess
+import sys
+
+from benchmarks.import_time import ROOT, best_import, slowest_imports
+
+# `import main` builds the whole app, so this covers the module imports plus create_app
+IMPORT_TIME_BUDGET_MS = float(os.environ.get("IMPORT_TIME_BUDGET_MS", 1500))
+# Modules the app factory only imports inside create_app
+APP_MODULES = ("sqlalchemy", "asyncpg", "services.user_todo_service", "controllers.user_todo_controller")
+
+
+def test_import_main_is_within_budget():
+    best_ms, output = best_import("main", runs=3)
+
+    slowest = "\n".join(f"{cumulative_ms:9.1f}ms  {name}" for name, _, cumulative_ms in slowest_imports(output, 10))
+    assert best_ms <= IMPORT_TIME_BUDGET_MS, (
+        f"import main took {best_ms:.0f}ms, the budget is {IMPORT_TIME_BUDGET_MS:.0f}ms\n{slowest}"
+    )
+
+
+def test_importing_the_factory_does_not_load_the_app():
+    code = f"import sys, application; print(','.join(m for m in {APP_MODULES!r} if m in sys.modules))"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, cwd=ROOT)
+
+    assert result.stdout.strip() == ""
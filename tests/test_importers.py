@@ -0,0 +1,84 @@
+import asyncio
+import datetime
+import uuid
+
+import pytest
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from custom_exceptions import InvalidData
+from importers import iter_lines, parse_csv_labels, parse_ndjson_labels
+from models.todo import Todo
+from models.user import User
+from services.user_todo_service import UserTodoService
+
+
+async def chunks(*parts: bytes):
+    for part in parts:
+        yield part
+
+
+def parse(parse_labels, *parts: bytes, max_length: int = 100) -> list[str]:
+    async def run():
+        lines = iter_lines(chunks(*parts), max_length)
+        if parse_labels is parse_csv_labels:
+            return [label async for label in parse_labels(lines, max_length)]
+        return [label async for label in parse_labels(lines)]
+    return asyncio.run(run())
+
+
+def test_lines_are_split_across_chunks():
+    assert parse(parse_ndjson_labels, b'{"label": "a"}\r\n{"la', b'bel": "\xc3', b'\xa9"}') == ["a", "é"]
+
+
+def test_a_line_longer_than_the_limit_is_rejected_before_it_ends():
+    with pytest.raises(InvalidData, match=r"Line \[2\]"):
+        parse(parse_ndjson_labels, b'{"label": "a"}\n', b"x" * 60, b"x" * 60)
+
+
+def test_invalid_utf8_is_invalid_data():
+    with pytest.raises(InvalidData, match="UTF-8"):
+        parse(parse_ndjson_labels, b'{"label": "\xff"}\n')
+
+
+def test_csv_quoted_fields_may_span_lines():
+    body = b'label\nplain,1\n"two\nlines",2\n"a ""quoted"" word"\n\nlast'
+    assert parse(parse_csv_labels, body) == ["plain", "two\nlines", 'a "quoted" word', "last"]
+
+
+def test_csv_unterminated_quote_is_rejected():
+    with pytest.raises(InvalidData, match=r"Line \[2\] has an unterminated quoted field"):
+        parse(parse_csv_labels, b'a\n"open\nnever closed\n')
+
+    # A record spanning lines is held to the same limit as a single line
+    with pytest.raises(InvalidData, match=r"Line \[1\]"):
+        parse(parse_csv_labels, b'"open\n' + b"x\n" * 60)
+
+
+async def import_labels(engine, labels: list[str]) -> tuple[tuple[int, int], list[str]]:
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        user = User(username=f"import_{uuid.uuid4().hex[:8]}", first_name="Todo", last_name="Import",
+                    email=f"{uuid.uuid4().hex[:8]}@example.com", birthdate=datetime.date(2000, 1, 1), password="x")
+        session.add(user)
+        await session.commit()
+
+    async def items():
+        for label in labels:
+            yield label
+
+    try:
+        async with AsyncSession(engine) as session:
+            counts = await UserTodoService(session).import_todos(user.user_id, items(), batch_size=2)
+            query = select(Todo.label).where(Todo.user_id == user.user_id).order_by(Todo.label)
+            return counts, list((await session.execute(query)).scalars())
+    finally:
+        async with AsyncSession(engine) as session:
+            await session.execute(delete(Todo).where(Todo.user_id == user.user_id))
+            await session.execute(delete(User).where(User.user_id == user.user_id))
+            await session.commit()
+
+
+def test_import_skips_duplicates_within_and_across_batches(db_engine):
+    counts, labels = asyncio.run(import_labels(db_engine, ["a", "a", "b", "c", "a"]))
+    assert counts == (3, 2)
+    assert labels == ["a", "b", "c"]
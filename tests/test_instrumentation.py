@@ -0,0 +1,60 @@
+import asyncio
+import threading
+
+import httpx
+import pytest
+
+import instrumentation
+from instrumentation import InstrumentationMiddleware
+
+EVENTS_PATH = "/api/v1/users/todos/events"
+
+
+async def ok_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+@pytest.fixture
+def profile_everything(monkeypatch, tmp_path):
+    monkeypatch.setattr(instrumentation, "PROFILE_SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(instrumentation, "PROFILE_SLOW_MS", 0)
+    monkeypatch.setattr(instrumentation, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(instrumentation.request_duration, "values", {})
+    return tmp_path
+
+
+def get(path: str) -> httpx.Response:
+    async def run():
+        transport = httpx.ASGITransport(app=InstrumentationMiddleware(ok_app))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get(path)
+
+    return asyncio.run(run())
+
+
+def test_streaming_routes_are_not_instrumented(profile_everything):
+    response = get(EVENTS_PATH)
+
+    assert "server-timing" not in response.headers
+    assert instrumentation.request_duration.values == {}
+    assert not instrumentation._profiling
+    assert list(profile_everything.iterdir()) == []
+
+
+def test_profiles_are_written_off_the_event_loop(profile_everything, monkeypatch):
+    threads = []
+    dump_profile = instrumentation._dump_profile
+
+    def record_thread(profile, path):
+        threads.append(threading.current_thread())
+        dump_profile(profile, path)
+
+    monkeypatch.setattr(instrumentation, "_dump_profile", record_thread)
+    response = get("/api/v1/users/todos/")
+
+    assert "server-timing" in response.headers
+    assert instrumentation.request_duration.values
+    # asyncio.run waits for the default executor, so the profile is on disk by now
+    assert threads and threads[0] is not threading.main_thread()
+    assert [path.suffix for path in profile_everything.iterdir()] == [".prof"]
@@ -0,0 +1,53 @@
+import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from custom_exceptions import InvalidCursorException
+from pagination import (decode_search_cursor, decode_todo_cursor, encode_cursor, encode_todo_cursor,
+                        next_search_cursor, next_todo_cursor)
+
+CREATED_AT = datetime.datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=datetime.timezone.utc)
+
+
+def test_todo_cursor_round_trip():
+    cursor = encode_todo_cursor(CREATED_AT, 42)
+    assert decode_todo_cursor(cursor) == (CREATED_AT, 42)
+
+
+def test_cursor_is_url_safe_without_padding():
+    cursor = encode_todo_cursor(CREATED_AT, 42)
+    assert "=" not in cursor and "+" not in cursor and "/" not in cursor
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64!",
+    encode_cursor("2024-05-01T12:30:15+00:00"),
+    encode_cursor("yesterday", 1),
+    encode_cursor(CREATED_AT.isoformat(), "one"),
+])
+def test_invalid_todo_cursor(cursor):
+    with pytest.raises(InvalidCursorException):
+        decode_todo_cursor(cursor)
+
+
+def test_non_list_cursor_is_invalid():
+    with pytest.raises(InvalidCursorException):
+        decode_todo_cursor("eyJhIjoxfQ")  # {"a":1}
+
+
+def test_next_todo_cursor_points_at_the_last_row_of_a_full_page():
+    todos = [SimpleNamespace(id=index, created_at=CREATED_AT) for index in (1, 2)]
+    assert decode_todo_cursor(next_todo_cursor(todos, 2)) == (CREATED_AT, 2)
+
+
+def test_short_page_has_no_next_cursor():
+    todos = [SimpleNamespace(id=1, created_at=CREATED_AT)]
+    assert next_todo_cursor(todos, 2) is None
+    assert next_todo_cursor([], 2) is None
+
+
+def test_search_cursor_round_trip():
+    hits = [SimpleNamespace(id=7, rank=0.5), SimpleNamespace(id=3, rank=0.25)]
+    assert decode_search_cursor(next_search_cursor(hits, 2)) == (0.25, 3)
+    assert next_search_cursor(hits, 3) is None
@@ -0,0 +1,52 @@
+import asyncio
+
+import orjson
+import pytest
+from sqlalchemy import text
+from sqlmodel import and_, select
+
+from models.todo import Todo
+from todo_statements import delete_todo_statement, label_starts_with, update_todo_statement
+
+# Sequential scans are disabled for the check, so a Seq Scan in a plan means no index can
+# serve the statement at all, regardless of how small the test tables are
+STATEMENTS = {
+    "update_todo": update_todo_statement(user_id=1, todo_id=1, label="plan check"),
+    "delete_todo": delete_todo_statement(user_id=1, todo_id=1),
+    "search_prefix": select(Todo.id).where(and_(Todo.user_id == 1, label_starts_with("50%_off"))),
+}
+INDEX_SCANS = {"Index Scan", "Index Only Scan", "Bitmap Index Scan", "Bitmap Heap Scan"}
+
+
+def plan_nodes(plan: dict):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+async def scans(engine, statement) -> list[dict]:
+    async with engine.connect() as conn:
+        # Compiled with the connected dialect, which knows whether literals need backslash escapes
+        sql = str(statement.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+        await conn.execute(text("SET enable_seqscan = off"))
+        value = (await conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"))).scalar_one()
+    plan = (orjson.loads(value) if isinstance(value, str) else value)[0]["Plan"]
+    return [node for node in plan_nodes(plan) if "Scan" in node["Node Type"]]
+
+
+@pytest.mark.parametrize("name", STATEMENTS)
+def test_user_scoped_statements_use_an_index_on_todos_only(db_engine, name):
+    nodes = asyncio.run(scans(db_engine, STATEMENTS[name]))
+
+    # todos_p* are the partitions once m0005 ran, users must never show up
+    relations = {node["Relation Name"] for node in nodes}
+    assert relations and all(relation == "todos" or relation.startswith("todos_p") for relation in relations)
+    assert all(node["Node Type"] in INDEX_SCANS for node in nodes), nodes
+
+
+def test_search_prefix_uses_the_trigram_index(db_engine):
+    nodes = asyncio.run(scans(db_engine, STATEMENTS["search_prefix"]))
+
+    # ~~* is ILIKE: it has to be an index condition on the (user_id, label gin_trgm_ops)
+    # index, not a filter applied to every row of the user's todos
+    assert any("~~*" in node.get("Index Cond", "") for node in nodes), nodes
@@ -0,0 +1,140 @@
+import asyncio
+
+import httpx
+import pytest
+
+import rate_limit
+from cache.backends import FakeRedis
+from rate_limit import (LOGIN_PATH, TOKEN_BUCKET_SCRIPT, InMemoryBucketStore, RateLimitMiddleware, RedisBucketStore,
+                        Rule, client_ip, login_username, take_token)
+
+
+async def ok_app(scope, receive, send):
+    while (await receive()).get("more_body"):
+        pass
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+async def post_logins(middleware, attempts: int, username: str = "alice",
+                      ip: str = "127.0.0.1") -> list[httpx.Response]:
+    transport = httpx.ASGITransport(app=middleware, client=(ip, 123))
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return [await client.post(LOGIN_PATH, json={"username": username, "password": "wrong"})
+                for _ in range(attempts)]
+
+
+def test_rule_parse():
+    rule = Rule.parse("login", "10/300")
+    assert (rule.capacity, rule.refill_rate) == (10, 10 / 300)
+    assert Rule.parse("login", "") is None
+
+
+def test_take_token_starts_full_and_refills():
+    tokens, wait = take_token(None, None, now=0, capacity=2, refill_rate=1)
+    assert (tokens, wait) == (1, 0)
+    tokens, wait = take_token(tokens, 0, now=0, capacity=2, refill_rate=1)
+    assert (tokens, wait) == (0, 0)
+
+    tokens, wait = take_token(tokens, 0, now=0.5, capacity=2, refill_rate=1)
+    assert wait == pytest.approx(0.5)
+    tokens, wait = take_token(0, 0, now=10, capacity=2, refill_rate=1)
+    assert (tokens, wait) == (1, 0)
+
+
+def test_memory_store_forgets_the_least_recently_used_bucket():
+    store = InMemoryBucketStore(max_keys=2)
+    rule = Rule("test", capacity=1, refill_rate=0.001)
+
+    async def run():
+        assert await store.take("a", rule) == 0
+        assert await store.take("a", rule) > 0
+        await store.take("b", rule)
+        await store.take("c", rule)
+        # "a" was evicted, so it starts with a full bucket again
+        assert await store.take("a", rule) == 0
+
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize("store", [InMemoryBucketStore(1000), RedisBucketStore(FakeRedis())])
+def test_login_attempts_per_username_and_ip_are_limited(store):
+    responses = asyncio.run(post_logins(RateLimitMiddleware(ok_app, store=store), 11))
+
+    assert [response.status_code for response in responses[:10]] == [200] * 10
+    assert responses[10].status_code == 429
+    assert int(responses[10].headers["retry-after"]) >= 1
+    assert responses[10].json()["detail"]["code"] == "TOO_MANY_REQUESTS"
+
+
+def test_login_limit_of_one_ip_does_not_lock_the_user_out_elsewhere():
+    middleware = RateLimitMiddleware(ok_app, store=InMemoryBucketStore(1000))
+
+    attacker = asyncio.run(post_logins(middleware, 11, ip="203.0.113.7"))
+    victim = asyncio.run(post_logins(middleware, 1, ip="198.51.100.1"))
+
+    assert attacker[10].status_code == 429
+    assert victim[0].status_code == 200
+
+
+def test_login_attempts_per_username_from_any_ip_are_limited_too(monkeypatch):
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_LOGIN_PER_USERNAME", "3/300")
+    middleware = RateLimitMiddleware(ok_app, store=InMemoryBucketStore(1000))
+
+    responses = [asyncio.run(post_logins(middleware, 1, ip=f"203.0.113.{index}"))[0] for index in range(4)]
+    other_user = asyncio.run(post_logins(middleware, 1, username="bob", ip="203.0.113.9"))
+
+    assert [response.status_code for response in responses] == [200, 200, 200, 429]
+    assert other_user[0].status_code == 200
+
+
+def test_health_and_metrics_paths_are_not_limited(monkeypatch):
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_PER_IP", "2/60")
+    middleware = RateLimitMiddleware(ok_app, store=InMemoryBucketStore(1000))
+
+    async def run():
+        transport = httpx.ASGITransport(app=middleware)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            probes = [await client.get(path) for path in ("/", "/ready", "/metrics") * 3]
+            requests = [await client.get("/api/v1/users/todos/") for _ in range(3)]
+            return probes, requests
+
+    probes, requests = asyncio.run(run())
+    assert {response.status_code for response in probes} == {200}
+    assert [response.status_code for response in requests] == [200, 200, 429]
+
+
+def test_forwarded_client_ip_is_counted_from_the_trusted_proxies(monkeypatch):
+    scope = {"client": ("10.0.0.1", 123), "headers": [
+        (b"x-forwarded-for", b"1.1.1.1, 203.0.113.7"),
+        (b"x-forwarded-for", b"198.51.100.1"),
+    ]}
+    assert client_ip(scope) == "10.0.0.1"
+
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_TRUST_FORWARDED", True)
+    assert client_ip(scope) == "198.51.100.1"
+    # The leftmost entries come from the client, they are never used past the proxies
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_PROXY_HOPS", 2)
+    assert client_ip(scope) == "203.0.113.7"
+
+
+def test_fake_redis_scripts_are_registered_per_client():
+    store = RedisBucketStore(FakeRedis())
+
+    assert TOKEN_BUCKET_SCRIPT in store.client.scripts
+    assert FakeRedis().scripts == {}
+
+
+def test_login_username_is_normalized():
+    assert login_username(b'{"username": " Alice "}') == "alice"
+    assert login_username(b"not json") is None
+    assert login_username(b'{"username": 5}') is None
+
+
+def test_store_errors_fail_open():
+    class BrokenStore:
+        async def take(self, key, rule):
+            raise ConnectionError("store is down")
+
+    responses = asyncio.run(post_logins(RateLimitMiddleware(ok_app, store=BrokenStore()), 20))
+    assert {response.status_code for response in responses} == {200}
@@ -0,0 +1,77 @@
+import sqlite3
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from replicas import ReplicaSet, routing_session_class
+
+
+class StandInEngine:
+    # The routing only uses an AsyncEngine's sync_engine, so a sqlite engine can stand in
+    def __init__(self, url: str, **kwargs):
+        self.sync_engine = create_engine(url, **kwargs)
+
+
+def database(tmp_path, name: str) -> StandInEngine:
+    path = tmp_path / f"{name}.db"
+    with sqlite3.connect(path) as connection:
+        connection.execute("CREATE TABLE server (name TEXT)")
+        connection.execute("INSERT INTO server VALUES (?)", (name,))
+    return StandInEngine(f"sqlite:///{path}")
+
+
+def missing_database(tmp_path) -> StandInEngine:
+    return StandInEngine(f"sqlite:///{tmp_path / 'missing' / 'replica.db'}")
+
+
+def refusing_connections(tmp_path) -> StandInEngine:
+    # Like asyncpg, whose refused connects raise an OSError the driver doesn't wrap
+    def connect():
+        raise ConnectionRefusedError("connection refused")
+    return StandInEngine("sqlite://", creator=connect)
+
+
+def served_by(session_class) -> str:
+    with session_class() as session:
+        return session.execute(text("SELECT name FROM server")).scalar_one()
+
+
+def test_reads_go_round_robin_over_the_replicas(tmp_path):
+    primary = database(tmp_path, "primary")
+    replicas = ReplicaSet([database(tmp_path, "replica1"), database(tmp_path, "replica2")], cooldown=30)
+    session_class = routing_session_class(primary, replicas)
+
+    assert [served_by(session_class) for _ in range(4)] == ["replica1", "replica2", "replica1", "replica2"]
+
+
+def test_a_session_stays_on_its_replica(tmp_path):
+    replicas = ReplicaSet([database(tmp_path, "replica1"), database(tmp_path, "replica2")], cooldown=30)
+
+    with routing_session_class(database(tmp_path, "primary"), replicas)() as session:
+        names = [session.execute(text("SELECT name FROM server")).scalar_one() for _ in range(3)]
+    assert names == ["replica1"] * 3
+
+
+@pytest.mark.parametrize("unreachable", [missing_database, refusing_connections])
+def test_a_failed_replica_is_retried_on_the_primary_and_skipped_until_the_cooldown_ends(tmp_path, unreachable):
+    replica = unreachable(tmp_path)
+    replicas = ReplicaSet([replica], cooldown=30)
+    session_class = routing_session_class(database(tmp_path, "primary"), replicas)
+
+    assert served_by(session_class) == "primary"
+    assert replicas.is_down(replica)
+    assert replicas.choose() is None
+    assert served_by(session_class) == "primary"
+
+    replicas.down_until[0] = 0
+    assert replicas.choose() is replica
+
+
+def test_errors_that_leave_the_replica_up_are_not_retried(tmp_path):
+    replicas = ReplicaSet([database(tmp_path, "replica")], cooldown=30)
+    session_class = routing_session_class(database(tmp_path, "primary"), replicas)
+
+    with pytest.raises(OperationalError), session_class() as session:
+        session.execute(text("SELECT name FROM missing_table"))
+    assert replicas.choose() is not None
@@ -0,0 +1,46 @@
+import os
+
+import pytest
+
+import server_config
+
+
+@pytest.fixture
+def cgroup(monkeypatch, tmp_path):
+    paths = {name: tmp_path / name for name in ("cpu.max", "cpu.cfs_quota_us", "cpu.cfs_period_us")}
+    monkeypatch.setattr(server_config, "CGROUP_CPU_MAX", str(paths["cpu.max"]))
+    monkeypatch.setattr(server_config, "CGROUP_CPU_QUOTA", str(paths["cpu.cfs_quota_us"]))
+    monkeypatch.setattr(server_config, "CGROUP_CPU_PERIOD", str(paths["cpu.cfs_period_us"]))
+    return paths
+
+
+def test_cgroup_v2_quota_is_rounded_up(cgroup):
+    cgroup["cpu.max"].write_text("150000 100000\n")
+    assert server_config.available_cpus() == 2
+
+    cgroup["cpu.max"].write_text("50000 100000\n")
+    assert server_config.available_cpus() == 1
+
+
+def test_cgroup_v1_quota(cgroup):
+    cgroup["cpu.cfs_quota_us"].write_text("400000\n")
+    cgroup["cpu.cfs_period_us"].write_text("100000\n")
+    assert server_config.available_cpus() == 4
+
+
+def test_no_quota_falls_back_to_the_cpus_we_may_run_on(cgroup):
+    cgroup["cpu.max"].write_text("max 100000\n")
+    expected = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+    assert server_config.available_cpus() == expected
+
+    cgroup["cpu.max"].unlink()
+    assert server_config.available_cpus() == expected
+
+
+def test_per_process_backends(monkeypatch):
+    monkeypatch.setattr(server_config, "IDEMPOTENCY_BACKEND", "fake-redis")
+    assert server_config.per_process_backends() == ["IDEMPOTENCY_BACKEND=fake-redis"]
+
+    for backend in ("postgres", "redis", "none"):
+        monkeypatch.setattr(server_config, "IDEMPOTENCY_BACKEND", backend)
+        assert server_config.per_process_backends() == []
@@ -0,0 +1,106 @@
+import asyncio
+import datetime
+import uuid
+
+import orjson
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from change_feed import CHANGE_FEED_CHANNEL
+from models.todo import Todo
+from models.user import User
+from requests import CreateTodoRequest, UpdateTodoRequest
+from services.user_todo_service import UserTodoService
+
+
+def new_user() -> User:
+    return User(username=f"version_{uuid.uuid4().hex[:8]}", first_name="Todos", last_name="Version",
+                email=f"{uuid.uuid4().hex[:8]}@example.com", birthdate=datetime.date(2000, 1, 1), password="x")
+
+
+async def versions_after_writes(engine) -> list[int]:
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        user, other = new_user(), new_user()
+        session.add_all([user, other])
+        await session.commit()
+
+    try:
+        versions = []
+        async with AsyncSession(engine, expire_on_commit=False) as session:
+            service = UserTodoService(session)
+            versions.append(await service.get_todos_version(user.user_id))
+
+            results = await service.create_todos(user.user_id, [CreateTodoRequest(label=label) for label in "abc"])
+            versions.append(await service.get_todos_version(user.user_id))
+
+            await service.update_todos(user.user_id, [
+                UpdateTodoRequest(id=result.id, label=f"{result.label}!") for result in results])
+            versions.append(await service.get_todos_version(user.user_id))
+
+            # Another user's write, and a statement that matches no rows, leave the version alone
+            await service.create_todo(CreateTodoRequest(label="theirs"), other.user_id)
+            await service.delete_todos(user.user_id, [-1])
+            versions.append(await service.get_todos_version(user.user_id))
+
+            await service.delete_todo(user.user_id, results[0].id)
+            versions.append(await service.get_todos_version(user.user_id))
+        return versions
+    finally:
+        async with AsyncSession(engine) as session:
+            await session.execute(delete(Todo).where(Todo.user_id.in_([user.user_id, other.user_id])))
+            await session.execute(delete(User).where(User.user_id.in_([user.user_id, other.user_id])))
+            await session.commit()
+
+
+def test_every_writing_statement_bumps_the_version_once(db_engine):
+    assert asyncio.run(versions_after_writes(db_engine)) == [0, 1, 2, 2, 3]
+
+
+async def notifications_for_writes(engine) -> tuple[int, int, list[dict]]:
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        user = new_user()
+        session.add(user)
+        await session.commit()
+
+    events = []
+
+    def on_notification(connection, pid, channel, payload):
+        event = orjson.loads(payload)
+        if event["user_id"] == user.user_id:
+            events.append(event)
+
+    try:
+        async with engine.connect() as listener:
+            raw = (await listener.get_raw_connection()).driver_connection
+            await raw.add_listener(CHANGE_FEED_CHANNEL, on_notification)
+
+            async with AsyncSession(engine, expire_on_commit=False) as session:
+                service = UserTodoService(session)
+                todo = await service.create_todo(CreateTodoRequest(label="one"), user.user_id)
+                await service.update_todo(user.user_id, UpdateTodoRequest(id=todo.id, label="uno"))
+                await service.create_todos(user.user_id, [CreateTodoRequest(label=label) for label in ("a", "b")])
+                await service.delete_todo(user.user_id, todo.id)
+
+            for _ in range(50):
+                if len(events) >= 4:
+                    break
+                await asyncio.sleep(0.02)
+            await raw.remove_listener(CHANGE_FEED_CHANNEL, on_notification)
+        return user.user_id, todo.id, events
+    finally:
+        async with AsyncSession(engine) as session:
+            await session.execute(delete(Todo).where(Todo.user_id == user.user_id))
+            await session.execute(delete(User).where(User.user_id == user.user_id))
+            await session.commit()
+
+
+def test_each_statement_notifies_the_change_feed_once(db_engine):
+    user_id, todo_id, events = asyncio.run(notifications_for_writes(db_engine))
+
+    # One changed row carries the todo, a statement writing several rows asks for a resync
+    assert events == [
+        {"type": "created", "user_id": user_id, "id": todo_id, "label": "one"},
+        {"type": "updated", "user_id": user_id, "id": todo_id, "label": "uno"},
+        {"type": "resync", "user_id": user_id},
+        {"type": "deleted", "user_id": user_id, "id": todo_id},
+    ]
@@ -0,0 +1,58 @@
+import pytest
+
+from auth import cache
+from auth.cache import TTLCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_entries_expire_after_the_ttl(clock):
+    ttl_cache = TTLCache(maxsize=10, ttl=60)
+    ttl_cache.set("token", "claims")
+
+    clock[0] += 59
+    assert ttl_cache.get("token") == "claims"
+    clock[0] += 1
+    assert ttl_cache.get("token") is None
+    assert len(ttl_cache) == 0
+
+
+def test_per_entry_ttl_is_capped_by_the_cache_ttl(clock):
+    ttl_cache = TTLCache(maxsize=10, ttl=60)
+    ttl_cache.set("short", 1, ttl=5)
+    ttl_cache.set("long", 2, ttl=3600)
+
+    clock[0] += 5
+    assert ttl_cache.get("short") is None
+    clock[0] += 55
+    assert ttl_cache.get("long") is None
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    ttl_cache = TTLCache(maxsize=2, ttl=60)
+    ttl_cache.set("a", 1)
+    ttl_cache.set("b", 2)
+    ttl_cache.get("a")
+    ttl_cache.set("c", 3)
+
+    assert ttl_cache.get("a") == 1
+    assert ttl_cache.get("b") is None
+    assert ttl_cache.get("c") == 3
+
+
+def test_pop_and_clear(clock):
+    ttl_cache = TTLCache(maxsize=10, ttl=60)
+    ttl_cache.set("a", 1)
+    ttl_cache.set("b", 2)
+
+    ttl_cache.pop("a")
+    ttl_cache.pop("missing")
+    assert ttl_cache.get("a") is None
+
+    ttl_cache.clear()
+    assert len(ttl_cache) == 0
@@ -0,0 +1,51 @@
+import asyncio
+from collections import namedtuple
+
+from sqlalchemy.sql import Insert
+
+from cache.backends import LRUBackend
+from cache.todo_cache import TodoCache
+from requests import CreateTodoRequest
+from services.user_todo_service import UserTodoService
+
+Created = namedtuple("Created", "id label")
+
+
+class RecordingSession:
+    def __init__(self, events: list):
+        self.events = events
+
+    async def execute(self, statement):
+        if isinstance(statement, Insert) and statement.table.name == "jobs":
+            self.events.append("enqueue")
+            return None
+        if isinstance(statement, Insert):
+            return [Created(1, "a")]
+        return None
+
+    async def commit(self):
+        self.events.append("commit")
+
+
+class RecordingCache(TodoCache):
+    def __init__(self, events: list, shared: bool):
+        super().__init__(LRUBackend(1024), ttl=60, version_ttl=2, shared=shared)
+        self.events = events
+
+    async def invalidate(self, user_id: int) -> None:
+        self.events.append("invalidate")
+
+
+def create(shared: bool) -> list[str]:
+    events = []
+    service = UserTodoService(RecordingSession(events), RecordingCache(events, shared))
+    asyncio.run(service.create_todos(1, [CreateTodoRequest(label="a")]))
+    return events
+
+
+def test_warm_job_is_queued_after_the_invalidation():
+    assert create(shared=True) == ["commit", "invalidate", "enqueue", "commit"]
+
+
+def test_nothing_is_queued_for_a_per_process_cache():
+    assert create(shared=False) == ["commit", "invalidate"]
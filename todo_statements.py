@@ -0,0 +1,44 @@
+import sqlalchemy as sa
+from sqlmodel import and_, delete, update
+
+from models.todo import Todo
+from models.todo_read import TODO_READ_COLUMNS
+
+
+# Single statements keyed on (todos.user_id, todos.id): the primary key finds the row and
+# user_id guards ownership, RETURNING tells whether it matched without another round trip
+def update_todo_statement(user_id: int, todo_id: int, label: str, completed: bool | None = None):
+    return (
+        update(Todo)
+        .values(label=label, updated_at=sa.func.now(), **completion_values(completed))
+        .where(and_(Todo.user_id == user_id, Todo.id == todo_id))
+        .returning(*TODO_READ_COLUMNS)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def completion_values(completed: bool | None) -> dict:
+    if completed is None:
+        return {}
+    # Completing twice keeps the first completion time, archival ages todos from it
+    completed_at = sa.func.coalesce(Todo.completed_at, sa.func.now()) if completed else None
+    return {"completed": completed, "completed_at": completed_at}
+
+
+def delete_todo_statement(user_id: int, todo_id: int):
+    return (
+        delete(Todo)
+        .where(and_(Todo.user_id == user_id, Todo.id == todo_id))
+        .returning(Todo.id)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+# ILIKE on the column itself, which the pg_trgm index on (user_id, label) can serve.
+# istartswith would compile to lower(label) LIKE lower(...), which no index covers.
+def label_starts_with(q: str):
+    return Todo.label.ilike(escape_like(q) + "%", escape="\\")
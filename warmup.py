@@ -0,0 +1,53 @@
+import asyncio
+import contextlib
+import datetime
+
+from decouple import config
+from sqlalchemy.exc import NoResultFound
+
+from database import DB_NULL_POOL, DB_POOL_SIZE, async_session
+from pagination import encode_cursor, encode_todo_cursor
+from services.todo_service import TodoService
+from services.user_service import UserService
+from services.user_todo_service import UserTodoService
+
+DB_PREWARM_RETRY_DELAY = config("DB_PREWARM_RETRY_DELAY", default=5, cast=float)
+
+
+async def _warm_connection() -> None:
+    # user_id 0 never exists, so the hot queries return nothing, but asyncpg still prepares
+    # and caches every statement on this connection and SQLAlchemy caches its compiled SQL.
+    # A cached GET runs the version lookup first, then one of the loaders, whose SQL differs
+    # with and without a cursor.
+    epoch = datetime.datetime.fromtimestamp(0, datetime.timezone.utc)
+    async with async_session() as session:
+        user_todos = UserTodoService(session)
+        await user_todos.get_todos_version(0)
+        await user_todos.get_todos(0, 0, 10)
+        await user_todos.get_todos(0, 0, 10, encode_todo_cursor(epoch, 0))
+        await user_todos.search_todos(0, "warm", 10)
+        await user_todos.search_todos(0, "warm", 10, encode_cursor(0.0, 0))
+        with contextlib.suppress(NoResultFound):
+            await user_todos.get_todo(0, 0)
+        await user_todos.get_archived_todos(0, 10)
+        await TodoService(session).get_todos(0, 10)
+        await UserService(session).get_by_username("")
+
+
+async def prewarm() -> None:
+    # The sessions overlap, so each one checks out its own connection and the whole pool
+    # is opened. Replicas warm up on their first requests.
+    connections = 1 if DB_NULL_POOL else DB_POOL_SIZE
+    await asyncio.gather(*(_warm_connection() for _ in range(connections)))
+
+
+async def prewarm_until_ready(ready: asyncio.Event) -> None:
+    while True:
+        try:
+            await prewarm()
+        except Exception as e:
+            print(f"prewarming the database pool failed, retrying in {DB_PREWARM_RETRY_DELAY}s: {e!r}")
+            await asyncio.sleep(DB_PREWARM_RETRY_DELAY)
+        else:
+            ready.set()
+            return